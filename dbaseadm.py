@@ -46,6 +46,8 @@ class _m():
     retrx   = ""; keyx    = ""; datax  = ""
     dkeyx   = ""; dumpx  = 0;   findrec = ""; getrec = 0
     replace = 0 ; recpos = 0;    decode = 0
+    hashf   = 0; trigf   = 0;   hashname = "sha256"
+    loadx   = ""
 
     deffile = "pydbase.pydb"
 
@@ -93,8 +95,12 @@ Usage: %s [options] [newkey newdata]
    -l  lim    Limit get records    -|-  -e  offs   Delete at offset
    -Z  keyval Get record position  -|-  -X  max    Limit recs on delete
    -f  file   DB file for save/retrieve default: 'pydbase.pydb')
+   -H         Use / maintain the hash index file (.phsh) for key lookups
+   -T         Use / maintain the trigram index file (.ptri) for -F / -s
+   -A  name   Hash function for a new DB: %s
+   -L  file   Bulk load key TAB data lines (.tsv) or JSON lines (.ndjson)
 The verbosity / debug  level influences the amount of printout presented.\
-'''  % (VERSION, pname, )
+'''  % (VERSION, pname, " ".join(twincore.HASHNAMES))
 
 #   -C  num    Get and print num of records. Skip aware, decode aware
 
@@ -114,8 +120,8 @@ def mainfunc():
     args = []
 
     # Old fashioned parsing
-    opts_args   = "a:d:e:f:k:l:n:o:s:t:u:x:y:p:D:F:G:X:Z:"
-    opts_normal = "mchiVrwzvgqURIK?SECO"
+    opts_args   = "a:d:e:f:k:l:n:o:s:t:u:x:y:p:A:D:F:G:L:X:Z:"
+    opts_normal = "mchiVrwzvgqURIK?SECOHT"
     try:
         opts, args = getopt.getopt(sys.argv[1:],  opts_args + opts_normal )
     except getopt.GetoptError as err:
@@ -215,6 +221,14 @@ def mainfunc():
             _m.findrec = aa[1]
         if aa[0] == "-Z":
             _m.recpos = aa[1]
+        if aa[0] == "-H":
+            _m.hashf = True
+        if aa[0] == "-T":
+            _m.trigf = True
+        if aa[0] == "-A":
+            _m.hashname = aa[1]
+        if aa[0] == "-L":
+            _m.loadx = aa[1]
 
     #print("args", len(args), args)
 
@@ -228,7 +242,8 @@ def mainfunc():
     twincore.base_pgdebug   = _m.pgdebug
 
     # Create our database
-    core = twincore.TwinCore(_m.deffile, _m.pgdebug)
+    core = twincore.TwinCore(_m.deffile, _m.pgdebug, hashfile = _m.hashf,
+                                trigram = _m.trigf, hashname = _m.hashname)
     core.verbose   = _m.verbose
     core.showdel   = _m.showdelx
     core.integrity = _m.checkf
@@ -245,31 +260,43 @@ def mainfunc():
     dbsize = core.getdbsize()
     #print("DBsize", dbsize)
 
-    if _m.keyx and _m.datax:
+    if _m.loadx:
+        try:
+            cnt = core.bulk_load(_m.loadx)
+        except twincore.BulkLoadError as err:
+            print(err)
+            sys.exit(1)
+        if not _m.quiet:
+            print("Loaded", cnt, "record(s)")
+    elif _m.keyx and _m.datax:
         curr = 0
         if _m.verbose:
             print("adding", _m.keyx, _m.datax)
-        for aa in range(_m.ncount):
-            curr = core.save_data(_m.keyx, _m.datax, _m.replace)
+        if _m.replace:
+            for aa in range(_m.ncount):
+                curr = core.save_data(_m.keyx, _m.datax, _m.replace)
+        else:
+            core.save_many([(_m.keyx, _m.datax)] * _m.ncount)
 
     elif _m.keyx:
         curr = 0
         data = randstr(random.randint(4, 24))
         if _m.verbose:
             print("adding", _m.keyx, data)
-        for aa in range(_m.ncount):
-            curr = core.save_data(_m.keyx, data, _m.replace)
+        if _m.replace:
+            for aa in range(_m.ncount):
+                curr = core.save_data(_m.keyx, data, _m.replace)
+        else:
+            core.save_many([(_m.keyx, data)] * _m.ncount)
         #print("curr", curr)
     elif _m.writex:
         curr = 0
         if _m.randx:
-            for aa in range(_m.ncount):
-                curr = core.save_data(
-                    randstr(random.randint(2, 10)),
+            core.save_many((randstr(random.randint(2, 10)),
                         randstr(random.randint(10, 20)))
+                            for aa in range(_m.ncount))
         else:
-            for aa in range(_m.ncount):
-                curr = core.save_data("111 222", "333 444")
+            core.save_many([("111 222", "333 444")] * _m.ncount)
         #print("curr", curr)
     elif _m.findx:
         if _m.lcount == 0: _m.lcount = 1
@@ -2,7 +2,7 @@
 
 import datetime, time, traceback, multiprocessing
 
-import sys, os
+import sys, os, threading
 
 try:
     import fcntl
@@ -12,6 +12,9 @@ except:
 utils_pgdebug  = 0
 utils_locktout = 5
 
+LOCK_POLL       = 0.00005       ##< First lock retry interval (sec)
+LOCK_POLLMAX    = 0.05          ##< Longest lock retry interval (sec)
+
 locklevel = {}
 
 def set_pgdebug(level):
@@ -85,72 +88,119 @@ class   FileLock():
         if utils_pgdebug:
             print("lockname init", self.lockname)
 
+        self.held = None            # None, "sh" or "ex"
         if fcntl:
             try:
-                self.fpx = open(lockname, "wb")
+                # Not truncated; the holder's pid is in it, see stale()
+                self.fpx = os.fdopen(os.open(lockname,
+                                os.O_RDWR | os.O_CREAT, 0o666), "r+b", 0)
             except:
                 if utils_pgdebug > 1:
                     print("Cannot create lock file")
 
                 raise ValueError("Cannot create lock file")
 
-    def waitlock(self):
-        if utils_pgdebug > 1:
-            print("Waitlock", self.lockname)
-        if fcntl:
-            cnt2 = 0
-            while True:
-                try:
-                    fcntl.flock(self.fpx, fcntl.LOCK_EX | fcntl.LOCK_NB)
-                    break
-                except:
-                    if utils_pgdebug:
-                        print("waiting in fcntl", self.lockname,
-                                            os.getpid()) #sys.exc_info())
+    def waitlock(self, timeout = None, shared = False):
 
-                cnt2 += 1
-                time.sleep(1)
-                if cnt2 > utils_locktout:
-                    # Taking too long; break in
+        ''' Wait for the lock. Polls with a backoff starting at
+            LOCK_POLL seconds, doubling up to LOCK_POLLMAX. After
+            'timeout' seconds (default utils_locktout) the lock is
+            broken in if it is stale (see stale()); a live holder is
+            waited for, however long it takes. With 'shared' others
+            may hold it shared as well (readers). Taking it again
+            converts between the two. '''
+
+        if utils_pgdebug > 1:
+            print("Waitlock", self.lockname, "shared" if shared else "")
+        if timeout is None:
+            timeout = utils_locktout
+        delay = LOCK_POLL
+        tout = time.monotonic() + timeout
+        while not self.trylock(shared):
+            if utils_pgdebug and delay == LOCK_POLL:
+                print("waiting for lock", self.lockname, os.getpid())
+            if time.monotonic() > tout:
+                if self.stale():
+                    # The holder is gone; break in
                     if utils_pgdebug:
-                        print("Lock held too long",
-                                            os.getpid(), self.lockname)
-                    self.unlock()
-                    break
-        else:
-            cnt = 0
-            while True:
-                try:
-                    if os.path.exists(self.lockname):
-                        if utils_pgdebug:
-                           print("Waiting ... ", self.lockname)
-                        pass
-                    else:
-                        fp = open(self.lockname, "wb")
-                        fp.write(str(os.getpid()).encode())
-                        fp.close()
+                        print("Stale lock", os.getpid(), self.lockname)
+                    if fcntl:
                         break
-                except:
-                    if utils_pgdebug:
-                        print("locked",  self.lockname, cnt, sys.exc_info())
-                    pass
-                time.sleep(1)
-                cnt += 1
-                if cnt > utils_locktout:
-                    if utils_pgdebug:
-                        print("breaking lock", self.lockname)
-                    break
+                    # Drop its file, then take it as usual
+                    self.held = "ex"
+                    self.unlock()
+                elif utils_pgdebug:
+                    print("Lock held long", os.getpid(), self.lockname)
+                tout = time.monotonic() + timeout
+            time.sleep(delay)
+            delay = min(delay * 2, LOCK_POLLMAX)
+
+    def stale(self):
+
+        ''' True if the lock is held by a process that is no more. The
+            exclusive holder leaves its pid in the lock file; shared
+            holders leave none. The kernel lets go of the flock of a
+            process that ends, so with flock only an exclusive lock
+            inherited by a child of a gone holder is stale. '''
+
+        try:
+            with open(self.lockname, "rb") as fp:
+                pid = int(fp.read(32) or 0)
+        except (OSError, ValueError):
+            pid = 0
+        if not pid:
+            # Lock file without a pid is from a crash
+            return not fcntl
+        return not pidalive(pid)
+
+    def trylock(self, shared = False):
+
+        ''' Take the lock if it is free, without waiting.
+            Return True if taken. Without flock (Windows) the lock
+            is always exclusive. '''
+
+        if fcntl:
+            mode = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+            try:
+                fcntl.flock(self.fpx, mode | fcntl.LOCK_NB)
+            except OSError:
+                return False
+            self.held = "sh" if shared else "ex"
+            self._mark(not shared)
+            return True
+        try:
+            fp = open(self.lockname, "xb")
+            fp.write(str(os.getpid()).encode())
+            fp.close()
+            self.held = "ex"
+            return True
+        except OSError:
+            return False
+
+    def _mark(self, mine):
+
+        # Our pid in the lock file, or none; only while holding it
+        try:
+            os.ftruncate(self.fpx.fileno(), 0)
+            if mine:
+                os.pwrite(self.fpx.fileno(), str(os.getpid()).encode(), 0)
+        except OSError:
+            pass
 
     def unlock(self):
 
         #print("Unlock", self.lockname)
 
+        held = self.held
+        self.held = None
         if fcntl:
+            if held == "ex":
+                self._mark(False)
             try:
                 fcntl.flock(self.fpx, fcntl.LOCK_UN | fcntl.LOCK_NB)
             except:
                 pass
-        else:
+        elif held:
             try:
                 os.remove(self.lockname)
             except:
@@ -163,24 +213,210 @@ class   FileLock():
         #print("__del__ lock", self.lockname)
         try:
             if fcntl:
+                self.unlock()
                 # Do not remove, others may have locked it ...
+                if self.trylock():
+                    try:
+                        os.remove(self.lockname)
+                    except:
+                        pass
                 # ... but close our handle
-                fcntl.flock(self.fpx, fcntl.LOCK_UN | fcntl.LOCK_NB)
                 self.fpx.close()
-                pass
-
-            # Always remove file
-            try:
-                os.remove(self.lockname)
-            except:
-                pass
-                #print("cannot delete lock", self.lockname, sys.exc_info())
+            else:
+                # The file is the lock; removed only if ours
+                self.unlock()
         except:
 
             if utils_pgdebug:
                 print("exc on del (ignored)", self.lockname, sys.exc_info())
             pass
 
+class   ThreadFileLock():
+
+    ''' FileLock for a handle shared by threads. flock does not keep
+        threads of one process apart (they share the descriptor), so a
+        reader / writer lock in the process sits under it: the first
+        thread in takes the file lock, the last one out releases it.
+        Per thread it is reentrant, unlock() once for every lock taken.
+        Asking for exclusive while holding shared converts, like flock;
+        the shared one is given up first, and the depth stays the same.
+        Same interface as FileLock; the timeout (and breaking in on a
+        stale lock after it) applies to the file lock, threads wait for
+        each other. '''
+
+    def __init__(self, lockname):
+
+        self.lockname = lockname
+        self.flock = FileLock(lockname)
+        self.cond = threading.Condition()
+        self.owners = {}            # Thread id -> [shared, depth]
+        self.writers = 0            # Waiting for exclusive
+        self.busy = False           # File lock being changed
+        self.pinned = False         # File lock held, see pin()
+
+    def _free(self, tid, shared):
+        if self.busy:
+            return False
+        others = [oo[0] for tt, oo in self.owners.items() if tt != tid]
+        if shared:
+            return all(others) and not self.writers
+        return not others
+
+    def _take(self, tid, shared, wait):
+
+        ''' In process part; return True if the file lock is to be
+            (re)taken, None if not available. '''
+
+        mine = self.owners.get(tid)
+        if mine and (not mine[0] or shared):
+            mine[1] += 1
+            return False
+        if mine:
+            # Converting; give up the shared one
+            del self.owners[tid]
+        if not shared:
+            self.writers += 1
+        try:
+            # No time out here; the other threads are alive, they are
+            # not stale holders. Breaking in is for the file lock only.
+            while not self._free(tid, shared):
+                if not wait:
+                    if mine:
+                        self.owners[tid] = mine
+                    return None
+                self.cond.wait()
+        finally:
+            if not shared:
+                self.writers -= 1
+        self.owners[tid] = [shared, mine[1] if mine else 1]
+        if len(self.owners) == 1 and not self.pinned:
+            self.busy = True
+            return True
+        return False
+
+    def _filed(self, tid, ok, mine = None):
+        with self.cond:
+            self.busy = False
+            if not ok:
+                self.owners.pop(tid, None)
+                if mine:
+                    self.owners[tid] = mine
+            self.cond.notify_all()
+
+    def waitlock(self, timeout = None, shared = False):
+
+        ''' Wait for the lock, see FileLock.waitlock() '''
+
+        if timeout is None:
+            timeout = utils_locktout
+        tid = threading.get_ident()
+        with self.cond:
+            refile = self._take(tid, shared, True)
+        if refile:
+            try:
+                self.flock.waitlock(timeout, shared)
+            finally:
+                self._filed(tid, True)
+
+    def trylock(self, shared = False):
+
+        ''' Take the lock if it is free, without waiting. '''
+
+        tid = threading.get_ident()
+        with self.cond:
+            mine = self.owners.get(tid)
+            mine = mine and list(mine)
+            refile = self._take(tid, shared, False)
+        if refile is None:
+            return False
+        if refile:
+            ok = False
+            try:
+                ok = self.flock.trylock(shared)
+            finally:
+                self._filed(tid, ok, mine)
+            return ok
+        return True
+
+    def unlock(self):
+
+        tid = threading.get_ident()
+        with self.cond:
+            mine = self.owners.get(tid)
+            if not mine:
+                return
+            mine[1] -= 1
+            if mine[1] > 0:
+                return
+            del self.owners[tid]
+            if self.owners or self.pinned:
+                self.cond.notify_all()
+                return
+            self.busy = True
+        try:
+            self.flock.unlock()
+        finally:
+            with self.cond:
+                self.busy = False
+                self.cond.notify_all()
+
+    def stale(self):
+
+        ''' See FileLock.stale() '''
+
+        return self.flock.stale()
+
+    def pin(self):
+
+        ''' Keep the file lock after the last unlock(), until unpin().
+            Call it holding the lock exclusive. From then on only the
+            in-process part is taken, no syscalls. '''
+
+        with self.cond:
+            self.pinned = True
+
+    def unpin(self):
+
+        ''' Undo pin(); the file lock goes now if no thread holds it,
+            else with the last one out. '''
+
+        with self.cond:
+            if not self.pinned:
+                return
+            self.pinned = False
+            if self.owners:
+                return
+            self.busy = True
+        try:
+            self.flock.unlock()
+        finally:
+            with self.cond:
+                self.busy = False
+                self.cond.notify_all()
+
+def pidalive(pid):
+
+    ''' True if process 'pid' is running. '''
+
+    if pid == os.getpid():
+        return True
+    if os.name == "nt":
+        # os.kill() would end it there; ask for a handle instead
+        import ctypes
+        hh = ctypes.windll.kernel32.OpenProcess(0x1000, False, pid)
+        if not hh:
+            return False
+        ctypes.windll.kernel32.CloseHandle(hh)
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # There, but not ours
+        pass
+    return True
+
 def truncs(strx, num = 8):
 
     ''' Truncate a string for printing nicely. Add '..' if truncated'''
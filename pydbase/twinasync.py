@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+
+'''!
+    twinasync -- asyncio front end for twincore / twinchain
+
+    The database calls run on a bounded thread pool. Reads of a database
+    run side by side, writes one at a time (and alone). The file lock is
+    taken from the event loop by polling, so a busy database does not
+    block the loop (or a pool thread).
+
+        db = await AsyncTwinCore.open("data.pydb")
+        await db.save_data("key", "data")
+        async for rec in db.records():
+            print(rec)
+        await db.close()
+'''
+
+import  os
+import  sys
+import  asyncio
+import  functools
+import  contextlib
+import  concurrent.futures
+
+base = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(base))
+
+import  dbutils
+from twincore import *
+from twinchain import *
+
+ASYNC_WORKERS   = 4             ##< Pool size, if not passed an executor
+ASYNC_POLL      = 0.001         ##< First lock poll interval (sec), doubles
+ASYNC_POLLMAX   = 0.05          ##< up to this
+ASYNC_BATCH     = 100           ##< Records per pool call in the iterators
+
+class AsyncGate():
+
+    ''' Reader / writer gate for coroutines: shared holders run side
+        by side, an exclusive one alone. A waiting writer holds off new
+        readers, so writes do not starve. '''
+
+    def __init__(self):
+        self.cond = asyncio.Condition()
+        self.readers = 0
+        self.writer = False
+        self.waiting = 0
+
+    async def acquire(self, shared = False):
+        async with self.cond:
+            if shared:
+                await self.cond.wait_for(lambda: not self.writer and
+                                                    not self.waiting)
+                self.readers += 1
+                return
+            self.waiting += 1
+            try:
+                await self.cond.wait_for(lambda: not self.writer and
+                                                    not self.readers)
+            finally:
+                self.waiting -= 1
+                self.cond.notify_all()
+            self.writer = True
+
+    async def release(self, shared = False):
+        async with self.cond:
+            if shared:
+                self.readers -= 1
+            else:
+                self.writer = False
+            self.cond.notify_all()
+
+    @contextlib.asynccontextmanager
+    async def hold(self, shared = False):
+        await self.acquire(shared)
+        try:
+            yield
+        finally:
+            await self.release(shared)
+
+class AsyncTwinCore():
+
+    ''' Awaitable wrapper of a TwinCore. Create with open(), or wrap
+        an existing core. An executor may be shared among databases;
+        if none is passed, one of 'workers' threads is created and
+        shut down on close(). '''
+
+    coreclass = TwinCore
+
+    def __init__(self, core, executor = None, workers = ASYNC_WORKERS):
+
+        self.core = core
+        self.own = executor is None
+        if executor is None:
+            executor = concurrent.futures.ThreadPoolExecutor(workers)
+        self.executor = executor
+        self.gate = AsyncGate()
+
+    @classmethod
+    async def open(cls, *args, executor = None, workers = ASYNC_WORKERS,
+                                                                **kwargs):
+
+        ''' Create the database in the pool. Arguments as for the
+            core (TwinCore / TwinChain) constructor. '''
+
+        own = executor is None
+        if own:
+            executor = concurrent.futures.ThreadPoolExecutor(workers)
+        loop = asyncio.get_running_loop()
+        core = await loop.run_in_executor(executor,
+                            functools.partial(cls.coreclass, *args, **kwargs))
+        ret = cls(core, executor)
+        ret.own = own
+        return ret
+
+    async def close(self):
+
+        ''' Wait for the running calls, close the core (in the pool, it
+            syncs and closes files), stop our pool. '''
+
+        async with self.gate.hold():
+            if self.core is None:
+                return
+            core = self.core
+            self.core = None
+            try:
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(self.executor, core.close)
+            finally:
+                if self.own:
+                    self.executor.shutdown(wait = False)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def _filelock(self, shared = False):
+
+        ''' Poll until the lock is free. It is let go at once, the
+            lock belongs to the thread taking it; the call in the pool
+            takes it again, waiting (briefly) only if it lost a race.
+            Past the lock timeout the call gets to break in, if the
+            lock is stale; a live holder (an exclusive session, say) is
+            waited for here, not in the pool. Lock files without flock
+            (Windows) are left to the call. '''
+
+        if not fcntl:
+            return
+        delay = ASYNC_POLL; waited = 0
+        while not self.core.lock.trylock(shared):
+            await asyncio.sleep(delay)
+            waited += delay
+            delay = min(delay * 2, ASYNC_POLLMAX)
+            if waited > dbutils.utils_locktout:
+                if self.core.lock.stale():
+                    return
+                waited = 0
+        self.core.lock.unlock()
+
+    async def run(self, func, *args, **kwargs):
+
+        ''' Run func(*args, **kwargs) in the pool with the database
+            locked. For calls that have no wrapper here. '''
+
+        return await self._run(False, func, *args, **kwargs)
+
+    async def _read(self, func, *args, **kwargs):
+
+        ''' Same as run(), with the lock shared with other readers. '''
+
+        return await self._run(True, func, *args, **kwargs)
+
+    async def _run(self, shared, func, *args, **kwargs):
+
+        async with self.gate.hold(shared):
+            if self.core is None:
+                raise RuntimeError("Database is closed.")
+            await self._filelock(shared)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor,
+                        functools.partial(self._locked, shared,
+                                                func, *args, **kwargs))
+
+    def _locked(self, shared, func, *args, **kwargs):
+
+        # In the pool thread; the lock is per thread
+
+        self.core.lock.waitlock(shared = shared)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.core.lock.unlock()
+
+    async def save_data(self, header, datax, replace = False):
+        return await self.run(self.core.save_data, header, datax, replace)
+
+    async def save_many(self, pairs):
+        return await self.run(self.core.save_many, list(pairs))
+
+    async def save_stream(self, header, fileobj, length):
+        return await self.run(self.core.save_stream, header, fileobj, length)
+
+    async def open_value(self, strx):
+        return await self._read(self.core.open_value, strx)
+
+    async def retrieve(self, strx, limx = 1, view = False):
+        return await self._read(self.core.retrieve, strx, limx, view)
+
+    async def get_rec(self, recnum, view = False):
+        return await self._read(self.core.get_rec, recnum, view)
+
+    async def get_rec_byoffs(self, recoffs, view = False):
+        return await self._read(self.core.get_rec_byoffs, recoffs, view)
+
+    async def find_key(self, keyx, limx = 0xffffffff):
+        return await self._read(self.core.find_key, keyx, limx)
+
+    async def findrec(self, strx, limx = INT_MAX, skipx = 0):
+        return await self._read(self.core.findrec, strx, limx, skipx)
+
+    async def del_rec(self, recnum):
+        return await self.run(self.core.del_rec, recnum)
+
+    async def del_rec_bykey(self, strx, maxdelrec = 0xffffffff):
+        return await self.run(self.core.del_rec_bykey, strx, maxdelrec)
+
+    async def getdbsize(self):
+        return await self._read(self.core.getdbsize)
+
+    async def integrity_check(self, skip = 0, count = 0xffffffff):
+        return await self._read(self.core.integrity_check, skip, count)
+
+    async def vacuum(self):
+        return await self.run(self.core.vacuum)
+
+    async def reindex(self, idxver = None):
+        return await self.run(self.core.reindex, idxver)
+
+    def _getrecs(self, recs):
+        return [(aa, self.core.get_rec(aa)) for aa in recs]
+
+    async def records(self, skip = 0, limx = INT_MAX, reverse = False,
+                                                batch = ASYNC_BATCH):
+
+        ''' Iterate live records as [key, data], in file order (newest
+            first if 'reverse'). Fetched 'batch' records per pool call;
+            the database is not locked in between. '''
+
+        size = await self.getdbsize()
+        if reverse:
+            rrr = range(size - 1 - skip, -1, -1)
+        else:
+            rrr = range(skip, size)
+        cnt = 0
+        for bb in range(0, len(rrr), batch):
+            for aa, rec in await self._read(self._getrecs, rrr[bb:bb + batch]):
+                if not rec:
+                    continue
+                yield rec
+                cnt += 1
+                if cnt >= limx:
+                    return
+
+    async def keys(self, skip = 0, limx = INT_MAX, reverse = False,
+                                                batch = ASYNC_BATCH):
+
+        ''' Iterate the keys of live records, see records(). '''
+
+        async for rec in self.records(skip, limx, reverse, batch):
+            yield rec[0]
+
+class AsyncTwinChain(AsyncTwinCore):
+
+    ''' Awaitable wrapper of a TwinChain. '''
+
+    coreclass = TwinChain
+
+    async def append(self, datax):
+        return await self.run(self.core.append, datax)
+
+    async def appendwith(self, header, datax):
+        return await self.run(self.core.appendwith, header, datax)
+
+    async def get_payload(self, recnum):
+        return await self._read(self.core.get_payload, recnum)
+
+    async def get_header(self, recnum):
+        return await self._read(self.core.get_header, recnum)
+
+    async def get_data_bykey(self, keyval, maxrec = 1, check = True):
+        return await self._read(self.core.get_data_bykey, keyval, maxrec, check)
+
+    async def linkintegrity(self, recnum):
+        return await self._read(self.core.linkintegrity, recnum)
+
+    async def checkdata(self, recnum):
+        return await self._read(self.core.checkdata, recnum)
+
+# EOF
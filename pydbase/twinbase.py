@@ -6,18 +6,51 @@
 
 import  os, sys, getopt, signal, select, socket, time, struct
 import  random, stat, os.path, datetime
-import  struct, io, traceback, hashlib, traceback
+import  struct, io, traceback, hashlib, traceback, zlib, mmap
+import  threading, weakref, json, array
 
 try:
     import fcntl
 except:
     fcntl = None
 
+try:
+    import xxhash
+except:
+    xxhash = None
+
 base = os.path.dirname(os.path.realpath(__file__))
 sys.path.append(os.path.join(base, '..', 'pydbase'))
 
 from dbutils import *
 
+# Positional I/O; no shared file position, so threads can read one
+# descriptor at the same time. Emulated where the OS has none (Windows).
+
+if hasattr(os, "pread"):
+    pread = os.pread
+    pwrite = os.pwrite
+else:
+    _seeklock = threading.Lock()
+
+    def pread(fd, cnt, offs):
+        with _seeklock:
+            os.lseek(fd, offs, os.SEEK_SET)
+            return os.read(fd, cnt)
+
+    def pwrite(fd, data, offs):
+        with _seeklock:
+            os.lseek(fd, offs, os.SEEK_SET)
+            return os.write(fd, data)
+
+# Flush file data to the device; fdatasync skips the metadata where
+# it exists, the file size is still written.
+
+if hasattr(os, "fdatasync"):
+    fdsync = os.fdatasync
+else:
+    fdsync = os.fsync
+
 HEADSIZE        = 32
 
 INT_MAX         = 0xffffffff    ##< INT_MAX in 'C' py has BIG integer
@@ -25,6 +58,14 @@ CURROFFS        = 16            ## Sat 04.Feb.2023 deleted
 FIRSTHASH       = HEADSIZE      ##< data starts here
 FIRSTDATA       = HEADSIZE
 LOCK_TIMEOUT    = 20            ##< this is in 0.1 sec units
+HASHOFFS        = 24            ##< Hash function id in the data header
+IDXVEROFFS      = 20            ##< Format version in the index header
+RECHINT         = 512           ##< First read of a record; head, key, and
+                                ##  most often the payload as well
+SAVEBUF         = 0x400000      ##< Data gathered by save_many() per write
+BULKCHUNK       = 0x800000      ##< Input lines per bulk load task (bytes)
+SCANBLOCK       = 0x400000      ##< Read ahead of sequential scans
+STREAMBUF       = 0x100000      ##< Buffer of save_stream() / ValueFile
 
 ## These are all four bytes, one can read it like integers
 
@@ -37,6 +78,363 @@ RECEND      = b"RECE"
 
 VERSION = "1.7.2"
 
+## Hash functions for keys / payloads. The id is recorded in the data
+## file header; files before it have zero there, which is sha256.
+
+HASH_SHA256     = 0             ##< First 4 bytes of sha256 (the original)
+HASH_BLAKE2B    = 1             ##< blake2b, 4 byte digest
+HASH_CRC32      = 2             ##< zlib.crc32
+HASH_XXH32      = 3             ##< xxhash.xxh32, if installed
+HASH_BLAKE2B8   = 4             ##< blake2b, 8 byte digest (index v2)
+HASH_XXH64      = 5             ##< xxhash.xxh64, if installed (index v2)
+
+HASHNAMES = { "sha256" : HASH_SHA256, "blake2b" : HASH_BLAKE2B,
+                "crc32" : HASH_CRC32, "xxh32" : HASH_XXH32,
+                "blake2b8" : HASH_BLAKE2B8, "xxh64" : HASH_XXH64, }
+
+## The 64 bit ones; the index holds all 64 bits, the data file
+## record the lower 32.
+
+HASHWIDE = (HASH_BLAKE2B8, HASH_XXH64)
+
+## Index formats: entry of record offset and key hash.
+##  1   4 byte offset, 4 byte hash. Data file up to 4 GiB (the original)
+##  2   8 byte offset, 8 byte hash
+
+IDX_V1          = 1
+IDX_V2          = 2
+IDXFORMATS      = { IDX_V1 : "II", IDX_V2 : "QQ", }
+
+def _hash_sha256(strx):
+    return int.from_bytes(hashlib.sha256(strx).digest()[:4], "big")
+
+def _hash_blake2b(strx):
+    return int.from_bytes(hashlib.blake2b(strx, digest_size = 4).digest(),
+                                                                "big")
+
+def _hash_xxh32(strx):
+    return xxhash.xxh32_intdigest(strx)
+
+def _hash_blake2b8(strx):
+    return int.from_bytes(hashlib.blake2b(strx, digest_size = 8).digest(),
+                                                                "big")
+
+def _hash_xxh64(strx):
+    return xxhash.xxh64_intdigest(strx)
+
+HASHFUNCS = { HASH_SHA256 : _hash_sha256, HASH_BLAKE2B : _hash_blake2b,
+                HASH_CRC32 : zlib.crc32, HASH_XXH32 : _hash_xxh32,
+                HASH_BLAKE2B8 : _hash_blake2b8, HASH_XXH64 : _hash_xxh64, }
+
+## Durability levels, what a commit waits for:
+##  none    the same as flush; writes are not buffered in the process
+##          (os.pwrite), so there is nothing less to do
+##  flush   the data is handed to the OS (the original)
+##  fsync   data and index are on the device
+##  group   a background thread syncs every GROUP_MSEC or GROUP_RECS
+
+DUR_NONE        = "none"
+DUR_FLUSH       = "flush"
+DUR_FSYNC       = "fsync"
+DUR_GROUP       = "group"
+DURABILITY      = (DUR_NONE, DUR_FLUSH, DUR_FSYNC, DUR_GROUP)
+
+GROUP_MSEC      = 100           ##< Group commit interval
+GROUP_RECS      = 1000          ##< Group commit early, at this many records
+
+class GroupCommit():
+
+    ''' Background fsync for the 'group' durability level. Commits
+        add to a pending count; the thread syncs when the count
+        reaches 'recs' or 'msec' passed with any pending. It keeps a
+        weak reference to the core, so it does not hold it alive. '''
+
+    def __init__(self, core, msec = GROUP_MSEC, recs = GROUP_RECS):
+
+        self.ref = weakref.ref(core)
+        self.msec = msec
+        self.recs = recs
+        self.pending = 0
+        self.stopped = False
+        self.plock = threading.Lock()
+        self.event = threading.Event()
+        self.thread = threading.Thread(target = self._run, daemon = True)
+        self.thread.start()
+
+    def kick(self, cnt = 1):
+        ''' Note 'cnt' committed records. '''
+        with self.plock:
+            self.pending += cnt
+            full = self.pending >= self.recs
+        if full:
+            self.event.set()
+
+    def commit(self):
+        ''' Sync now, if anything is pending. '''
+        with self.plock:
+            cnt = self.pending
+            self.pending = 0
+        if not cnt:
+            return
+        core = self.ref()
+        if core is None:
+            return
+        try:
+            core.fsync()
+        except (OSError, ValueError):
+            # Files replaced or closed under us (vacuum, reindex)
+            pass
+
+    def stop(self):
+        ''' Stop the thread. The owner syncs what is left, the weak
+            reference may be gone by the time it calls this. '''
+        self.stopped = True
+        self.event.set()
+        if threading.current_thread() is not self.thread:
+            self.thread.join()
+
+    def _run(self):
+        while not self.stopped:
+            self.event.wait(self.msec / 1000)
+            self.event.clear()
+            self.commit()
+
+## Bulk load input formats:
+##  tsv     key TAB data, one record per line; no TAB is an empty data
+##  ndjson  one JSON value per line; {"key": .., "data": ..} or [key, data]
+##          non string data is stored as its JSON text
+
+BULK_TSV        = "tsv"
+BULK_NDJSON     = "ndjson"
+BULKFORMATS     = (BULK_TSV, BULK_NDJSON)
+
+def _bulkbytes(val):
+    if type(val) == type(b""):
+        return val
+    if type(val) != type(""):
+        val = json.dumps(val)
+    return val.encode()
+
+def _bulkparse(line, fmt):
+
+    ''' Split an input line to key and data; None for empty lines. '''
+
+    line = line.rstrip(b"\r\n")
+    if not line.strip():
+        return None
+    if fmt == BULK_TSV:
+        kkk, sep, ddd = line.partition(b"\t")
+        return kkk, ddd
+    obj = json.loads(line)
+    if type(obj) == type({}):
+        kkk = obj["key"]; ddd = obj.get("data", "")
+    else:
+        kkk, ddd = obj[0], obj[1]
+    if type(kkk) != type(""):
+        kkk = json.dumps(kkk)
+    return kkk.encode(), _bulkbytes(ddd)
+
+def bulk_chunk(hashid, fmt, typecode, lines):
+
+    ''' Build the records of a chunk of input lines. Module level, so it
+        can run in a worker process.
+
+        Return:
+            record bytes, array of offsets relative to the chunk,
+            array of key hashes for the index; 'typecode' arrays
+    '''
+
+    func = HASHFUNCS[hashid]
+    arr = []; offs = array.array(typecode); hashes = array.array(typecode)
+    pos = 0
+    for line in lines:
+        rec = _bulkparse(line, fmt)
+        if not rec:
+            continue
+        kkk, ddd = rec
+        hhh2 = func(kkk)
+        arr.append(RECSIG)
+        arr.append(struct.pack("II", hhh2 & 0xffffffff, len(kkk)))
+        arr.append(kkk)
+        arr.append(RECSEP)
+        arr.append(struct.pack("II", func(ddd) & 0xffffffff, len(ddd)))
+        arr.append(ddd)
+        offs.append(pos); hashes.append(hhh2)
+        pos += 24 + len(kkk) + len(ddd)
+    return b"".join(arr), offs, hashes
+
+class ScanReader():
+
+    ''' Read ahead for sequential scans of the data file. Reads are
+        served from a SCANBLOCK buffer; a miss reads the block starting
+        at the offset asked, so a record across a block boundary is read
+        again whole. Going backwards the block is centered on the offset,
+        so it has the rest of the record (read after its start) too, and
+        the records before. Reads larger than the block go to the file.
+        Same interface as the core for getbuffstr() / getbuffint(). '''
+
+    def __init__(self, core, size = None):
+
+        self.core = core
+        self.size = size or SCANBLOCK
+        self.start = 0
+        self.buf = b""
+
+    def getbuffstr(self, offs, xlen):
+        beg = offs - self.start
+        if beg >= 0 and beg + xlen <= len(self.buf):
+            return self.buf[beg:beg + xlen]
+        if xlen >= self.size:
+            return self.core.getbuffstr(offs, xlen)
+        start = offs
+        if offs < self.start:
+            start = max(0, offs - self.size // 2, offs + xlen - self.size)
+        self.buf = self.core.getbuffstr(start, self.size)
+        self.start = start
+        beg = offs - start
+        return self.buf[beg:beg + xlen]
+
+    def getbuffint(self, offs):
+        return struct.unpack("I", self.getbuffstr(offs, 4))[0]
+
+class StreamHash():
+
+    ''' hash32() of data fed in pieces, for save_stream(). Same
+        values as HASHFUNCS, cut to 32 bits like hash32() is. '''
+
+    def __init__(self, hashid):
+
+        self.hashid = hashid
+        self.crc = 0
+        if hashid == HASH_SHA256:
+            self.hh = hashlib.sha256()
+        elif hashid == HASH_BLAKE2B:
+            self.hh = hashlib.blake2b(digest_size = 4)
+        elif hashid == HASH_BLAKE2B8:
+            self.hh = hashlib.blake2b(digest_size = 8)
+        elif hashid == HASH_XXH32:
+            self.hh = xxhash.xxh32()
+        elif hashid == HASH_XXH64:
+            self.hh = xxhash.xxh64()
+        else:
+            self.hh = None
+
+    def update(self, buf):
+        if self.hh is None:
+            self.crc = zlib.crc32(buf, self.crc)
+        else:
+            self.hh.update(buf)
+
+    def value(self):
+        if self.hh is None:
+            return self.crc
+        if self.hashid == HASH_SHA256:
+            return int.from_bytes(self.hh.digest()[:4], "big")
+        if hasattr(self.hh, "intdigest"):
+            return self.hh.intdigest() & 0xffffffff
+        return int.from_bytes(self.hh.digest(), "big") & 0xffffffff
+
+class ValueFile(io.RawIOBase):
+
+    ''' Read only file over a payload in the data file, see
+        TwinCore.open_value(). It reads through a descriptor of its
+        own, so it stays valid after vacuum (it sees the file as it
+        was) and after the handle is closed; in place writes (replace)
+        show. Close it when done. Wrap in io.BufferedReader for
+        small reads. '''
+
+    def __init__(self, fd, offs, size):
+
+        super(ValueFile, self).__init__()
+        self.fd = os.dup(fd)
+        self.offs = offs
+        self.size = size
+        self.pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def __len__(self):
+        return self.size
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, pos, whence = io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            pos += self.pos
+        elif whence == io.SEEK_END:
+            pos += self.size
+        if pos < 0:
+            raise ValueError("Negative seek position %d" % pos)
+        self.pos = pos
+        return pos
+
+    def readinto(self, buf):
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        cnt = max(0, min(len(buf), self.size - self.pos))
+        if not cnt:
+            return 0
+        if hasattr(os, "preadv"):
+            cnt = os.preadv(self.fd, [memoryview(buf)[:cnt]],
+                                                self.offs + self.pos)
+        else:
+            val = pread(self.fd, cnt, self.offs + self.pos)
+            cnt = len(val)
+            buf[:cnt] = val
+        self.pos += cnt
+        return cnt
+
+    def copyto(self, out):
+
+        ''' Copy the rest of the payload to 'out' (a socket, a file
+            object or a descriptor) in the kernel where the OS lets us:
+            copy_file_range to a regular file, sendfile to others. Falls
+            back to reads of STREAMBUF. Return the byte count. '''
+
+        ofd = out if isinstance(out, int) else out.fileno()
+        if hasattr(out, "flush"):
+            out.flush()
+        total = 0
+        kern = os.copy_file_range if hasattr(os, "copy_file_range") and \
+                    stat.S_ISREG(os.fstat(ofd).st_mode) else \
+                        getattr(os, "sendfile", None)
+        while kern and self.pos < self.size:
+            cnt = min(self.size - self.pos, 0x40000000)
+            try:
+                if kern is os.sendfile:
+                    cnt = os.sendfile(ofd, self.fd, self.offs + self.pos, cnt)
+                else:
+                    cnt = os.copy_file_range(self.fd, ofd, cnt,
+                                                self.offs + self.pos)
+            except OSError:
+                # Not for this pair of files; user space it is
+                if total:
+                    raise
+                break
+            if not cnt:
+                break
+            self.pos += cnt; total += cnt
+        buf = bytearray(STREAMBUF)
+        while self.pos < self.size:
+            cnt = self.readinto(buf)
+            if not cnt:
+                break
+            view = memoryview(buf)[:cnt]
+            while view:
+                view = view[os.write(ofd, view):]
+            total += cnt
+        return total
+
+    def close(self):
+        if not self.closed:
+            os.close(self.fd)
+        super(ValueFile, self).close()
+
 # Accessed from the main file as well
 
 base_locktout   = LOCK_TIMEOUT   # Settable from ...
@@ -48,6 +446,7 @@ class TwinCoreBase():
     ''' This class provides basic services to twincore  '''
 
     INTSIZE     = 4
+    IDXSIZE     = 8             ##< Index entry size, see setidxver()
 
     def __init__(self, pgdebug = 0):
 
@@ -63,7 +462,17 @@ class TwinCoreBase():
         # Provide placeholders
         self.fp = None
         self.ifp = None
+        self.dfd = -1           # Descriptors of fp / ifp, see setfds()
+        self.ifd = -1
         self.cnt = 0
+        self.hashid = HASH_SHA256
+        self.idxver = IDX_V1
+        self.idxfmt = IDXFORMATS[IDX_V1]
+
+        # Read through memory maps if set, see getbuffint() and friends
+        self.mapped = False
+        self.dmap = None
+        self.imap = None
 
         #self.fname = "" ;        self.idxname = ""
         #self.lckname = "";
@@ -84,6 +493,78 @@ class TwinCoreBase():
         #print("sss", sss, sss.st_size)
         return sss.st_size
 
+    def setfds(self):
+        ''' Remember the descriptors; call when (re)opening fp / ifp. '''
+        self.dfd = self.fp.fileno()
+        self.ifd = self.ifp.fileno()
+
+    # --------------------------------------------------------------------
+    # Memory mapped reads. The maps cover the file as it was when mapped;
+    # a read past the end remaps if the file grew since. Writes go to
+    # the descriptors, the maps see them.
+
+    def _newmap(self, fp, old):
+
+        ''' Map the file again if it grew past the old map. The old one
+            is not closed, a reader in another thread may still use it;
+            it goes when the last reference does. '''
+
+        size = os.fstat(fp.fileno()).st_size
+        if old is not None and size <= len(old):
+            return old
+        if not size:
+            return None
+        return mmap.mmap(fp.fileno(), size, access = mmap.ACCESS_READ)
+
+    def _datamap(self, end):
+        ''' Data map that reaches 'end' if the file does. '''
+        if self.dmap is None or end > len(self.dmap):
+            self.dmap = self._newmap(self.fp, self.dmap)
+        return self.dmap
+
+    def _idxmap(self, end):
+        ''' Index map that reaches 'end' if the file does. '''
+        if self.imap is None or end > len(self.imap):
+            self.imap = self._newmap(self.ifp, self.imap)
+        return self.imap
+
+    def _unmap(self):
+        ''' Drop the maps; call before closing / replacing the files.
+            A map with record views out (see _recview()) can not be
+            closed; it is left to go with the last view. '''
+        for name in ("dmap", "imap"):
+            mm = getattr(self, name)
+            setattr(self, name, None)
+            if mm is not None:
+                try:
+                    mm.close()
+                except BufferError:
+                    pass
+
+    def _recview(self, offs):
+
+        ''' The whole record at 'offs' as a memoryview into the data
+            map, no copy. The view keeps its map (and so the file as it
+            was) alive: a later remap, vacuum or close does not disturb
+            it, it just does not see what came after. In place writes
+            (delete marks, replace) do show. Returns the RECHINT bytes
+            read instead if the record does not fit the file (damaged),
+            b"" past the end. '''
+
+        mm = self._datamap(offs + 24)
+        if mm is None or len(mm) < offs + 24:
+            return self.getbuffstr(offs, RECHINT)
+        klen = struct.unpack_from("I", mm, offs + 8)[0]
+        end = offs + 24 + klen
+        mm = self._datamap(end)
+        if len(mm) < end:
+            return self.getbuffstr(offs, RECHINT)
+        end += struct.unpack_from("I", mm, end - 4)[0]
+        mm = self._datamap(end)
+        if len(mm) < end:
+            return self.getbuffstr(offs, RECHINT)
+        return memoryview(mm)[offs:end]
+
     # --------------------------------------------------------------------
     # Read / write index / data; Data is accessed by int or by str;
     #  Note: data by int is in little endian (intel) order
@@ -91,40 +572,86 @@ class TwinCoreBase():
     def getidxint(self, offs):
         ''' get an integer value from index offset '''
         #print("getidxint", offs)
-        self.ifp.seek(offs, io.SEEK_SET)
-        val = self.ifp.read(4)
+        if self.mapped:
+            return struct.unpack_from("I", self._idxmap(offs + 4) or b"",
+                                                                offs)[0]
+        val = pread(self.ifd, 4, offs)
         return struct.unpack("I", val)[0]
 
+    def getidxpairs(self, offs, cnt):
+        ''' get 'cnt' offset / hash pairs from index offset, one read '''
+        if self.mapped:
+            mm = self._idxmap(offs + cnt * self.IDXSIZE)
+            if mm is None:
+                return []
+            cnt = min(cnt, max(0, (len(mm) - offs) // self.IDXSIZE))
+            return [struct.unpack_from(self.idxfmt, mm,
+                        offs + aa * self.IDXSIZE) for aa in range(cnt)]
+        val = pread(self.ifd, cnt * self.IDXSIZE, offs)
+        return list(struct.iter_unpack(self.idxfmt,
+                                val[:len(val) - len(val) % self.IDXSIZE]))
+
+    def getidxent(self, offs):
+        ''' get the (offset, hash) entry at index offset '''
+        if self.mapped:
+            return struct.unpack_from(self.idxfmt,
+                    self._idxmap(offs + self.IDXSIZE) or b"", offs)
+        val = pread(self.ifd, self.IDXSIZE, offs)
+        return struct.unpack(self.idxfmt, val)
+
+    def getidxoffs(self, offs):
+        ''' get the record offset from the index entry at offs '''
+        return self.getidxent(offs)[0]
+
+    def getidxhash(self, offs):
+        ''' get the key hash from the index entry at offs '''
+        return self.getidxent(offs)[1]
+
     def putidxint(self, offs, val):
         ''' put an integer value to offset '''
         #print("putidxint", offs, val)
-        pp = struct.pack("I", val)
-        self.ifp.seek(offs, io.SEEK_SET)
-        self.ifp.write(pp)
+        pwrite(self.ifd, struct.pack("I", val), offs)
+
+    def putidxent(self, offs, roffs, hhh):
+        ''' put an (offset, hash) entry to index offset, one write '''
+        pwrite(self.ifd, struct.pack(self.idxfmt, roffs, hhh), offs)
+
+    def putidxstr(self, offs, xstr):
+        ''' Write packed index entries to index offset '''
+        pwrite(self.ifd, xstr, offs)
 
     def getbuffint(self, offs):
         ''' get an integer value from offset '''
-        self.fp.seek(offs, io.SEEK_SET)
-        val = self.fp.read(4)
+        if self.mapped:
+            return struct.unpack_from("I", self._datamap(offs + 4) or b"",
+                                                                offs)[0]
+        val = pread(self.dfd, 4, offs)
         return struct.unpack("I", val)[0]
 
     def putbuffint(self, offs, val):
         ''' Write an in to buffer '''
         #print("putbuffint", offs, val)
-        self.fp.seek(offs, io.SEEK_SET)
-        cc = struct.pack("I", val)
-        self.fp.write(cc)
+        pwrite(self.dfd, struct.pack("I", val), offs)
 
     def getbuffstr(self, offs, xlen):
         ''' Get sreing from buffer '''
-        self.fp.seek(offs, io.SEEK_SET)
-        val = self.fp.read(xlen)
-        return val
+        if self.mapped:
+            mm = self._datamap(offs + xlen)
+            if mm is None:
+                return b""
+            return mm[offs:offs + xlen]
+        return pread(self.dfd, xlen, offs)
 
     def putbuffstr(self, offs, xstr):
         ''' Write a string to buffer '''
-        self.fp.seek(offs, io.SEEK_SET)
-        val = self.fp.write(xstr)
+        pwrite(self.dfd, xstr, offs)
+
+    def appendbuff(self, xstr):
+        ''' Append to the data file, return the offset it went to.
+            The caller serializes appends. '''
+        offs = os.fstat(self.dfd).st_size
+        pwrite(self.dfd, xstr, offs)
+        return offs
 
     def _putint(self, ifp, offs, val):
         pp = struct.pack("I", val)
@@ -146,8 +673,10 @@ class TwinCoreBase():
         #print("hashing", strx)
         #ttt = time.time()
 
-        hh = hashlib.new("sha256"); hh.update(strx)
-        hashx = int(hh.hexdigest()[:8], base=16)
+        #hh = hashlib.new("sha256"); hh.update(strx)
+        #hashx = int(hh.hexdigest()[:8], base=16)
+        # Same value, without the hex round trip
+        hashx = int.from_bytes(hashlib.sha256(strx).digest()[:4], "big")
 
         # Replaced this with an external hash function for speed
         #hashx = 0
@@ -162,6 +691,48 @@ class TwinCoreBase():
 
         return hashx
 
+    def hashkey(self, strx):
+
+        ''' The key hash as kept in the index. Same as hash32(), except
+            for the 64 bit hash functions. '''
+
+        return self.hash32(strx)
+
+    def sethash(self, hashid):
+
+        ''' Select the hash function by id; hash32() / hashkey() are
+            replaced with it on this instance. '''
+
+        if hashid not in HASHFUNCS:
+            raise RuntimeError("Unsupported hash function id %d." % hashid)
+        if hashid in (HASH_XXH32, HASH_XXH64) and not xxhash:
+            raise RuntimeError("Hash function xxh32 / xxh64 needs "
+                                                "the xxhash module.")
+        self.hashid = hashid
+        self.__dict__.pop("hashkey", None)
+        if hashid == HASH_SHA256:
+            # The original method, so subclasses can still override it
+            self.__dict__.pop("hash32", None)
+        elif hashid in HASHWIDE:
+            func = HASHFUNCS[hashid]
+            self.hashkey = func
+            self.hash32 = lambda strx: func(strx) & 0xffffffff
+        else:
+            self.hash32 = HASHFUNCS[hashid]
+
+    def setidxver(self, ver):
+
+        ''' Select the index format; 0 is from files before the version
+            field, same as 1. '''
+
+        if ver == 0:
+            ver = IDX_V1
+        if ver not in IDXFORMATS:
+            raise RuntimeError("Unsupported index version %d." % ver)
+        self.idxver = ver
+        self.idxfmt = IDXFORMATS[ver]
+        self.IDXSIZE = struct.calcsize(self.idxfmt)
+
     def _lockx(self, fp):
         if fcntl:
             fcntl.lockf(fp, fcntl.LOCK_EX)
@@ -170,19 +741,20 @@ class TwinCoreBase():
             fnum = fp.fileno()
             msvcrt.locking(fnum, msvcrt.LK_LOCK, os.fstat(fnum).st_size)
 
-    def softcreate(self, fname, raisex = True):
+    def softcreate(self, fname, raisex = True, buffering = -1):
 
-        ''' Open for read / write. Create if needed. '''
+        ''' Open for read / write. Create if needed. Pass buffering = 0
+            for files other processes write to while we have them open. '''
 
         #print("Softcreate", fname)
 
         fp = None
         try:
-            fp = open(fname, "rb+")
+            fp = open(fname, "rb+", buffering = buffering)
             #self._lockx(fp)
         except:
             try:
-                fp = open(fname, "wb+")
+                fp = open(fname, "wb+", buffering = buffering)
                 self._lockx(fp)
             except:
                 #print("Deleting lock", self.lckname)
@@ -196,7 +768,7 @@ class TwinCoreBase():
 
         return fp
 
-    def create_data(self, fp):
+    def create_data(self, fp, hashid = HASH_SHA256):
 
         ''' Sub for initial DATA file '''
 
@@ -215,8 +787,11 @@ class TwinCoreBase():
         outx = b"".join(arrx)
         fp.seek(0)
         fp.write(outx)
+        fp.seek(HASHOFFS)
+        fp.write(struct.pack("I", hashid))
+        fp.flush()
 
-    def create_idx(self, ifp):
+    def create_idx(self, ifp, ver = IDX_V1):
 
         ''' Sub for initial INDEX file '''
 
@@ -234,6 +809,9 @@ class TwinCoreBase():
         outx = b"".join(arrx)
         ifp.seek(0)
         ifp.write(outx)
+        ifp.seek(IDXVEROFFS)
+        ifp.write(struct.pack("I", ver))
+        ifp.flush()
 
         #pp = struct.pack("I", HEADSIZE)
         #ifp.seek(CURROFFS, io.SEEK_SET)
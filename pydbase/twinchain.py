@@ -68,18 +68,24 @@ class TwinChain(TwinCore):
         Derive from database to accomodate block chain.
     '''
 
-    def __init__(self, fname = "pydbchain.pydb", pgdebug = 0, verbose = 0):
+    def __init__(self, fname = "pydbchain.pydb", pgdebug = 0, verbose = 0,
+                                                        share = False):
+
+        if self._reopen():
+            return
 
         self.chain_verbose = verbose
+        self.packer = pyvpacker.packbin()
 
         # Upper lock name
         ulockname = os.path.splitext(fname)[0] + ".ulock"
-        self.ulock = FileLock(ulockname)
+        self.ulock = ThreadFileLock(ulockname)
         self.ulock.waitlock()    #(self.ulockname)
-
-        super(TwinChain, self).__init__(fname, pgdebug)
-
-        self.packer = pyvpacker.packbin()
+        try:
+            super(TwinChain, self).__init__(fname, pgdebug, share = share)
+        except:
+            self.ulock.unlock()
+            raise
 
         sss = self.getdbsize()
         '''if sss == 0:
@@ -353,16 +359,23 @@ class TwinChain(TwinCore):
         if self.chain_verbose > 0:
             print("Appendwith", header, datax)
 
-        self.ulock.waitlock()    #self.ulockname)
-
         try:
             uuu = uuid.UUID(header)
         except:
             if self.chain_verbose:
                 print("Header override must be a valid UUID string.")
+            raise ValueError("Header override must be a valid UUID string.")
 
+        self.ulock.waitlock()    #self.ulockname)
+        try:
+            self._appendwith(header, datax)
+        finally:
             self.ulock.unlock() #self.ulockname)
-            raise ValueError("Header override must be a valid UUID string.")
+        return True
+
+    def _appendwith(self, header, datax):
+
+        ''' See appendwith(); call with ulock held. '''
 
         old_dicx = {}
         # Get last data from db
@@ -398,9 +411,6 @@ class TwinChain(TwinCore):
             bbb = self.packer.decode_data(encoded)
             print("Rec", bbb[0])
 
-        self.ulock.unlock() #self.ulockname)
-        return True
-
     def append(self, datax):
 
         ''' Append data to the end of database '''
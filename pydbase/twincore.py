@@ -80,12 +80,36 @@ import  os
 import  sys
 import  struct
 import  threading
+import  array
+import  collections
+import  concurrent.futures
+import  multiprocessing
+import  inspect
+import  weakref
 
 base = os.path.dirname(os.path.realpath(__file__))
 sys.path.append(os.path.join(base))
 sys.path.append(os.path.join(base, '..', 'pydbase'))
 
 from twinbase import *
+from twinindex import *
+
+# Open handles with share = True, by class, real path and options
+
+_registry = weakref.WeakValueDictionary()
+_reglock = threading.Lock()
+
+# Options that only apply when the file is made; not part of the key
+_MAKEOPTS = ("hashname", "idxver")
+
+class BulkLoadError(RuntimeError):
+
+    ''' A bulk load stopped part way. The records of the chunks before
+        the failing one are in the database; 'loaded' has their count. '''
+
+    def __init__(self, message, loaded):
+        super(BulkLoadError, self).__init__(message)
+        self.loaded = loaded
 
 # ------------------------------------------------------------------------
 
@@ -98,27 +122,126 @@ class TwinCore(TwinCoreBase):
 
     '''
 
-    def __init__(self, fname = "pydbase.pydb", pgdebug = 0, devmode = 1):
+    def __new__(cls, *args, **kwargs):
+
+        ''' With share = True, an open handle of the same class on the
+            same file (by real path) with the same options is handed
+            out again; descriptors, maps, helpers and the lock are then
+            shared. Options used only when the file is made (hashname,
+            idxver) do not count. Counted; the files close with the last
+            close(), or when the last reference goes. '''
+
+        # Only when asked; share could come by position too
+        opts = None
+        if kwargs.get("share") or len(args) > 1:
+            bound = inspect.signature(cls.__init__).bind(None, *args, **kwargs)
+            bound.apply_defaults()
+            opts = dict(bound.arguments)
+        if not opts or not opts.pop("share", False):
+            self = super(TwinCore, cls).__new__(cls)
+            self.refs = 1
+            return self
+
+        del opts["self"]
+        for oo in _MAKEOPTS:
+            opts.pop(oo, None)
+        fname = os.path.realpath(opts.pop("fname"))
+        key = (cls, fname, tuple(sorted(opts.items())))
+        with _reglock:
+            self = _registry.get(key)
+            if self is not None and self.refs > 0:
+                self.refs += 1
+                self.reinit += 1
+                return self
+        self = super(TwinCore, cls).__new__(cls)
+        self.refs = 1
+        self.regkey = key
+        return self
+
+    def _reopen(self):
+
+        ''' True if __new__ handed out an open handle; skip __init__. '''
+
+        with _reglock:
+            if self.__dict__.get("reinit"):
+                self.reinit -= 1
+                return True
+        return False
+
+    def _register(self):
+
+        # Opened; others can have it now
+        key = self.__dict__.get("regkey")
+        if key is None:
+            return
+        with _reglock:
+            if key not in _registry:
+                self.reinit = 0
+                _registry[key] = self
+
+    def __init__(self, fname = "pydbase.pydb", pgdebug = 0, devmode = 1,
+                        hashmap = False, hashfile = False, vector = False,
+                        ordered = False, bloom = False, bloom_rate = 0.01,
+                        bloom_size = 100000, delmap = False, latest = False,
+                        trigram = False, hashname = "sha256",
+                        idxver = IDX_V1, mapped = False,
+                        durability = DUR_FLUSH, group_msec = GROUP_MSEC,
+                        group_recs = GROUP_RECS, exclusive = False,
+                        share = False):
+
+        if self._reopen():
+            return
+
+        # Before any file is made
+        if hashname not in HASHNAMES:
+            raise RuntimeError("Unknown hash function '%s'." % hashname)
+        if idxver not in IDXFORMATS:
+            raise RuntimeError("Unknown index version %d." % idxver)
 
         self.cnt = 0
         self.fname = fname
         self.lckname  = os.path.splitext(self.fname)[0] + ".lock"
         self.idxname  = os.path.splitext(self.fname)[0] + ".pidx"
+        self.hshname  = os.path.splitext(self.fname)[0] + ".phsh"
+        self.ordname  = os.path.splitext(self.fname)[0] + ".pord"
+        self.blmname  = os.path.splitext(self.fname)[0] + ".pblm"
+        self.delname  = os.path.splitext(self.fname)[0] + ".pdel"
+        self.triname  = os.path.splitext(self.fname)[0] + ".ptri"
         self.pgdebug = pgdebug
         self.verbose  = 0
         self.showdel  = 0
         self.integrity = 0
         self.devmode = devmode
-        self.lock = FileLock(self.lckname)
+        self.lock = ThreadFileLock(self.lckname)
 
         # Thu 25.Apr.2024 these are added for index creation
         self.preexec = None
         self.postexec = None
 
+        # Optional lookup helpers, see twinindex.py
+        self.indexes = []
+        self.hashmap = None
+        self.hashfile = None
+        self.vector = None
+        self.ordered = None
+        self.bloom = None
+        self.delmap = None
+        self.latest = None
+        self.trigram = None
+        self.group = None
+        self.exclusive = exclusive
+
+        if durability not in DURABILITY:
+            raise RuntimeError("Unknown durability level '%s'." % durability)
+        self.durability = durability
+
         # Make sure only one process can use this
         self.lock.waitlock()
 
         super(TwinCore, self).__init__(pgdebug)
+        self.mapped = mapped
+        self.wlock = threading.Lock()
+        self.hlock = threading.RLock()      # Lookup helpers, see twinindex
 
         #print("initializing core with", fname, pgdebug)
         #self.pool = threading.BoundedSemaphore(value=1)
@@ -144,13 +267,17 @@ class TwinCore(TwinCoreBase):
         except:
             pass
 
-        self.fp = self.softcreate(self.fname)
-        self.ifp = self.softcreate(self.idxname)
+        # Unbuffered; all access is positional, see twinbase.py
+        self.fp = self.softcreate(self.fname, buffering = 0)
+        self.ifp = self.softcreate(self.idxname, buffering = 0)
+        self.setfds()
 
+
+        newidx = False
         buffsize = self.getsize(self.fp)
         if buffsize < HEADSIZE:
             #print("initial padding")
-            self.create_data(self.fp)
+            self.create_data(self.fp, HASHNAMES[hashname])
             #try:
             #    # There was no file, delete index, if any
             #    os.rename(self.idxname, self.idxname + ".dangle")
@@ -159,7 +286,7 @@ class TwinCore(TwinCoreBase):
             #    pass
 
             #print("initial padding")
-            self.create_idx(self.ifp)
+            newidx = True
         else:
             # Initial index creation
             #self.ifp = self.softcreate(self.idxname)
@@ -167,11 +294,7 @@ class TwinCore(TwinCoreBase):
 
             # See if valid index
             if indexsize < HEADSIZE:
-                self.create_idx(self.ifp)
-                # It was an existing data, new index needed
-                if self.verbose > 0:
-                    print("Reindexing")
-                self.__reindex()
+                newidx = True
 
         # Check
         if  self.getbuffstr(0, 4) != FILESIG:
@@ -180,8 +303,76 @@ class TwinCore(TwinCoreBase):
             self.lock.unlock()
             raise  RuntimeError("Invalid database signature.")
 
+        # The file decides; hashname only applies to new files
+        try:
+            self.sethash(self.getbuffint(HASHOFFS))
+        except:
+            self.lock.unlock()
+            raise
+        self.hashname = [kk for kk, vv in HASHNAMES.items() \
+                                            if vv == self.hashid][0]
+
+        if newidx:
+            # The 64 bit hashes need the v2 index
+            if self.hashid in HASHWIDE:
+                idxver = IDX_V2
+            self.create_idx(self.ifp, idxver)
+            self.setidxver(idxver)
+            if buffsize >= HEADSIZE:
+                # It was an existing data, new index needed
+                if self.verbose > 0:
+                    print("Reindexing")
+                self.__reindex()
+        else:
+            try:
+                self.setidxver(self.getidxint(IDXVEROFFS))
+            except:
+                self.lock.unlock()
+                raise
+        if self.hashid in HASHWIDE and self.idxver < IDX_V2:
+            self.lock.unlock()
+            raise RuntimeError("The %s hash needs index version 2." \
+                                                        % self.hashname)
+
+        if hashmap:
+            self.hashmap = HashMap(self)
+            self.indexes.append(self.hashmap)
+        if hashfile:
+            self.hashfile = HashFile(self, self.hshname)
+            self.indexes.append(self.hashfile)
+        if vector and np:
+            self.vector = IdxArray(self)
+            self.indexes.append(self.vector)
+        if ordered:
+            self.ordered = OrdIndex(self, self.ordname)
+            self.indexes.append(self.ordered)
+        if bloom:
+            self.bloom = BloomFilter(self, self.blmname, bloom_rate, bloom_size)
+            self.indexes.append(self.bloom)
+        if delmap:
+            self.delmap = DelMap(self, self.delname)
+            self.indexes.append(self.delmap)
+        if trigram:
+            self.trigram = TriIndex(self, self.triname)
+            self.indexes.append(self.trigram)
+        # Last, as it looks at the others
+        if latest:
+            self.latest = LatestMap(self)
+            self.indexes.append(self.latest)
+
+        for ii in self.indexes:
+            ii.sync()
+
+        if durability == DUR_GROUP:
+            self.group = GroupCommit(self, group_msec, group_recs)
+
         #print("buffsize", buffsize, "indexsize", indexsize)
+        if exclusive:
+            # Session; kept until close(). Pinned only now, so the
+            # error paths above let go of it.
+            self.lock.pin()
         self.lock.unlock()
+        self._register()
 
     def version(self):
         return VERSION
@@ -203,13 +394,77 @@ class TwinCore(TwinCoreBase):
         except:
             print("Cannot flush files", sys.exc_info())
 
+    def fsync(self):
+
+        ''' Sync data and index to the device. The data goes first, so
+            the index never points past it. The helper files are not
+            synced, they are rebuilt from these. '''
+
+        fdsync(self.dfd)
+        fdsync(self.ifd)
+
+    def _rdlock(self):
+
+        ''' Lock for reading; shared, so readers in other processes run
+            at the same time. Writers take it exclusive. If a helper with
+            a file is behind the index (a writer without it appended),
+            catching up writes the file, so that is done under the
+            exclusive lock, kept for the rest of the call. '''
+
+        self.lock.waitlock(shared = True)
+        try:
+            dbsize = None
+            for ii in self.indexes:
+                if dbsize is None:
+                    dbsize = self.getdbsize()
+                if ii.behind(dbsize):
+                    self.lock.waitlock()
+                    for jj in self.indexes:
+                        jj.sync()
+                    break
+        except:
+            self.lock.unlock()
+            raise
+
+    def _commit(self, cnt = 1):
+
+        ''' Apply the durability level after writing 'cnt' records. '''
+
+        if self.durability == DUR_FSYNC:
+            self.fsync()
+        elif self.durability == DUR_GROUP:
+            self.group.kick(cnt)
+
+    def _replaced(self):
+
+        ''' Files were renamed into place (vacuum, reindex); with the
+            syncing levels make the new files and the renames durable. '''
+
+        if self.durability not in (DUR_FSYNC, DUR_GROUP):
+            return
+        self.fsync()
+        try:
+            dirfd = os.open(os.path.dirname(os.path.abspath(self.fname)),
+                                                            os.O_RDONLY)
+            try:
+                os.fsync(dirfd)
+            finally:
+                os.close(dirfd)
+        except OSError:
+            # Directories cannot be synced everywhere (Windows)
+            pass
+
     def getdbsize(self):
 
         ''' Return the DB size in records. This includes ALL records, including
         deleted and damaged. This number can be used to iterate all records
         in the database. Usually from end to beginning. '''
 
-        ret = self._getdbsize(self.ifp)
+        self.lock.waitlock(shared = True)
+        try:
+            ret = self._getdbsize(self.ifp)
+        finally:
+            self.lock.unlock()
         if not ret:
             ret = 0
         return ret
@@ -221,27 +476,46 @@ class TwinCore(TwinCoreBase):
         try:
             #chash = self.getidxint(CURROFFS) - HEADSIZE
             chash = self.getsize(ifp) - HEADSIZE
-            ret = int(chash / (2 * self.INTSIZE))
+            ret = int(chash / self.IDXSIZE)
         except:
             ret = 0
 
         return  ret
 
     # --------------------------------------------------------------------
-    def _rec2arr(self, rec):
+    def _rec2arr(self, rec, buf = None):
+
+        ''' Decode record at 'rec'. The fixed part and the key come in one
+            read of RECHINT bytes (it often has the payload too), the
+            payload in at most one more. Pass 'buf' if already read. '''
 
         # Wed 10.Apr.2024 decision is made at the higher level
         arr = []
-        sig = self.getbuffstr(rec, self.INTSIZE)
+        if buf is None:
+            buf = self.getbuffstr(rec, RECHINT)
+        sig = buf[:4]
 
         if sig != RECSIG and sig != RECDEL:
             if self.verbose > 0:
                 print(" Damaged data (sig) '%s' at" % sig, rec)
             return arr
 
-        hash = self.getbuffint(rec+4)
-        blen = self.getbuffint(rec+8)
-        data = self.getbuffstr(rec + 12, blen)
+        if len(buf) < 12:
+            if self.verbose > 0:
+                print(" Damaged data (short) at", rec)
+            return arr
+
+        hash, blen = struct.unpack_from("II", buf, 4)
+        end1 = 24 + blen
+        if len(buf) < end1:
+            # Key longer than the first read
+            buf += self.getbuffstr(rec + len(buf), end1 - len(buf) + RECHINT)
+            if len(buf) < end1:
+                if self.verbose > 0:
+                    print(" Damaged data (short) at", rec)
+                return arr
+
+        data = buf[12:12 + blen]
 
         if self.integrity:
             ccc = self.hash32(data)
@@ -254,16 +528,19 @@ class TwinCore(TwinCoreBase):
 
         #print("%5d pos %5d" % (cnt, rec), "hash %8x" % hash, "ok", ok, "len=", blen, end=" ")
 
-        endd = self.getbuffstr(rec + 12 + blen, self.INTSIZE)
+        endd = buf[12 + blen:16 + blen]
         if endd != RECSEP:
             if self.verbose > 0:
                 print(" Damaged data (sep) '%s' at" % endd, rec)
             return arr
 
-        rec2 = rec + 16 + blen
-        hash2 = self.getbuffint(rec2)
-        blen2 = self.getbuffint(rec2+4)
-        data2 = self.getbuffstr(rec2+8, blen2)
+        hash2, blen2 = struct.unpack_from("II", buf, 16 + blen)
+        end2 = end1 + blen2
+        if len(buf) >= end2:
+            data2 = buf[end1:end2]
+        else:
+            data2 = buf[end1:] + self.getbuffstr(rec + len(buf),
+                                                    end2 - len(buf))
 
         if self.integrity:
             ccc2 = self.hash32(data2)
@@ -286,32 +563,34 @@ class TwinCore(TwinCoreBase):
     # -------------------------------------------------------------------
     # Originator, dump single record
 
-    def  dump_rec(self, rec, cnt):
+    def  dump_rec(self, rec, cnt, scan = None):
+
+        ''' Print record to the screen. Reads through 'scan' if passed. '''
 
-        ''' Print record to the screen. '''
+        src = scan or self
 
         if self.pgdebug > 1:
             print("Dump Rec at", rec)
 
         cnt2 = 0
-        sig = self.getbuffstr(rec, self.INTSIZE)
+        sig = src.getbuffstr(rec, self.INTSIZE)
         if self.pgdebug > 5:
             print("Sig ", sig, "at", rec)
 
         if sig == RECDEL:
             if self.showdel:
-                klen = self.getbuffint(rec+8)
-                kdata = self.getbuffstr(rec+12, klen)
+                klen = src.getbuffint(rec+8)
+                kdata = src.getbuffstr(rec+12, klen)
                 rec2 = rec + 16 + klen
-                blen = self.getbuffint(rec2+4)
-                data = self.getbuffstr(rec2+8, blen)
+                blen = src.getbuffint(rec2+4)
+                data = src.getbuffstr(rec2+8, blen)
                 print(" Del at", rec, "key:", kdata, "data:", truncs(data))
             if self.verbose > 1:
-                klen = self.getbuffint(rec+8)
-                kdata = self.getbuffstr(rec+12, klen)
+                klen = src.getbuffint(rec+8)
+                kdata = src.getbuffstr(rec+12, klen)
                 rec2 = rec + 16 + klen
-                blen = self.getbuffint(rec2+4)
-                data = self.getbuffstr(rec2+8, blen)
+                blen = src.getbuffint(rec2+4)
+                data = src.getbuffstr(rec2+8, blen)
                 if self.verbose > 2:
                     print(" Del at", rec, "key:", kdata, "data:", data)
                 else:
@@ -324,15 +603,15 @@ class TwinCore(TwinCoreBase):
                 print(" Damaged data (sig) '%s' at" % sig, rec)
             return cnt2
 
-        hash = self.getbuffint(rec+4)
-        blen = self.getbuffint(rec+8)
+        hash = src.getbuffint(rec+4)
+        blen = src.getbuffint(rec+8)
 
         if blen < 0:
             if self.verbose > 2:
                 print("Invalid key length %d at %d" % (blen, rec))
             return cnt2
 
-        data = self.getbuffstr(rec+12, blen)
+        data = src.getbuffstr(rec+12, blen)
         if self.integrity:
             ccc = self.hash32(data)
             if self.verbose > 1:
@@ -342,22 +621,22 @@ class TwinCore(TwinCoreBase):
                     print("Error on hash at rec", rec, "hash", hex(hash), "check", hex(ccc))
                 return []
 
-        endd = self.getbuffstr(rec + 12 + blen, self.INTSIZE)
+        endd = src.getbuffstr(rec + 12 + blen, self.INTSIZE)
         if endd != RECSEP:
             if self.verbose > 0:
                 print(" Damaged data (sep) '%s' at" % endd, rec)
             return cnt2
 
         rec2 = rec + 16 + blen
-        hash2 = self.getbuffint(rec2)
-        blen2 = self.getbuffint(rec2+4)
+        hash2 = src.getbuffint(rec2)
+        blen2 = src.getbuffint(rec2+4)
 
         if blen2 < 0:
             if self.verbose > 1:
                 print("Invalid data length %d at %d" % (blen2, rec))
             return cnt2
 
-        data2 = self.getbuffstr(rec2+8, blen2)
+        data2 = src.getbuffstr(rec2+8, blen2)
         if self.integrity:
             ccc2 = self.hash32(data2)
             if self.verbose > 1:
@@ -384,12 +663,15 @@ class TwinCore(TwinCoreBase):
         cnt2 += 1
         return cnt2
 
-    def  check_rec(self, rec, cnt2):
+    def  check_rec(self, rec, cnt2, scan = None):
 
-        ''' Check record. Verbose to the screen. Return number of errors.'''
+        ''' Check record. Verbose to the screen. Return number of errors.
+            Reads through 'scan' if passed. '''
+
+        src = scan or self
 
         ret = 0
-        sig = self.getbuffstr(rec, self.INTSIZE)
+        sig = src.getbuffstr(rec, self.INTSIZE)
 
         # Do not check deleted, say OK
         if sig == RECDEL:
@@ -406,15 +688,15 @@ class TwinCore(TwinCoreBase):
 
             return ret
 
-        hashx = self.getbuffint(rec+4)
-        blen = self.getbuffint(rec+8)
+        hashx = src.getbuffint(rec+4)
+        blen = src.getbuffint(rec+8)
 
         if blen <= 0:
             if self.verbose > 1:
                 print("Invalid key length %d at %d" % (blen, rec))
             return ret
 
-        data = self.getbuffstr(rec+12, blen)
+        data = src.getbuffstr(rec+12, blen)
         ccc = self.hash32(data)
         if hashx != ccc:
             if self.verbose > 1:
@@ -424,22 +706,22 @@ class TwinCore(TwinCoreBase):
                                             hex(hashx), "check", hex(ccc))
             return ret
 
-        endd = self.getbuffstr(rec + 12 + blen, self.INTSIZE)
+        endd = src.getbuffstr(rec + 12 + blen, self.INTSIZE)
         if endd != RECSEP:
             if self.verbose > 0:
                 print(" Damaged data (sep) '%s' at %d %d %d" % (endd, rec, cnt2))
             return ret
 
         rec2 = rec + 16 + blen
-        hash2 = self.getbuffint(rec2)
-        blen2 = self.getbuffint(rec2+4)
+        hash2 = src.getbuffint(rec2)
+        blen2 = src.getbuffint(rec2+4)
 
         if blen2 < 0:
             if self.verbose > 1:
                 print("Invalid data length2 %d at %d" % (blen2, rec))
             return ret
 
-        data2 = self.getbuffstr(rec2+8, blen2)
+        data2 = src.getbuffstr(rec2+8, blen2)
         ccc2 = self.hash32(data2)
         if hash2 != ccc2:
             if self.verbose > 1:
@@ -466,20 +748,19 @@ class TwinCore(TwinCoreBase):
         #    print("dump_data()", "lim =", hex(lim), "skip=", skip, "dirx =", dirx)
 
         cnt = skip; cnt2 = 0
-        curr =  chash = HEADSIZE  + self._getdbsize(self.ifp) * self.INTSIZE * 2
+        curr =  chash = HEADSIZE  + self._getdbsize(self.ifp) * self.IDXSIZE
 
         # Direction sensitivity
         if dirx:
-            rrr = range(HEADSIZE + skip * self.INTSIZE * 2, chash, self.INTSIZE * 2)
+            rrr = range(HEADSIZE + skip * self.IDXSIZE, chash, self.IDXSIZE)
         else:
-            rrr = range(chash - self.INTSIZE * 2, HEADSIZE  - self.INTSIZE * 2, -self.INTSIZE * 2)
-
-        for aa in rrr:
-            rec = self.getidxint(aa)
+            rrr = range(chash - self.IDXSIZE, HEADSIZE  - self.IDXSIZE, -self.IDXSIZE)
 
+        scan = ScanReader(self)
+        for aa, rec in self._scanidx(rrr):
             #print(aa, rec)
             cnt2 += 1
-            ret = self.dump_rec(rec, cnt)
+            ret = self.dump_rec(rec, cnt, scan)
             if not ret:
                 if self.pgdebug > 5:
                     print("Deleted / empty record at", cnt)
@@ -500,28 +781,40 @@ class TwinCore(TwinCoreBase):
 
         self.__dump_data(lim, skip)
 
-    def  reindex(self):
+    def  reindex(self, idxver = None):
 
-        ''' Re create index file. '''
+        ''' Re create index file. Pass idxver to convert the index
+            to that format version (IDX_V1 / IDX_V2). '''
 
         self.lock.waitlock()
-        ret = self.__reindex()
-        self.lock.unlock()
+        try:
+            ret = self.__reindex(idxver)
+        finally:
+            self.lock.unlock()
         return ret
 
     # --------------------------------------------------------------------
 
-    def  __reindex(self):
+    def  __reindex(self, idxver = None):
 
         ''' Recover index. Make sure the DB in not in session.  '''
 
         ret = 0
+        if idxver is None:
+            idxver = self.idxver
+        if idxver not in IDXFORMATS:
+            raise RuntimeError("Unknown index version %d." % idxver)
+        if self.hashid in HASHWIDE and idxver < IDX_V2:
+            raise RuntimeError("The %s hash needs index version 2." \
+                                                        % self.hashname)
+        idxfmt = IDXFORMATS[idxver]
+        idxsize = struct.calcsize(idxfmt)
 
         #curr = self.getbuffint(CURROFFS) - HEADSIZE
-        curr =  self._getdbsize(self.ifp) * self.INTSIZE * 2
+        curr =  self._getdbsize(self.ifp) * self.IDXSIZE
 
         reidx = os.path.splitext(self.fname)[0]  + "_tmp_" + ".pidx"
-        relock = os.path.splitext(self.fname)[0]  + "_tmp_" + ".pidx"
+        relock = os.path.splitext(self.fname)[0]  + "_tmp_" + ".lock"
         # Make sure reidx is empty
         try:
             os.remove(reidx)
@@ -532,20 +825,21 @@ class TwinCore(TwinCoreBase):
         tmplock.waitlock()
 
         tempifp = self.softcreate(reidx)
-        self.create_idx(tempifp)
+        self.create_idx(tempifp, idxver)
         dlen = self.getsize(self.fp)
 
         if self.verbose > 2:
             print("curr", curr, "dlen", dlen)
 
+        scan = ScanReader(self)
         aa =  HEADSIZE
         while 1:
             if aa >= dlen:
                 break
 
-            sig = self.getbuffstr(aa, self.INTSIZE)
+            sig = scan.getbuffstr(aa, self.INTSIZE)
             # Check if sig is correct
-            if sig != RECSIG:
+            if sig != RECSIG and sig != RECDEL:
                 if self.verbose > 0:
                     print("Invalid sig .. resync needed")
                 raise
@@ -553,13 +847,13 @@ class TwinCore(TwinCoreBase):
             #print("reind", aa)
 
             try:
-                hhh2 = self.getbuffint(aa + 4)
-                lenx = self.getbuffint(aa + 8)
+                hhh2 = scan.getbuffint(aa + 4)
+                lenx = scan.getbuffint(aa + 8)
                 if lenx < 0:
                     if self.verbose > 0:
                         print("Invalid key length.")
-                sep =  self.getbuffstr(aa + 12 + lenx, self.INTSIZE)
-                len2 =  self.getbuffint(aa + 20 + lenx)
+                sep =  scan.getbuffstr(aa + 12 + lenx, self.INTSIZE)
+                len2 =  scan.getbuffint(aa + 20 + lenx)
                 if len2 < 0:
                     if self.verbose > 0:
                         print("Invalid record length")
@@ -571,19 +865,19 @@ class TwinCore(TwinCoreBase):
                 print(aa, "sig", sig, "hhh2", hex(hhh2), "len", lenx, \
                     "sep", sep, "len2", len2)
             if self.verbose > 1:
-                data =  self.getbuffstr(aa + 12, lenx)
-                data2 =  self.getbuffstr(aa + 24 + lenx, len2)
+                data =  scan.getbuffstr(aa + 12, lenx)
+                data2 =  scan.getbuffstr(aa + 24 + lenx, len2)
                 print(aa, "sig", sig, "data", data, "data2", data2)
 
+            # The data file has the lower 32 bits only
+            if self.hashid in HASHWIDE:
+                hhh2 = self.hashkey(scan.getbuffstr(aa + 12, lenx))
+
             # Update / Append index
             #hashpos = self._getint(tempifp, CURROFFS)
-            hashpos =  HEADSIZE  + self._getdbsize(tempifp) * self.INTSIZE * 2
-
-            self._putint(tempifp, hashpos, aa)
-            self._putint(tempifp, hashpos + self.INTSIZE, hhh2)
-
-            # This is a shame .. did not flush to file immidiately
-            tempifp.flush()
+            hashpos =  HEADSIZE  + ret * idxsize
+            tempifp.seek(hashpos, io.SEEK_SET)
+            tempifp.write(struct.pack(idxfmt, aa, hhh2))
 
             #self._putint(tempifp, hashpos, self.fp.tell())
 
@@ -597,8 +891,11 @@ class TwinCore(TwinCoreBase):
         # Make it go out of scope
         #self.fp.flush()
         #self.fp.close()
+        self._unmap()
         self.ifp.flush()
         self.ifp.close()
+        for ii in self.indexes:
+            ii.clear()
 
         # Now move files
         try:
@@ -617,7 +914,13 @@ class TwinCore(TwinCoreBase):
         tmplock.unlock()
 
         # Activate new index
-        self.ifp = self.softcreate(self.idxname)
+        self.ifp = self.softcreate(self.idxname, buffering = 0)
+        self.setfds()
+        self.setidxver(idxver)
+        self._replaced()
+
+        for ii in self.indexes:
+            ii.rebuild()
         return ret
 
     def __save_error(self, rec, vacerrfp):
@@ -652,8 +955,10 @@ class TwinCore(TwinCoreBase):
         '''
 
         self.lock.waitlock()
-        ret = self._vacuum()
-        self.lock.unlock()
+        try:
+            ret = self._vacuum()
+        finally:
+            self.lock.unlock()
         return ret
 
     def  _vacuum(self):
@@ -682,15 +987,19 @@ class TwinCore(TwinCoreBase):
 
         # It is used to raise the scope so vacuumed DB closes
         if 1:
-            vacdb = TwinCore(vacname)
+            vacdb = TwinCore(vacname, hashname = self.hashname,
+                                                idxver = self.idxver)
             vacdb.lock.waitlock()
 
             skip = 0; cnt = 0
-            chash =  self._getdbsize(self.ifp) * self.INTSIZE * 2
-            rrr = range(HEADSIZE + skip * self.INTSIZE * 2, chash + HEADSIZE, self.INTSIZE * 2)
-            for aa in rrr:
-                rec = self.getidxint(aa)
-                sig = self.getbuffstr(rec, self.INTSIZE)
+            chash =  self._getdbsize(self.ifp) * self.IDXSIZE
+            rrr = range(HEADSIZE + skip * self.IDXSIZE, chash + HEADSIZE, self.IDXSIZE)
+            if self.delmap:
+                self.delmap.sync()
+            scan = ScanReader(self)
+            recs = []; ents = []; size = 0
+            for aa, rec in self._scanidx(rrr):
+                sig = self._recsig(aa, rec, scan)
                 if sig == RECDEL:
                     ret += 1
                     vac += 1
@@ -703,15 +1012,21 @@ class TwinCore(TwinCoreBase):
                     self.__save_error(rec, vacerrfp)
                 else:
                     self.integrity = True
-                    arr = self.get_rec_byoffs(rec)
+                    arr = self._rec2arr(rec, self._scanrec(scan, rec))
 
                     if self.pgdebug > 1:
                         print(cnt, "vac rec", rec, arr)
 
                     if len(arr) > 1:
-                        hhh2 = self.hash32(arr[0])
+                        hhh2 = self.hashkey(arr[0])
                         hhh3 = self.hash32(arr[1])
-                        vacdb.__save_data(hhh2, arr[0], hhh3, arr[1])
+                        # Written in batches, see save_many()
+                        recs.append(vacdb._mkrec(hhh2, arr[0], hhh3, arr[1]))
+                        ents.append((hhh2, arr[0]))
+                        size += len(recs[-1])
+                        if size >= SAVEBUF:
+                            vacdb._save_many(recs, ents)
+                            recs = []; ents = []; size = 0
                         #vac += 1
                     else:
                         # This could be from empty bacause of hash error
@@ -719,6 +1034,8 @@ class TwinCore(TwinCoreBase):
                         if self.pgdebug > 0:
                             print("Error on vac: %d" % rec)
                 cnt += 1
+            if recs:
+                vacdb._save_many(recs, ents)
 
             vacdb.fp.close()
             vacdb.ifp.close()
@@ -737,8 +1054,11 @@ class TwinCore(TwinCoreBase):
         # Any vacummed?
         if vac > 0:
             # Make it go out of scope
+            self._unmap()
             self.fp.flush(); self.ifp.flush()
             self.fp.close(); self.ifp.close()
+            for ii in self.indexes:
+                ii.clear()
 
             # Now move files
             try:
@@ -770,11 +1090,15 @@ class TwinCore(TwinCoreBase):
                 if self.verbose > 2:
                     print("vacuum idx rename", vacidx, sys.exc_info())
 
-            self.lock.waitlock()
-            self.fp = self.softcreate(self.fname)
-            self.ifp = self.softcreate(self.idxname)
+            self.fp = self.softcreate(self.fname, buffering = 0)
+            self.ifp = self.softcreate(self.idxname, buffering = 0)
+            self.setfds()
+            self._replaced()
             #self.lock.unlock()
 
+            for ii in self.indexes:
+                ii.rebuild()
+
         else:
             # Just remove non vacuumed files
             if self.pgdebug > 1:
@@ -791,9 +1115,22 @@ class TwinCore(TwinCoreBase):
         #print("ended vacuum")
         return ret, vac
 
-    def  get_rec(self, recnum):
+    def  get_rec(self, recnum, view = False):
 
-        ''' Get record from database; recnum is a zero based record counter. '''
+        ''' Get record from database; recnum is a zero based record counter.
+            With 'view' key and data are memoryviews into the data file
+            map instead of copies; see _recview() for how long they
+            stay valid. '''
+
+        self.lock.waitlock(shared = True)
+        try:
+            return self._get_rec(recnum, view)
+        finally:
+            self.lock.unlock()
+
+    def  _get_rec(self, recnum, view = False):
+
+        ''' See get_rec(); no locking. '''
 
         if self.pgdebug:
             print("get_rec()", recnum)
@@ -808,25 +1145,48 @@ class TwinCore(TwinCoreBase):
 
         chash = self.getidxint(CURROFFS)
         #print("chash", chash)
-        offs = self.getidxint(HEADSIZE + recnum * self.INTSIZE * 2)
+        offs = self.getidxoffs(HEADSIZE + recnum * self.IDXSIZE)
 
         #sig = self.getbuffstr(offs, self.INTSIZE)
 
+        if view:
+            return self._rec2arr(offs, self._recview(offs))
         return self._rec2arr(offs)
 
-    def  get_rec_byoffs(self, recoffs):
+    def  _recbuf(self, recoffs, view = False):
 
-        ''' Return record by offset. '''
+        ''' First read of the record for _rec2arr(); raise if past
+            the end of the file. With 'view', the whole record as a
+            memoryview, see _recview(). '''
 
-        rsize = self.getsize(self.fp)
-        if recoffs >= rsize:
+        if view:
+            buf = self._recview(recoffs)
+        else:
+            buf = self.getbuffstr(recoffs, RECHINT)
+        if not buf:
+            rsize = self.getsize(self.fp)
             #print("Past end of data.");
             raise  RuntimeError( \
                     "Past end of File. Asking for offset %d file size is %d." \
                                      % (recoffs, rsize) )
-            return []
+        return buf
 
-        sig = self.getbuffstr(recoffs, self.INTSIZE)
+    def  get_rec_byoffs(self, recoffs, view = False):
+
+        ''' Return record by offset. For 'view' see get_rec(). '''
+
+        self.lock.waitlock(shared = True)
+        try:
+            return self._get_rec_byoffs(recoffs, view)
+        finally:
+            self.lock.unlock()
+
+    def  _get_rec_byoffs(self, recoffs, view = False):
+
+        ''' See get_rec_byoffs(); no locking. '''
+
+        buf = self._recbuf(recoffs, view)
+        sig = buf[:self.INTSIZE]
         if sig == RECDEL:
             if self.verbose:
                 print("Deleted record.")
@@ -835,21 +1195,24 @@ class TwinCore(TwinCoreBase):
                 print("Unlikely offset %d is not at record boundary." % recoffs, sig)
             return []
         #print("recoffs", recoffs)
-        return self._rec2arr(recoffs)
+        return self._rec2arr(recoffs, buf)
 
     def  get_key_offs(self, recoffs):
 
         ''' Get key by offset. '''
 
-        rsize = self.getsize(self.fp)
-        if recoffs >= rsize:
-            #print("Past end of data.");
-            raise  RuntimeError( \
-                    "Past end of File. Asking for offset %d file size is %d." \
-                                     % (recoffs, rsize) )
-            return []
+        self.lock.waitlock(shared = True)
+        try:
+            return self._get_key_offs(recoffs)
+        finally:
+            self.lock.unlock()
 
-        sig = self.getbuffstr(recoffs, self.INTSIZE)
+    def  _get_key_offs(self, recoffs):
+
+        ''' See get_key_offs(); no locking. '''
+
+        buf = self._recbuf(recoffs)
+        sig = buf[:self.INTSIZE]
         if sig == RECDEL:
             if self.verbose:
                 print("Deleted record.")
@@ -859,7 +1222,7 @@ class TwinCore(TwinCoreBase):
                 print("Unlikely offset %d is not at record boundary." % recoffs, sig)
             return []
         #print("recoffs", recoffs)
-        return self._rec2arr(recoffs)[0]
+        return self._rec2arr(recoffs, buf)[0]
 
     def  del_rec(self, recnum):
 
@@ -869,6 +1232,16 @@ class TwinCore(TwinCoreBase):
             Use 'vacuum' to actually remove record.
         '''
 
+        self.lock.waitlock()
+        try:
+            return self._del_rec(recnum)
+        finally:
+            self.lock.unlock()
+
+    def  _del_rec(self, recnum):
+
+        ''' See del_rec(); no locking. '''
+
         if recnum < 0:
             raise  RuntimeError("Invalid recnum %d" % recoffs)
 
@@ -879,7 +1252,7 @@ class TwinCore(TwinCoreBase):
             return False
         chash = self.getidxint(CURROFFS)
         #print("chash", chash)
-        offs = self.getidxint(HEADSIZE + recnum * self.INTSIZE * 2)
+        offs = self.getidxoffs(HEADSIZE + recnum * self.IDXSIZE)
         #print("offs", offs)
         old = self.getbuffstr(offs, self.INTSIZE)
         if old == RECDEL:
@@ -888,12 +1261,25 @@ class TwinCore(TwinCoreBase):
             return False
 
         self.putbuffstr(offs, RECDEL)
+        self._deleted(offs, self.getidxhash(HEADSIZE + \
+                                        recnum * self.IDXSIZE), recnum)
+        self._commit()
         return True
 
     def  del_rec_offs(self, recoffs):
 
         ''' Delete record by file offset. '''
 
+        self.lock.waitlock()
+        try:
+            return self._del_rec_offs(recoffs)
+        finally:
+            self.lock.unlock()
+
+    def  _del_rec_offs(self, recoffs):
+
+        ''' See del_rec_offs(); no locking. '''
+
         if recoffs < 0:
             raise  RuntimeError("Invalid offset %d" % recoffs)
 
@@ -912,8 +1298,80 @@ class TwinCore(TwinCoreBase):
             return False
 
         self.putbuffstr(recoffs, RECDEL)
+        if self.hashid in HASHWIDE:
+            # Only the lower 32 bits are in the data file
+            recnum = self._offs2recnum(recoffs)
+            self._deleted(recoffs, self.getidxhash(HEADSIZE + \
+                                        recnum * self.IDXSIZE), recnum)
+        else:
+            self._deleted(recoffs, self.getbuffint(recoffs + 4))
+        self._commit()
         return True
 
+    def  _deleted(self, offs, hhh, recnum = None):
+
+        ''' Tell the lookup helpers about a deleted record. '''
+
+        for ii in self.indexes:
+            ii.delete(offs, hhh, recnum)
+
+    def  _offs2recnum(self, offs):
+
+        ''' Record number from offset. Offsets grow with the record
+            number, so this is a binary search in the index. '''
+
+        lo = 0; hi = self._getdbsize(self.ifp) - 1
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            moffs = self.getidxoffs(HEADSIZE + mid * self.IDXSIZE)
+            if moffs == offs:
+                return mid
+            if moffs < offs:
+                lo = mid + 1
+            else:
+                hi = mid - 1
+        return -1
+
+    def  _recsig(self, aa, rec, scan = None):
+
+        ''' Signature of record 'rec' at index offset 'aa'. Records in
+            the deleted bitmap are reported as RECDEL without touching
+            the data file. Caller syncs the bitmap once per scan. '''
+
+        if self.delmap and \
+                self.delmap.isdel((aa - HEADSIZE) // self.IDXSIZE):
+            return RECDEL
+        return (scan or self).getbuffstr(rec, self.INTSIZE)
+
+    def  _scanidx(self, rrr):
+
+        ''' Yield (index offset, record offset) for the index offsets in
+            range 'rrr' (either direction); the entries are read
+            SCANBLOCK bytes at a time. '''
+
+        step = max(1, SCANBLOCK // self.IDXSIZE)
+        for bb in range(0, len(rrr), step):
+            part = rrr[bb:bb + step]
+            first = min(part[0], part[-1])
+            pairs = self.getidxpairs(first, len(part))
+            for aa in part:
+                yield aa, pairs[(aa - first) // self.IDXSIZE][0]
+
+    def  _scanrec(self, scan, rec):
+
+        ''' The whole record at 'rec' through the scan reader, for
+            _rec2arr(). Shorter if damaged / truncated. '''
+
+        buf = scan.getbuffstr(rec, 12)
+        if len(buf) < 12:
+            return buf
+        klen = struct.unpack_from("I", buf, 8)[0]
+        buf = scan.getbuffstr(rec, 24 + klen)
+        if len(buf) < 24 + klen:
+            return buf
+        dlen = struct.unpack_from("I", buf, 20 + klen)[0]
+        return scan.getbuffstr(rec, 24 + klen + dlen)
+
     # Check integrity
 
     def integrity_check(self, skip = 0, count = 0xffffffff):
@@ -922,61 +1380,108 @@ class TwinCore(TwinCoreBase):
             Skip number of records.
         '''
 
-        self.lock.waitlock()
-        ret = 0; cnt2 = 0; cnt3 = 0
-        #chash = self.getidxint(CURROFFS)        #;print("chash", chash)
-        chash =  HEADSIZE  + self._getdbsize(self.ifp) * self.INTSIZE * 2
-        # Direction sensitivity
-        rrr = range(HEADSIZE + skip * self.INTSIZE * 2, chash, self.INTSIZE * 2)
-        for aa in rrr:
-            rec = self.getidxint(aa)
-            #print(aa, rec)
-            ret += self.check_rec(rec, cnt2)
-            cnt2 += 1
-            cnt3 += 1
-            if cnt3 >= count:
-                break
-        self.lock.unlock()
+        self._rdlock()
+        try:
+            ret = 0; cnt2 = 0; cnt3 = 0
+            #chash = self.getidxint(CURROFFS)        #;print("chash", chash)
+            chash =  HEADSIZE  + self._getdbsize(self.ifp) * self.IDXSIZE
+            # Direction sensitivity
+            rrr = range(HEADSIZE + skip * self.IDXSIZE, chash, self.IDXSIZE)
+            scan = ScanReader(self)
+            for aa, rec in self._scanidx(rrr):
+                #print(aa, rec)
+                ret += self.check_rec(rec, cnt2, scan)
+                cnt2 += 1
+                cnt3 += 1
+                if cnt3 >= count:
+                    break
+        finally:
+            self.lock.unlock()
         return ret, cnt2
 
-    def  retrieve(self, strx, limx = 1):
+    def  retrieve(self, strx, limx = 1, view = False):
 
-        ''' Retrive in reverse, limit it. Compare by hash.'''
+        ''' Retrive in reverse, limit it. Compare by hash.
+            For 'view' see get_rec(). '''
 
         if type(strx) != type(b""):
             strx = strx.encode(errors='strict')
 
-        hhhh = self.hash32(strx)
+        hhhh = self.hashkey(strx)
         if self.pgdebug > 2:
             print("strx", strx, hhhh)
 
-        #chash = self.getidxint(CURROFFS)
-        chash =  HEADSIZE  + self._getdbsize(self.ifp) * self.INTSIZE * 2
-
-        #;print("chash", chash)
         arr = []
 
-        self.lock.waitlock()
+        self._rdlock()
+        try:
+            for rec in self._hashrecs(hhhh):
+                arr.append(self.get_rec_byoffs(rec, view))
+                if len(arr) >= limx:
+                    break
+        finally:
+            self.lock.unlock()
+
+        return arr
+
+    def  _hashrecs(self, hhhh):
 
-        #for aa in range(HEADSIZE + self.INTSIZE * 2, chash, self.INTSIZE * 2):
-        for aa in range(chash - self.INTSIZE * 2, HEADSIZE  - self.INTSIZE * 2, -self.INTSIZE * 2):
-            rec = self.getidxint(aa)
-            sig = self.getbuffstr(rec, self.INTSIZE)
+        ''' Yield offsets of live records with key hash 'hhhh', latest first.
+            Uses the in-memory hash map, the hash file or the numpy
+            index array if enabled, else scans the index.
+            The bloom filter (if enabled) answers most misses.
+        '''
+
+        if self.bloom:
+            self.bloom.sync()
+            if not self.bloom.maybe(hhhh):
+                return
+
+        if self.hashmap:
+            self.hashmap.sync()
+            rrr = self.hashmap.lookup(hhhh)
+        elif self.hashfile:
+            self.hashfile.sync()
+            rrr = self.hashfile.lookup(hhhh)
+        elif self.vector:
+            self.vector.sync()
+            rrr = self.vector.lookup(hhhh)
+        else:
+            rrr = self._scanhash(hhhh)
+        for rec in rrr:
+            # Signature and hash in one read
+            head = self.getbuffstr(rec, self.INTSIZE * 2)
+            sig = head[:self.INTSIZE]
             if sig == RECDEL:
-                if self.verbose > 3:
+                if self.showdel or self.verbose > 3:
                     print(" Deleted record '%s' at" % sig, rec)
-            elif sig != RECSIG:
-                if self.verbose:
+            elif sig != RECSIG or len(head) < self.INTSIZE * 2:
+                if self.verbose > 0:
                     print(" Damaged data '%s' at" % sig, rec)
             else:
-                hhh = self.getbuffint(rec+4)
-                if hhh == hhhh:
-                    arr.append(self.get_rec_byoffs(rec))
-                    if len(arr) >= limx:
-                        break
-        self.lock.unlock()
-
-        return arr
+                hhh = struct.unpack_from("I", head, self.INTSIZE)[0]
+                if hhh == hhhh & 0xffffffff:
+                    yield rec
+
+    def  _scanhash(self, hhhh):
+
+        ''' Walk the index backwards in chunks, yield the offsets where
+            the index hash matches. Records in the deleted bitmap are
+            skipped; the data file is only read on a match. '''
+
+        if self.delmap:
+            self.delmap.sync()
+        pos = self._getdbsize(self.ifp)
+        while pos > 0:
+            cnt = min(SYNCCHUNK, pos); pos -= cnt
+            pairs = self.getidxpairs(HEADSIZE + pos * self.IDXSIZE, cnt)
+            for nn in range(len(pairs) - 1, -1, -1):
+                offs, hhh = pairs[nn]
+                if hhh != hhhh:
+                    continue
+                if self.delmap and self.delmap.isdel(pos + nn):
+                    continue
+                yield offs
 
     # Return record offset
 
@@ -984,7 +1489,7 @@ class TwinCore(TwinCoreBase):
 
         #chash = self.getidxint(CURROFFS)
         #;print("chash", chash)
-        chash =  HEADSIZE  + self._getdbsize(self.ifp) * self.INTSIZE * 2
+        chash =  HEADSIZE  + self._getdbsize(self.ifp) * self.IDXSIZE
         rec = 0; blen = 0; data = ""
         #arr = []
         if type(strx) != type(b""):
@@ -994,10 +1499,12 @@ class TwinCore(TwinCoreBase):
 
         #print("_recoffset", strx2)
 
-        #for aa in range(HEADSIZE + self.INTSIZE * 2, chash, self.INTSIZE * 2):
-        for aa in range(chash - self.INTSIZE * 2, HEADSIZE  - self.INTSIZE * 2, -self.INTSIZE * 2):
-            rec = self.getidxint(aa)
-            sig = self.getbuffstr(rec, self.INTSIZE)
+        if self.delmap:
+            self.delmap.sync()
+        #for aa in range(HEADSIZE + self.IDXSIZE, chash, self.IDXSIZE):
+        for aa in range(chash - self.IDXSIZE, HEADSIZE  - self.IDXSIZE, -self.IDXSIZE):
+            rec = self.getidxoffs(aa)
+            sig = self._recsig(aa, rec)
             if sig == RECDEL:
                 if self.showdel:
                     print(" Deleted record '%s' at" % sig, rec)
@@ -1023,42 +1530,63 @@ class TwinCore(TwinCoreBase):
         Return record(s).
         '''
 
-        self.lock.waitlock()
-
-        #chash = self.getidxint(CURROFFS)            #;print("chash", chash)
-        chash =  HEADSIZE  + self._getdbsize(self.ifp) * self.INTSIZE * 2
-
+        if type(strx) != type(b""):
+            strx2 = strx.encode(errors='strict')
+        else:
+            strx2 = strx
         arr = []
-        strx2 = strx.encode(errors='strict')
 
         #print("findrec", strx2)
 
-        #for aa in range(HEADSIZE + self.INTSIZE * 2, chash, self.INTSIZE * 2):
-        for aa in range(chash - self.INTSIZE * 2, HEADSIZE  - self.INTSIZE * 2, -self.INTSIZE * 2):
-            rec = self.getidxint(aa)
-            sig = self.getbuffstr(rec, self.INTSIZE)
-            if sig == RECDEL:
-                if self.showdel:
-                    print(" Deleted record '%s' at" % sig, rec)
-            elif sig != RECSIG:
-                if self.verbose > 0:
-                    print(" Damaged data '%s' at" % sig, rec)
-            else:
-                blen = self.getbuffint(rec+8)
-                data = self.getbuffstr(rec + 12, blen)
-                if self.verbose > 1:
-                    print("find", data)
-                #if str(strx2) in str(data):
-                if strx2 in data:
-                    #arr.append(self.get_key_offs(rec))
-                    arr.append(self.get_rec_byoffs(rec))
-                    #arr.append(rec)
-                    if len(arr) >= limx:
-                        break
-        self.lock.unlock()
+        self._rdlock()
+        try:
+            #chash = self.getidxint(CURROFFS)        #;print("chash", chash)
+            chash =  HEADSIZE  + self._getdbsize(self.ifp) * self.IDXSIZE
+
+            if self.delmap:
+                self.delmap.sync()
+            #for aa in range(HEADSIZE + self.IDXSIZE, chash, self.IDXSIZE):
+            for aa in self._subcands(strx2, chash):
+                rec = self.getidxoffs(aa)
+                sig = self._recsig(aa, rec)
+                if sig == RECDEL:
+                    if self.showdel:
+                        print(" Deleted record '%s' at" % sig, rec)
+                elif sig != RECSIG:
+                    if self.verbose > 0:
+                        print(" Damaged data '%s' at" % sig, rec)
+                else:
+                    blen = self.getbuffint(rec+8)
+                    data = self.getbuffstr(rec + 12, blen)
+                    if self.verbose > 1:
+                        print("find", data)
+                    #if str(strx2) in str(data):
+                    if strx2 in data:
+                        #arr.append(self.get_key_offs(rec))
+                        arr.append(self.get_rec_byoffs(rec))
+                        #arr.append(rec)
+                        if len(arr) >= limx:
+                            break
+        finally:
+            self.lock.unlock()
 
         return arr
 
+    def  _subcands(self, strx2, chash):
+
+        ''' Index offsets to look at for a key substring search, latest
+            first. The trigram index (if enabled) narrows it down to the
+            records that have all the trigrams of strx2; else all.
+        '''
+
+        if self.trigram:
+            self.trigram.sync()
+            recs = self.trigram.lookup(strx2)
+            if recs is not None:
+                return [HEADSIZE + rr * self.IDXSIZE for rr in recs]
+        return range(chash - self.IDXSIZE, HEADSIZE  - self.IDXSIZE,
+                                                    -self.IDXSIZE)
+
     def  findrecpos(self, strx, limx = INT_MAX, skipx = 0):
 
         ''' Find record by key, return array of positions. '''
@@ -1066,31 +1594,35 @@ class TwinCore(TwinCoreBase):
         if self.verbose > 1:
             print("findrecpos", strx)
 
-        self.lock.waitlock()
-        chash =  HEADSIZE  + self._getdbsize(self.ifp) * self.INTSIZE * 2
         arr = []
         if type(strx) != type(b""):
             strx = strx.encode(errors='strict')
 
-        for aa in range(chash - self.INTSIZE * 2, HEADSIZE  - self.INTSIZE * 2, -self.INTSIZE * 2):
-            rec = self.getidxint(aa)
-            sig = self.getbuffstr(rec, self.INTSIZE)
-            if sig == RECDEL:
-                if self.showdel:
-                    print(" Deleted record '%s' at" % sig, rec)
-            elif sig != RECSIG:
-                if self.verbose > 0:
-                    print(" Damaged data '%s' at" % sig, rec)
-            else:
-                blen = self.getbuffint(rec+8)
-                data = self.getbuffstr(rec + 12, blen)
-                if self.verbose > 1:
-                    print("frecpos", data)
-                if strx == data:
-                    arr.append((aa - HEADSIZE) //  (self.INTSIZE * 2) )
-                    if len(arr) >= limx:
-                        break
-        self.lock.unlock()
+        self._rdlock()
+        try:
+            chash =  HEADSIZE  + self._getdbsize(self.ifp) * self.IDXSIZE
+            if self.delmap:
+                self.delmap.sync()
+            for aa in range(chash - self.IDXSIZE, HEADSIZE  - self.IDXSIZE, -self.IDXSIZE):
+                rec = self.getidxoffs(aa)
+                sig = self._recsig(aa, rec)
+                if sig == RECDEL:
+                    if self.showdel:
+                        print(" Deleted record '%s' at" % sig, rec)
+                elif sig != RECSIG:
+                    if self.verbose > 0:
+                        print(" Damaged data '%s' at" % sig, rec)
+                else:
+                    blen = self.getbuffint(rec+8)
+                    data = self.getbuffstr(rec + 12, blen)
+                    if self.verbose > 1:
+                        print("frecpos", data)
+                    if strx == data:
+                        arr.append((aa - HEADSIZE) //  self.IDXSIZE)
+                        if len(arr) >= limx:
+                            break
+        finally:
+            self.lock.unlock()
         return arr
 
     def  findrecoffs(self, strx, limx = INT_MAX, skipx = 0):
@@ -1099,36 +1631,42 @@ class TwinCore(TwinCoreBase):
             Return array of offsets.
         '''
 
-        self.lock.waitlock()
-        chash =  HEADSIZE  + self._getdbsize(self.ifp) * self.INTSIZE * 2
         arr = []
         if type(strx) != type(b""):
             strx2 = strx.encode(errors='strict')
+        else:
+            strx2 = strx
 
         #print("findrec", strx2)
 
-        #for aa in range(HEADSIZE + self.INTSIZE * 2, chash, self.INTSIZE * 2):
-        for aa in range(chash - self.INTSIZE * 2, HEADSIZE  - self.INTSIZE * 2, -self.INTSIZE * 2):
-            rec = self.getidxint(aa)
-            sig = self.getbuffstr(rec, self.INTSIZE)
-            if sig == RECDEL:
-                if self.showdel:
-                    print(" Deleted record '%s' at" % sig, rec)
-            elif sig != RECSIG:
-                if self.verbose > 0:
-                    print(" Damaged data '%s' at" % sig, rec)
-            else:
-                blen = self.getbuffint(rec+8)
-                data = self.getbuffstr(rec + 12, blen)
-                if self.verbose > 1:
-                    print("find", data)
-                #if str(strx2) in str(data):
-                if strx2 in data:
-                    #arr.append(self.get_key_offs(rec))
-                    arr.append(rec)
-                    if len(arr) >= limx:
-                        break
-        self.lock.unlock()
+        self._rdlock()
+        try:
+            chash =  HEADSIZE  + self._getdbsize(self.ifp) * self.IDXSIZE
+            if self.delmap:
+                self.delmap.sync()
+            #for aa in range(HEADSIZE + self.IDXSIZE, chash, self.IDXSIZE):
+            for aa in self._subcands(strx2, chash):
+                rec = self.getidxoffs(aa)
+                sig = self._recsig(aa, rec)
+                if sig == RECDEL:
+                    if self.showdel:
+                        print(" Deleted record '%s' at" % sig, rec)
+                elif sig != RECSIG:
+                    if self.verbose > 0:
+                        print(" Damaged data '%s' at" % sig, rec)
+                else:
+                    blen = self.getbuffint(rec+8)
+                    data = self.getbuffstr(rec + 12, blen)
+                    if self.verbose > 1:
+                        print("find", data)
+                    #if str(strx2) in str(data):
+                    if strx2 in data:
+                        #arr.append(self.get_key_offs(rec))
+                        arr.append(rec)
+                        if len(arr) >= limx:
+                            break
+        finally:
+            self.lock.unlock()
         return arr
 
         # --------------------------------------------------------------------
@@ -1138,42 +1676,180 @@ class TwinCore(TwinCoreBase):
 
         ''' List all active records. Return array id record indexes. '''
 
-        self.lock.waitlock()
-        keys = []; arr = []; cnt = 0
+        self._rdlock()
+        try:
+            if self.latest:
+                self.latest.sync()
+                return self.latest.recnums()
+            if self.vector:
+                return self._listall_vector()
+            return self._listall()
+        finally:
+            self.lock.unlock()
+
+    def  _listall(self, bykey = False):
+
+        ''' See listall(); no locking. With 'bykey' records are told
+            apart by key, not by key hash (reads the keys). '''
 
-        chash =  HEADSIZE  + self._getdbsize(self.ifp) * self.INTSIZE * 2
-        maxrec = chash - self.INTSIZE * 2
+        keys = set(); arr = []; cnt = 0
+
+        chash =  HEADSIZE  + self._getdbsize(self.ifp) * self.IDXSIZE
+        maxrec = chash - self.IDXSIZE
         rsize = self._getdbsize(self.ifp) - 1
 
         rrr =  range(maxrec,
-                HEADSIZE - self.INTSIZE * 2, -self.INTSIZE * 2)
+                HEADSIZE - self.IDXSIZE, -self.IDXSIZE)
+        if self.delmap:
+            self.delmap.sync()
         for aa in rrr:
-            rec = self.getidxint(aa)
+            rec = self.getidxoffs(aa)
 
             #print(" Scanning at %d %d" % (rec, cnt))
 
-            sig = self.getbuffstr(rec, self.INTSIZE)
+            sig = self._recsig(aa, rec)
             if sig == RECDEL:
-                if 1: #self.showdel:
+                if self.showdel:
                     print("Deleted record '%s' at" % sig, rec)
             elif sig != RECSIG:
-                if 1: #self.verbose > 0:
+                if self.verbose > 0:
                     print(" Damaged data '%s' at" % sig, rec)
             else:
-                hhh = self.getbuffint(rec+4)
-                print(" Good data '%s' at" % sig, rec, hhh)
+                hhh = self.getidxhash(aa)
+                if bykey:
+                    hhh = (hhh, self.getbuffstr(rec + 12,
+                                            self.getbuffint(rec + 8)))
+                if self.verbose > 2:
+                    print(" Good data '%s' at" % sig, rec, hhh)
                 if hhh not in keys:
-                    keys.append(hhh)
+                    keys.add(hhh)
                     # as we are going backwards
                     arr.append(rsize - cnt)
                     #print("found", hhh)
             cnt += 1
 
-        keys = []
-        self.lock.unlock()
+        keys = None
+
+        return arr
 
+    def  _listall_vector(self):
+
+        ''' Latest entry per hash from the index array; only records
+            that turn out to be deleted need a second look. '''
+
+        self.vector.sync()
+        arr = []
+        for pos in self.vector.latest():
+            rec, hhh = self.vector.arr[pos]
+            if self.getbuffstr(int(rec), self.INTSIZE) == RECSIG:
+                arr.append(pos)
+                continue
+            # Latest is gone, find the newest live one of this hash
+            older = np.nonzero(self.vector.arr[:pos, 1] == hhh)[0]
+            for opos in older[::-1].tolist():
+                orec = int(self.vector.arr[opos, 0])
+                if self.getbuffstr(orec, self.INTSIZE) == RECSIG:
+                    arr.append(opos)
+                    break
+        arr.sort(reverse = True)
         return arr
 
+    def  get_latest(self, keyx):
+
+        ''' Return the newest live record for this key as [key, data],
+            empty list if there is none. Served from the latest version
+            view if enabled (latest = True), else like retrieve(), except
+            that the key is compared, not only its hash.
+        '''
+
+        if type(keyx) != type(b""):
+            keyx = keyx.encode(errors='strict')
+        hhhh = self.hashkey(keyx)
+
+        self._rdlock()
+        try:
+            if not self.latest:
+                for rec in self._hashrecs(hhhh):
+                    arr = self._get_rec_byoffs(rec)
+                    if arr and arr[0] == keyx:
+                        return arr
+                return []
+            self.latest.sync()
+            return self._getlatest(hhhh, keyx)
+        finally:
+            self.lock.unlock()
+
+    def  _getlatest(self, hhhh, keyx):
+
+        ''' Newest live record for a key from the latest view. '''
+
+        while True:
+            recnum = self.latest.lookup(hhhh, keyx)
+            if recnum < 0:
+                return []
+            offs = self.getidxoffs(HEADSIZE + recnum * self.IDXSIZE)
+            if self.getbuffstr(offs, self.INTSIZE) == RECSIG:
+                arr = self._rec2arr(offs)
+                if arr:
+                    return arr
+            # Deleted by someone else, tell the view, try the next one
+            self.latest.delete(offs, hhhh, recnum)
+
+    def  iter_latest(self, limx = INT_MAX):
+
+        ''' Iterate the newest live record of every key, as [key, data],
+            newest first. With the latest version view (latest = True)
+            this reads only the records yielded.
+        '''
+
+        if not self.latest:
+            self._rdlock()
+            try:
+                recs = self._listall(True)
+            finally:
+                self.lock.unlock()
+            for recnum in recs[:limx]:
+                arr = self.get_rec(recnum)
+                if arr:
+                    yield arr
+            return
+
+        self._rdlock()
+        try:
+            self.latest.sync()
+            recs = self.latest.recnums()
+        finally:
+            self.lock.unlock()
+
+        cnt = 0
+        for recnum in recs:
+            if cnt >= limx:
+                break
+            self._rdlock()
+            try:
+                hhhh = self.getidxhash(HEADSIZE + recnum * self.IDXSIZE)
+                offs = self.getidxoffs(HEADSIZE + recnum * self.IDXSIZE)
+                keyx = self.getbuffstr(offs + 12, self.getbuffint(offs + 8))
+                arr = self._getlatest(hhhh, keyx)
+            finally:
+                self.lock.unlock()
+            if arr:
+                cnt += 1
+                yield arr
+
+    def  count_live_keys(self):
+
+        ''' Return the number of keys that have a live record. '''
+
+        self._rdlock()
+        try:
+            if not self.latest:
+                return len(self._listall(True))
+            self.latest.sync()
+            return self.latest.count()
+        finally:
+            self.lock.unlock()
+
     def  find_key(self, keyx, limx = 0xffffffff):
 
         ''' Find record by key value.
@@ -1181,49 +1857,82 @@ class TwinCore(TwinCoreBase):
             This operates on the hash, so it reaches the answer fast.
         '''
 
-        self.lock.waitlock()
-
         skip = 0; arr = []; cnt = 0
         try:
             arg2e = keyx.encode()
         except:
             arg2e = keyx
 
-        hhhh = self.hash32(arg2e)
+        hhhh = self.hashkey(arg2e)
         #print("hashx", "'" + hashx + "'", hex(hhhh), arg2e)
 
-        chash =  HEADSIZE  + self._getdbsize(self.ifp) * self.INTSIZE * 2
-        rrr =  range(chash - self.INTSIZE * 2,
-                HEADSIZE - self.INTSIZE * 2, -self.INTSIZE * 2)
-        for aa in rrr:
-            rec = self.getidxint(aa)
-            #print(" Scanning at %d %d" % (rec, cnt))
+        self._rdlock()
+        try:
+            for rec in self._hashrecs(hhhh):
+                if len(arr) >= limx - 1:
+                    arr.append(["More data ...",])
+                    break
+                arr.append(rec)
+        finally:
+            self.lock.unlock()
 
-            sig = self.getbuffstr(rec, self.INTSIZE)
-            if sig == RECDEL:
-                if self.showdel:
-                    print("Deleted record '%s' at" % sig, rec)
-            elif sig != RECSIG:
-                if self.verbose > 0:
-                    print(" Damaged data '%s' at" % sig, rec)
-            else:
-                hhh = self.getbuffint(rec+4)
-                if hhh == hhhh:
-                    if len(arr) >= limx - 1:
-                        arr.append(["More data ...",])
-                        break
-                    arr.append(rec)
-                else:
-                    pass
-                    #print("no match", hex(hhh))
+        return arr
 
-            cnt += 1
-        self.lock.unlock()
+    def  range(self, start_key = None, end_key = None, limx = INT_MAX,
+                                                        reverse = False):
 
-        return arr
+        ''' Iterate records in key order, start_key <= key < end_key.
+            None leaves that end open. The latest live record is
+            yielded for every key, as [key, data]. Only records in the
+            range are read. Needs the ordered index (ordered = True).
+        '''
+
+        if not self.ordered:
+            raise RuntimeError("Ordered index is not enabled.")
+
+        if start_key is not None and type(start_key) != type(b""):
+            start_key = start_key.encode(errors='strict')
+        if end_key is not None and type(end_key) != type(b""):
+            end_key = end_key.encode(errors='strict')
+
+        self._rdlock()
+        try:
+            self.ordered.sync()
+            groups = self.ordered.between(start_key, end_key, reverse)
+        finally:
+            self.lock.unlock()
+
+        cnt = 0
+        for key, offs in groups:
+            if cnt >= limx:
+                break
+            for rec in offs:
+                if self.getbuffstr(rec, self.INTSIZE) != RECSIG:
+                    continue
+                arr = self.get_rec_byoffs(rec)
+                if arr:
+                    cnt += 1
+                    yield arr
+                    break
+
+    def  prefix(self, key_prefix, limx = INT_MAX, reverse = False):
+
+        ''' Iterate records whose key starts with key_prefix, in key order.
+            See range() for details. '''
+
+        if type(key_prefix) != type(b""):
+            key_prefix = key_prefix.encode(errors='strict')
+
+        # The first key past the prefix; all 0xff has no upper bound
+        endx = key_prefix.rstrip(b"\xff")
+        if endx:
+            endx = endx[:-1] + bytes([endx[-1] + 1])
+        else:
+            endx = None
+        return self.range(key_prefix, endx, limx, reverse)
 
     def idx2offs(self, idx):
-        offs = self.getidxint(HEADSIZE + idx * self.INTSIZE * 2)
+        offs = self.getidxoffs(HEADSIZE + idx * self.IDXSIZE)
         return offs
 
     def  del_data(self, hash, skip = 1):
@@ -1236,8 +1945,8 @@ class TwinCore(TwinCoreBase):
         chash = self.getidxint(CURROFFS)    #;print("chash", chash)
 
         arr = []
-        for aa in range(HEADSIZE + skip * self.INTSIZE * 2, chash, self.INTSIZE * 2):
-            rec = self.getidxint(aa)
+        for aa in range(HEADSIZE + skip * self.IDXSIZE, chash, self.IDXSIZE):
+            rec = self.getidxoffs(aa)
 
             # Optional check
             #sig = self.getbuffstr(rec, self.INTSIZE)
@@ -1272,6 +1981,16 @@ class TwinCore(TwinCoreBase):
 
             '''
 
+        self.lock.waitlock()
+        try:
+            return self._del_rec_bykey(strx, maxdelrec, skip, dirx)
+        finally:
+            self.lock.unlock()
+
+    def  _del_rec_bykey(self, strx, maxdelrec = 0xffffffff, skip = 0, dirx = 0):
+
+        ''' See del_rec_bykey(); no locking. '''
+
         if self.pgdebug:
             print("del_rec_bykey()", strx)
 
@@ -1286,19 +2005,45 @@ class TwinCore(TwinCoreBase):
             print("Start delete ", strx, "skip", skip)
 
         cnt = 0; cnt3 = 0
+        hhhh = self.hashkey(strx)
+
+        if self.bloom:
+            self.bloom.sync()
+            if not self.bloom.maybe(hhhh):
+                return cnt
+
         #chash = self.getidxint(CURROFFS)    #;print("chash", chash)
-        chash =  HEADSIZE  + self._getdbsize(self.ifp) * self.INTSIZE * 2
+        chash =  HEADSIZE  + self._getdbsize(self.ifp) * self.IDXSIZE
+
+        # The hash map / file knows the candidates, latest first
+        if not dirx and (self.hashmap or self.hashfile):
+            for rec in self._hashrecs(hhhh):
+                blen = self.getbuffint(rec+8)
+                data = self.getbuffstr(rec + 12, blen)
+                if strx == data:
+                    if self.verbose > 0:
+                        print("Deleting", rec, data)
+                    self.putbuffstr(rec, RECDEL)
+                    self._deleted(rec, hhhh)
+                    cnt += 1
+                    if cnt >= maxdelrec:
+                        break
+            if cnt:
+                self._commit(cnt)
+            return cnt
 
         # Direction sensitivity
         if dirx:
-            rrr = range(HEADSIZE + skip * self.INTSIZE * 2, chash, self.INTSIZE * 2)
+            rrr = range(HEADSIZE + skip * self.IDXSIZE, chash, self.IDXSIZE)
         else:
-            rrr = range(chash - self.INTSIZE * 2, HEADSIZE  - self.INTSIZE * 2, -self.INTSIZE * 2)
+            rrr = range(chash - self.IDXSIZE, HEADSIZE  - self.IDXSIZE, -self.IDXSIZE)
 
-        #for aa in range(HEADSIZE, chash, self.INTSIZE * 2):
+        if self.delmap:
+            self.delmap.sync()
+        #for aa in range(HEADSIZE, chash, self.IDXSIZE):
         for aa in rrr:
-            rec = self.getidxint(aa)
-            sig = self.getbuffstr(rec, self.INTSIZE)
+            rec = self.getidxoffs(aa)
+            sig = self._recsig(aa, rec)
             if sig == RECDEL:
                 if self.showdel:
                     print(" Deleted record '%s' at" % sig, rec)
@@ -1315,10 +2060,13 @@ class TwinCore(TwinCoreBase):
                     if self.verbose > 0:
                         print("Deleting", cnt3, aa, data)
                     self.putbuffstr(rec, RECDEL)
+                    self._deleted(rec, hhhh, (aa - HEADSIZE) // self.IDXSIZE)
                     cnt += 1
                     if cnt >= maxdelrec:
                         break
             cnt3 += 1
+        if cnt:
+            self._commit(cnt)
         return cnt
 
     def  save_data(self, header, datax, replace = False):
@@ -1343,43 +2091,336 @@ class TwinCore(TwinCoreBase):
             print("Save_data()", header, datax)
 
         self.lock.waitlock()
+        try:
+            if self.preexec:
+                self.preexec(self, header)
+
+            ret = 0 ; was = False
+            # Put new data in place
+            if replace:
+                if type(datax) != type(b""):
+                    mrep2 = datax.encode()
+                else:
+                    mrep2 = datax
+
+                rrr = self._recoffset(header, 1)
+                arr = self.get_rec_byoffs(rrr[0])
+                #print(arr)
+                if arr:
+                    #print("Replace rec", arr[1], "len:", arr[1])
+                    if len(mrep2) <= len(arr[1]):
+                        padded = mrep2 + b' ' * (len(arr[1]) - len(mrep2) )
+                        #print("Padded", b"'" + padded + b"'")
+                        ccc = self.hash32(padded)
+                        self.putbuffint(rrr[1] - 8, ccc)
+                        #print("ccc", hex(ccc))
+                        self.putbuffstr(rrr[1], padded)
+                        self._commit()
+                        was = True
+                        ret =  rrr[0]
+            if not was:
+                #print("Saving longer data", header, datax)
+                ret = self._save_data2(header, datax)
+
+            if self.postexec:
+                self.postexec(self, header)
+        finally:
+            self.lock.unlock()
 
-        if self.preexec:
-            self.preexec(self, header)
+        return ret
 
-        ret = 0 ; was = False
-        # Put new data in place
-        if replace:
-            if type(datax) != type(b""):
-                mrep2 = datax.encode()
-            else:
-                mrep2 = datax
+    def  save_many(self, pairs):
 
-            rrr = self._recoffset(header, 1)
-            arr = self.get_rec_byoffs(rrr[0])
-            #print(arr)
-            if arr:
-                #print("Replace rec", arr[1], "len:", arr[1])
-                if len(mrep2) <= len(arr[1]):
-                    padded = mrep2 + b' ' * (len(arr[1]) - len(mrep2) )
-                    #print("Padded", b"'" + padded + b"'")
-                    ccc = self.hash32(padded)
-                    self.putbuffint(rrr[1] - 8, ccc)
-                    #print("ccc", hex(ccc))
-                    self.putbuffstr(rrr[1], padded)
-                    was = True
-                    ret =  rrr[0]
-        if not was:
-            #print("Saving longer data", header, datax)
-            ret = self._save_data2(header, datax)
+        ''' Append many records. The lock is taken once; records and
+            index entries are assembled into one buffer each, and written
+            with one write per file (per SAVEBUF bytes of data).
+            The pre / post callbacks are called for every record.
+
+                    Input:
+                        pairs      Iterable of (header, data)
+
+                     Return:
+                        List of offsets of saved data
+        '''
+
+        if self.pgdebug > 0:
+            print("save_many()")
+
+        self.lock.waitlock()
+        ret = []
+        try:
+            recs = []; ents = []; size = 0
+            for header, datax in pairs:
+                if type(header) != type(b""):
+                    header = header.encode()
+                if type(datax) != type(b""):
+                    datax = datax.encode()
+                if self.preexec:
+                    self.preexec(self, header)
+                hhh2 = self.hashkey(header)
+                rec = self._mkrec(hhh2, header, self.hash32(datax), datax)
+                recs.append(rec); ents.append((hhh2, header))
+                size += len(rec)
+                if size >= SAVEBUF:
+                    ret += self._save_many(recs, ents)
+                    recs = []; ents = []; size = 0
+            if recs:
+                ret += self._save_many(recs, ents)
+        finally:
+            self.lock.unlock()
+        return ret
+
+    def  _save_many(self, recs, ents):
+
+        ''' Write assembled records and their index entries. '''
+
+        arr = []
+        with self.wlock:
+            curr =  HEADSIZE  + self._getdbsize(self.ifp) * self.IDXSIZE
+            dcurr = self.appendbuff(b"".join(recs))
+            idx = []
+            for rec, (hhh2, header) in zip(recs, ents):
+                idx.append(struct.pack(self.idxfmt, dcurr, hhh2))
+                arr.append(dcurr)
+                dcurr += len(rec)
+            self.putidxstr(curr, b"".join(idx))
+
+            recnum = (curr - HEADSIZE) // self.IDXSIZE
+            for ii in self.indexes:
+                if ii.covered != recnum:
+                    ii.sync()
+                    continue
+                for cnt, (hhh2, header) in enumerate(ents):
+                    ii.add(recnum + cnt, arr[cnt], hhh2, header)
+        self._commit(len(arr))
 
         if self.postexec:
-            self.postexec(self, header)
+            for hhh2, header in ents:
+                self.postexec(self, header)
+        return arr
 
-        self.lock.unlock()
+    def  save_stream(self, header, fileobj, length):
+
+        ''' Append a record of 'length' bytes of data read from 'fileobj'
+            (readinto() or read()), in pieces of STREAMBUF; the payload
+            is never in memory whole. The data hash is computed on the
+            way. A short read raises RuntimeError, and nothing is saved.
+
+                    Input:
+                        header     Header
+                        fileobj    Binary file object to read data from
+                        length     Number of bytes of data
+
+                     Return:
+                        The offset of saved data
+        '''
 
+        if type(header) != type(b""):
+            header = header.encode()
+
+        self.lock.waitlock()
+        try:
+            if self.preexec:
+                self.preexec(self, header)
+            hhh2 = self.hashkey(header)
+            with self.wlock:
+                ret = self._save_stream(hhh2, header, fileobj, length)
+            self._commit()
+            if self.postexec:
+                self.postexec(self, header)
+        finally:
+            self.lock.unlock()
         return ret
 
+    def  _save_stream(self, hhh2, header, fileobj, length):
+
+        ''' See save_stream(); call with wlock held. The record head goes
+            first with a zero data hash, filled in after the data. '''
+
+        curr =  HEADSIZE  + self._getdbsize(self.ifp) * self.IDXSIZE
+        head = RECSIG + struct.pack("II", hhh2 & 0xffffffff, len(header)) + \
+                    header + RECSEP + struct.pack("II", 0, length)
+        dcurr = self.appendbuff(head)
+        pos = dcurr + len(head)
+        hh = StreamHash(self.hashid)
+        buf = memoryview(bytearray(min(STREAMBUF, length) or 1))
+        left = length
+        try:
+            while left:
+                view = buf[:min(left, len(buf))]
+                if hasattr(fileobj, "readinto"):
+                    cnt = fileobj.readinto(view)
+                else:
+                    val = fileobj.read(len(view))
+                    cnt = len(val)
+                    view[:cnt] = val
+                if not cnt:
+                    raise RuntimeError("Short stream, %d of %d bytes missing." \
+                                                            % (left, length))
+                hh.update(view[:cnt])
+                pwrite(self.dfd, view[:cnt], pos)
+                pos += cnt; left -= cnt
+        except:
+            # No index entry yet; take it back
+            os.ftruncate(self.dfd, dcurr)
+            raise
+        self.putbuffint(dcurr + len(head) - 8, hh.value())
+
+        # Data first, so a reader never sees an index entry without it
+        self.putidxent(curr, dcurr, hhh2)
+        recnum = (curr - HEADSIZE) // self.IDXSIZE
+        for ii in self.indexes:
+            if ii.covered == recnum:
+                ii.add(recnum, dcurr, hhh2, header)
+            else:
+                ii.sync()
+        return dcurr
+
+    def  open_value(self, strx):
+
+        ''' Open the data of the latest record with key 'strx' as a read
+            only file object (ValueFile), for reading large values in
+            pieces, or copyto() a socket / file in the kernel. The key is
+            compared, not only its hash. Return None if not found. '''
+
+        if type(strx) != type(b""):
+            strx = strx.encode(errors='strict')
+
+        hhhh = self.hashkey(strx)
+        self._rdlock()
+        try:
+            fsize = self.getsize(self.fp)
+            for rec in self._hashrecs(hhhh):
+                klen = self.getbuffint(rec + 8)
+                if klen != len(strx) or \
+                        self.getbuffstr(rec + 12, klen) != strx:
+                    # Another key, same hash
+                    continue
+                dlen = self.getbuffint(rec + 20 + klen)
+                if rec + 24 + klen + dlen > fsize:
+                    if self.verbose > 0:
+                        print(" Damaged data (short) at", rec)
+                    continue
+                return ValueFile(self.dfd, rec + 24 + klen, dlen)
+        finally:
+            self.lock.unlock()
+        return None
+
+    def  bulk_load(self, src, fmt = None, workers = None):
+
+        ''' Append records from a TSV / NDJSON file, see BULKFORMATS.
+            The input is read in BULKCHUNK pieces, the records are built
+            and hashed in a pool of worker processes, and written in
+            order with one data and one index write per piece. The lock
+            is held for the whole load; the lookup helpers catch up at
+            the end. Not all or nothing: if a piece fails (bad input, a
+            worker gone), the pieces before it stay, and BulkLoadError
+            is raised with their count in 'loaded'.
+
+                    Input:
+                        src        File name or binary file object
+                        fmt        "tsv" or "ndjson"; default from the
+                                   file name extension, else tsv
+                        workers    Worker processes; default CPU count,
+                                   1 builds the records in this process
+
+                     Return:
+                        Number of records loaded
+        '''
+
+        if fmt is None:
+            fmt = BULK_TSV
+            if type(src) == type(""):
+                ext = os.path.splitext(src)[1].lower()
+                if ext in (".ndjson", ".jsonl", ".json"):
+                    fmt = BULK_NDJSON
+        if fmt not in BULKFORMATS:
+            raise RuntimeError("Unknown bulk load format '%s'." % fmt)
+        if workers is None:
+            workers = os.cpu_count() or 1
+
+        fp = src
+        if type(src) == type(""):
+            fp = open(src, "rb")
+
+        cnt = 0
+        self.lock.waitlock()
+        try:
+            try:
+                with self.wlock:
+                    cnt = self._bulk_load(fp, fmt, workers)
+            except BulkLoadError as err:
+                cnt = err.loaded
+                raise
+            finally:
+                # What was written, also on failure
+                for ii in self.indexes:
+                    ii.sync()
+                if cnt:
+                    self._commit(cnt)
+        finally:
+            self.lock.unlock()
+            if fp is not src:
+                fp.close()
+        return cnt
+
+    def  _bulk_load(self, fp, fmt, workers):
+
+        ''' Write the chunks as they come back from the workers. '''
+
+        typecode = "I" if self.idxver == IDX_V1 else "Q"
+        chunks = iter(lambda: fp.readlines(BULKCHUNK), [])
+        if workers > 1:
+            results = self._bulk_pool(chunks, fmt, typecode, workers)
+        else:
+            results = (bulk_chunk(self.hashid, fmt, typecode, cc)
+                                                        for cc in chunks)
+        cnt = 0
+        dcurr = os.fstat(self.dfd).st_size
+        curr =  HEADSIZE  + self._getdbsize(self.ifp) * self.IDXSIZE
+        try:
+            for data, offs, hashes in results:
+                if not offs:
+                    continue
+                try:
+                    idx = array.array(typecode,
+                                        bytes(len(offs) * self.IDXSIZE))
+                    idx[0::2] = array.array(typecode,
+                                        [oo + dcurr for oo in offs])
+                except OverflowError:
+                    raise RuntimeError("Data file over 4 GiB needs "
+                                                    "index version 2.")
+                idx[1::2] = hashes
+                pwrite(self.dfd, data, dcurr)
+                pwrite(self.ifd, idx.tobytes(), curr)
+                dcurr += len(data); curr += len(offs) * self.IDXSIZE
+                cnt += len(offs)
+        except Exception as err:
+            raise BulkLoadError("Bulk load stopped after %d records: %s" \
+                                                % (cnt, err), cnt) from err
+        return cnt
+
+    def  _bulk_pool(self, chunks, fmt, typecode, workers):
+
+        ''' Build chunks in worker processes; in input order, with a
+            bounded number in flight. The workers are not forked: other
+            threads (group commit, the caller's) may hold locks just
+            then, a forked child would have them held for good. '''
+
+        methods = multiprocessing.get_all_start_methods()
+        ctx = multiprocessing.get_context("forkserver" \
+                            if "forkserver" in methods else "spawn")
+        with concurrent.futures.ProcessPoolExecutor(workers,
+                                            mp_context = ctx) as pool:
+            pending = collections.deque()
+            for cc in chunks:
+                pending.append(pool.submit(bulk_chunk, self.hashid, fmt,
+                                                            typecode, cc))
+                if len(pending) > 2 * workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
     # --------------------------------------------------------------------
     # Save data to database file
 
@@ -1394,7 +2435,7 @@ class TwinCore(TwinCoreBase):
         if self.pgdebug > 1:
             print("Save_data2() args", arg2, "arg3", arg3)
 
-        hhh2 = self.hash32(arg2)
+        hhh2 = self.hashkey(arg2)
         hhh3 = self.hash32(arg3)
 
         if self.pgdebug > 1:
@@ -1404,62 +2445,97 @@ class TwinCore(TwinCoreBase):
 
         return ret
 
-    def __save_data(self, hhh2, arg2e, hhh3, arg3e):
+    def _mkrec(self, hhh2, arg2e, hhh3, arg3e):
 
-        ''' Update / Append data. Note the doyuble underscore '''
+        ''' Assemble record bytes. '''
 
         # Building array added some efficiency
         arr = []
         arr.append(RECSIG)
-        arr.append(struct.pack("I", hhh2))
+        arr.append(struct.pack("I", hhh2 & 0xffffffff))
         arr.append(struct.pack("I", len(arg2e)))
         arr.append(arg2e)
         arr.append(RECSEP)
         arr.append(struct.pack("I", hhh3))
         arr.append(struct.pack("I", len(arg3e)))
         arr.append(arg3e)
-        tmp = b"".join(arr)
+        return b"".join(arr)
+
+    def __save_data(self, hhh2, arg2e, hhh3, arg3e):
+
+        ''' Update / Append data. Note the doyuble underscore '''
+
+        tmp = self._mkrec(hhh2, arg2e, hhh3, arg3e)
 
         #print(tmp)
         # The pre - assemple to string added 20% efficiency
 
-        #curr = self.getbuffint(CURROFFS)
-        curr =  HEADSIZE  + self._getdbsize(self.ifp) * self.INTSIZE * 2
-        #print("curr", curr)
-
-        self.fp.seek(0, os.SEEK_END)
-        dcurr = self.fp.tell()
+        # Other threads of this process pass the file lock; appends
+        # are serialized here. Readers use positional reads, no need.
+        with self.wlock:
+            #curr = self.getbuffint(CURROFFS)
+            curr =  HEADSIZE  + self._getdbsize(self.ifp) * self.IDXSIZE
+            #print("curr", curr)
 
-        self.fp.write(tmp)
+            # Data first, so a reader never sees an index entry without it
+            dcurr = self.appendbuff(tmp)
 
-        # This allowed corruption of the data string
-        # Update lenght
-        #self.putbuffint(CURROFFS, self.fp.tell()) #// - dlink + DATA_LIM)
-        #self.fp.seek(curr)
-        #print("hashpos", hashpos)
+            # This allowed corruption of the data string
+            # Update lenght
+            #self.putbuffint(CURROFFS, self.fp.tell()) #// - dlink + DATA_LIM)
+            #self.fp.seek(curr)
+            #print("hashpos", hashpos)
 
-        # Update / Append index
-        if self.pgdebug > 1:
-            print("__save_data idx", dcurr)
+            # Update / Append index
+            if self.pgdebug > 1:
+                print("__save_data idx", dcurr)
 
-        self.putidxint(curr, dcurr)
-        self.putidxint(curr + self.INTSIZE, hhh2)
-        #self.putidxint(CURROFFS, self.ifp.tell())
+            self.putidxent(curr, dcurr, hhh2)
+            #self.putidxint(CURROFFS, self.ifp.tell())
 
-        self.fp.flush()
-        self.ifp.flush()
+            recnum = (curr - HEADSIZE) // self.IDXSIZE
+            for ii in self.indexes:
+                if ii.covered == recnum:
+                    ii.add(recnum, dcurr, hhh2, arg2e)
+                else:
+                    ii.sync()
 
+        self._commit()
         return dcurr
 
-    def __del__(self):
+    def __enter__(self):
+        return self
 
-        ''' flush file handles and close files. '''
+    def __exit__(self, *args):
+        self.close()
 
-        if hasattr(self, "pgdebug"):
-            if self.pgdebug > 9:
-                print("__del__ called.")
+    def close(self):
 
-        #self.flush()
+        ''' Flush and close the files; ends an exclusive session. The
+            handle is not usable after this. A shared handle (see
+            __new__) closes with the last user. '''
+
+        with _reglock:
+            self.refs -= 1
+            if self.refs > 0:
+                return
+            key = self.__dict__.get("regkey")
+            if key is not None and _registry.get(key) is self:
+                del _registry[key]
+        self._close()
+
+    def _close(self):
+
+        if getattr(self, "group", None):
+            self.group.stop()
+            self.group = None
+            try:
+                self.fsync()
+            except (OSError, ValueError):
+                pass
+
+        if hasattr(self, "dmap"):
+            self._unmap()
 
         if hasattr(self, "fp"):
             if self.fp:
@@ -1473,6 +2549,26 @@ class TwinCore(TwinCoreBase):
                     self.ifp.flush()
                     self.ifp.close()
 
+        if hasattr(self, "indexes"):
+            for ii in self.indexes:
+                ii.close()
+            self.indexes = []
+
+        if hasattr(self, "lock"):
+            self.lock.unpin()
+
+    def __del__(self):
+
+        ''' flush file handles and close files. '''
+
+        if hasattr(self, "pgdebug"):
+            if self.pgdebug > 9:
+                print("__del__ called.")
+
+        #self.flush()
+
+        self._close()
+
         # remove lockfile
         if hasattr(self, "lock"):
             self.lock.unlock()
@@ -0,0 +1,1220 @@
+#!/usr/bin/env python3
+
+'''!
+    twinindex -- optional lookup helpers kept alongside the twin files.
+
+    Each helper covers the first 'covered' entries of the index file.
+    New entries are fed in by the core as they are appended; sync()
+    catches up with entries appended by other processes, and rebuild()
+    starts from scratch (used after reindex / vacuum, or when the index
+    shrunk under us).
+'''
+
+import  os, sys, bisect, heapq, math, array, functools
+
+base = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(base, '..', 'pydbase'))
+
+from twinbase import *
+
+try:
+    import numpy as np
+except:
+    np = None
+
+SYNCCHUNK   = 0x10000           ##< Index entries read in one go on sync
+
+HASHSIG     = b"PYHX"
+HASHMIN     = 1024              ##< Minimum number of hash file slots
+HASHPAGE    = 512               ##< Slots read in one go when probing
+
+ORDSIG      = b"PYOX"
+ORDTAIL     = 4096              ##< Unsorted tail entries before merging
+
+BLMSIG      = b"PYBF"
+DELSIG      = b"PYDL"
+
+TRISIG      = b"PYTG"
+TRITAIL     = 4096              ##< Keys in the trigram log before merging
+
+def _locked(func):
+
+    ''' Run the method under the core's helper lock; a handle may be
+        shared by threads, and the helpers keep state (and files) of
+        their own. Reentrant, helpers call each other. '''
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        with self.core.hlock:
+            return func(self, *args, **kwargs)
+    return wrapper
+
+class TwinIndex():
+
+    ''' Base class for the lookup helpers. '''
+
+    def __init__(self, core):
+        self.core = core
+        self.covered = 0
+
+    @_locked
+    def sync(self):
+
+        ''' Add index entries that were appended since we last looked. '''
+
+        dbsize = self.core.getdbsize()
+        if dbsize < self.covered:
+            self.rebuild()
+            return
+        while self.covered < dbsize:
+            cnt = min(SYNCCHUNK, dbsize - self.covered)
+            pairs = self.core.getidxpairs(HEADSIZE + \
+                        self.covered * self.core.IDXSIZE, cnt)
+            if not pairs:
+                break
+            for offs, hhh in pairs:
+                self.add(self.covered, offs, hhh)
+
+    @_locked
+    def rebuild(self):
+
+        ''' Throw away what we have, re-read the whole index. '''
+
+        self.clear()
+        self.covered = 0
+        self.sync()
+
+    def clear(self):
+        pass
+
+    @_locked
+    def behind(self, dbsize):
+        ''' True if a sync() would write our file, as it misses records
+            the index has. Only the ones with a file say so. '''
+        return False
+
+    @_locked
+    def add(self, recnum, offs, hhh, key = None):
+        ''' Called on every appended record (in order). The key is
+            passed in on save, None when catching up from the index. '''
+        self.covered = recnum + 1
+
+    @_locked
+    def delete(self, offs, hhh, recnum = None):
+        ''' Called when the record at 'offs' is marked deleted.
+            The record number is passed in if the caller knows it. '''
+        pass
+
+    def close(self):
+        pass
+
+# ------------------------------------------------------------------------
+
+class HashMap(TwinIndex):
+
+    '''
+        In memory map of key hash -> record offsets.
+        A single record is stored as a bare int, more records (same key,
+        or colliding hash) as a list in save order. Lookups are served
+        newest first.
+    '''
+
+    def __init__(self, core):
+        super(HashMap, self).__init__(core)
+        self.hmap = {}
+
+    def clear(self):
+        self.hmap = {}
+
+    @_locked
+    def add(self, recnum, offs, hhh, key = None):
+        old = self.hmap.get(hhh)
+        if old is None:
+            self.hmap[hhh] = offs
+        elif type(old) == list:
+            old.append(offs)
+        else:
+            self.hmap[hhh] = [old, offs]
+        self.covered = recnum + 1
+
+    @_locked
+    def delete(self, offs, hhh, recnum = None):
+        old = self.hmap.get(hhh)
+        if old is None:
+            return
+        if type(old) == list:
+            try:
+                old.remove(offs)
+            except ValueError:
+                pass
+            if len(old) == 1:
+                self.hmap[hhh] = old[0]
+        elif old == offs:
+            del self.hmap[hhh]
+
+    @_locked
+    def lookup(self, hhh):
+
+        ''' Return list of offsets for this hash, newest first. '''
+
+        old = self.hmap.get(hhh)
+        if old is None:
+            return []
+        if type(old) == list:
+            return old[::-1]
+        return [old]
+
+# ------------------------------------------------------------------------
+
+class HashFile(TwinIndex):
+
+    '''
+        On disk open addressing hash table, key hash -> record offset.
+
+        32 byte header: HASHSIG, capacity, count, covered, slot size;
+        followed by 'capacity' slots of hash / offset (4 bytes each, 8
+        with the v2 index). Empty slots have a zero offset (no record can
+        start there). Collisions are resolved by linear probing; the
+        table doubles when half full. Deleted records are left in; the
+        reader checks the signature.
+    '''
+
+    def __init__(self, core, fname):
+        super(HashFile, self).__init__(core)
+        self.fname = fname
+        self.cap = 0; self.count = 0
+        self.hfp = core.softcreate(fname, buffering = 0)
+        if core.getsize(self.hfp) < HEADSIZE or not self._readhead():
+            self.rebuild()
+
+    def _readhead(self):
+        self.hfp.seek(0, io.SEEK_SET)
+        head = self.hfp.read(20)
+        if len(head) < 20 or head[:4] != HASHSIG:
+            return False
+        self.cap, self.count, self.covered, ssize = \
+                                        struct.unpack("IIII", head[4:])
+        # Zero is from before the slot size was recorded
+        if (ssize or 8) != self.core.IDXSIZE:
+            return False
+        return self.cap > 0
+
+    def _puthead(self):
+        self.hfp.seek(0, io.SEEK_SET)
+        self.hfp.write(HASHSIG + struct.pack("IIII", self.cap, self.count,
+                                    self.covered, self.core.IDXSIZE))
+
+    @_locked
+    def sync(self):
+
+        ''' Re-read the header, others may have added to it. '''
+
+        if not self._readhead():
+            self.rebuild()
+            return
+        dbsize = self.core.getdbsize()
+        # Far behind, cheaper to build it from scratch
+        if dbsize < self.covered or dbsize - self.covered > self.cap // 4:
+            self.rebuild()
+            return
+        super(HashFile, self).sync()
+
+    @_locked
+    def behind(self, dbsize):
+        return not self._readhead() or self.covered < dbsize
+
+    @_locked
+    def rebuild(self):
+
+        ''' Build the table in memory from the index, write it in one go. '''
+
+        dbsize = self.core.getdbsize()
+        cap = HASHMIN
+        while cap < dbsize * 2:
+            cap *= 2
+        table = bytearray(cap * self.core.IDXSIZE)
+        self.covered = 0
+        while self.covered < dbsize:
+            cnt = min(SYNCCHUNK, dbsize - self.covered)
+            pairs = self.core.getidxpairs(HEADSIZE + \
+                        self.covered * self.core.IDXSIZE, cnt)
+            if not pairs:
+                break
+            for offs, hhh in pairs:
+                self._slotput(table, cap, hhh, offs)
+            self.covered += len(pairs)
+
+        self.cap = cap; self.count = self.covered
+        self.hfp.seek(0, io.SEEK_SET)
+        self.hfp.truncate(HEADSIZE)
+        self.hfp.write(bytearray(HEADSIZE))
+        self._puthead()
+        self.hfp.seek(HEADSIZE, io.SEEK_SET)
+        self.hfp.write(table)
+        self.hfp.flush()
+
+    def _slotput(self, table, cap, hhh, offs):
+        ssize = self.core.IDXSIZE; sfmt = self.core.idxfmt
+        slot = hhh % cap
+        while True:
+            if struct.unpack_from(sfmt, table, slot * ssize)[1] == 0:
+                struct.pack_into(sfmt, table, slot * ssize, hhh, offs)
+                break
+            slot = (slot + 1) % cap
+
+    @_locked
+    def add(self, recnum, offs, hhh, key = None):
+
+        if (self.count + 1) * 2 > self.cap:
+            self._grow()
+
+        slot = hhh % self.cap
+        while True:
+            pairs = self._readslots(slot, HASHPAGE)
+            for cnt, (hh, oo) in enumerate(pairs):
+                if oo == 0:
+                    break
+            else:
+                slot = (slot + len(pairs)) % self.cap
+                continue
+            slot = (slot + cnt) % self.cap
+            break
+
+        self.hfp.seek(HEADSIZE + slot * self.core.IDXSIZE, io.SEEK_SET)
+        self.hfp.write(struct.pack(self.core.idxfmt, hhh, offs))
+        self.count += 1
+        self.covered = recnum + 1
+        self._puthead()
+        self.hfp.flush()
+
+    def _grow(self):
+
+        ''' Double the table, re-insert what we have. '''
+
+        self.hfp.seek(HEADSIZE, io.SEEK_SET)
+        old = self.hfp.read(self.cap * self.core.IDXSIZE)
+        cap = self.cap * 2
+        table = bytearray(cap * self.core.IDXSIZE)
+        for hhh, offs in struct.iter_unpack(self.core.idxfmt, old):
+            if offs:
+                self._slotput(table, cap, hhh, offs)
+        self.cap = cap
+        self._puthead()
+        self.hfp.seek(HEADSIZE, io.SEEK_SET)
+        self.hfp.write(table)
+
+    def _readslots(self, slot, cnt):
+
+        ''' Read up to 'cnt' slots, not wrapping past the table end. '''
+
+        cnt = min(cnt, self.cap - slot)
+        self.hfp.seek(HEADSIZE + slot * self.core.IDXSIZE, io.SEEK_SET)
+        return list(struct.iter_unpack(self.core.idxfmt,
+                            self.hfp.read(cnt * self.core.IDXSIZE)))
+
+    @_locked
+    def lookup(self, hhh):
+
+        ''' Return list of offsets for this hash, newest first. '''
+
+        arr = []
+        if not self.cap:
+            return arr
+        slot = hhh % self.cap; done = 0
+        while done < self.cap:
+            pairs = self._readslots(slot, HASHPAGE)
+            for hh, oo in pairs:
+                if oo == 0:
+                    arr.sort(reverse = True)
+                    return arr
+                if hh == hhh:
+                    arr.append(oo)
+            done += len(pairs)
+            slot = (slot + len(pairs)) % self.cap
+        arr.sort(reverse = True)
+        return arr
+
+    def close(self):
+        if self.hfp and not self.hfp.closed:
+            self.hfp.close()
+
+# ------------------------------------------------------------------------
+
+class IdxArray(TwinIndex):
+
+    '''
+        The index body memory mapped as a numpy uint32 array of shape
+        (n, 2), uint64 with the v2 index; column 0 is the offset, column
+        1 the key hash. Matching a hash is one vectorized compare.
+        Remapped when the index grows.
+    '''
+
+    def __init__(self, core):
+        super(IdxArray, self).__init__(core)
+        self.arr = None
+
+    def clear(self):
+        self.arr = None
+
+    @_locked
+    def sync(self):
+        dbsize = self.core.getdbsize()
+        if self.arr is not None and len(self.arr) == dbsize:
+            return
+        dtype = np.uint32 if self.core.idxver == IDX_V1 else np.uint64
+        if dbsize == 0:
+            self.arr = np.zeros((0, 2), dtype = dtype)
+        else:
+            self.arr = np.memmap(self.core.idxname, dtype = dtype,
+                            mode = "r", offset = HEADSIZE, shape = (dbsize, 2))
+        self.covered = dbsize
+
+    @_locked
+    def lookup(self, hhh):
+
+        ''' Return list of offsets for this hash, newest first. '''
+
+        nz = np.nonzero(self.arr[:, 1] == hhh)[0]
+        return self.arr[nz[::-1], 0].tolist()
+
+    @_locked
+    def latest(self):
+
+        ''' Return record numbers of the latest entry for every hash,
+            newest first. '''
+
+        hashes = self.arr[::-1, 1]
+        _, first = np.unique(hashes, return_index = True)
+        pos = len(hashes) - 1 - first
+        pos.sort()
+        return pos[::-1].tolist()
+
+# ------------------------------------------------------------------------
+
+class OrdIndex(TwinIndex):
+
+    '''
+        Ordered (key, offset) index, kept as sorted runs.
+
+        32 byte header: ORDSIG, number of sorted entries, covered,
+        generation, entry head size; followed by the entries: key length,
+        offset (8 bytes with the v2 index), key.
+        The first 'nsorted' entries are in key order, the rest is the
+        tail appended in save order. When the tail grows past ORDTAIL
+        (or 1/8 of the sorted run) the two are merged and the file is
+        rewritten with a new generation, so other handles reload.
+    '''
+
+    def __init__(self, core, fname):
+        super(OrdIndex, self).__init__(core)
+        self.fname = fname
+        self.keys = []; self.offs = []
+        self.tail = []; self.tsorted = True
+        self.gen = 0; self.filepos = HEADSIZE
+        self.ofp = core.softcreate(fname, buffering = 0)
+        if not self._load():
+            self.rebuild()
+
+    def clear(self):
+        self.keys = []; self.offs = []
+        self.tail = []; self.tsorted = True
+
+    def _fmt(self):
+        ''' Entry head (key length, offset) format, by index version. '''
+        return "II" if self.core.idxver == IDX_V1 else "=IQ"
+
+    def _readhead(self):
+        self.ofp.seek(0, io.SEEK_SET)
+        head = self.ofp.read(20)
+        if len(head) < 20 or head[:4] != ORDSIG:
+            return None
+        # Zero is from before the entry size was recorded
+        if (struct.unpack("I", head[16:])[0] or 8) != \
+                                    struct.calcsize(self._fmt()):
+            return None
+        return struct.unpack("III", head[4:16])
+
+    def _puthead(self):
+        self.ofp.seek(0, io.SEEK_SET)
+        self.ofp.write(ORDSIG + struct.pack("IIII", len(self.keys),
+                    self.covered, self.gen, struct.calcsize(self._fmt())))
+
+    def _parse(self, buf, pos, cnt):
+
+        ''' Parse 'cnt' entries from buf; return list and end position. '''
+
+        arr = []
+        efmt = self._fmt(); esize = struct.calcsize(efmt)
+        while len(arr) < cnt and pos + esize <= len(buf):
+            klen, oo = struct.unpack_from(efmt, buf, pos)
+            if pos + esize + klen > len(buf):
+                break
+            arr.append((bytes(buf[pos + esize:pos + esize + klen]), oo))
+            pos += esize + klen
+        return arr, pos
+
+    def _load(self):
+
+        ''' Read the whole file. Return False if it is unusable. '''
+
+        head = self._readhead()
+        if not head:
+            return False
+        nsorted, covered, gen = head
+        self.ofp.seek(HEADSIZE, io.SEEK_SET)
+        arr, pos = self._parse(self.ofp.read(), 0, covered)
+        if len(arr) < covered:
+            return False
+        self.clear()
+        for key, oo in arr[:nsorted]:
+            self.keys.append(key); self.offs.append(oo)
+        self.tail = arr[nsorted:]; self.tsorted = False
+        self.covered = covered; self.gen = gen
+        self.filepos = HEADSIZE + pos
+        return True
+
+    @_locked
+    def sync(self):
+
+        ''' Pick up entries others wrote to the file, then the index. '''
+
+        head = self._readhead()
+        if not head or head[2] != self.gen or head[1] < self.covered:
+            if not self._load():
+                self.rebuild()
+                return
+        elif head[1] > self.covered:
+            self.ofp.seek(self.filepos, io.SEEK_SET)
+            arr, pos = self._parse(self.ofp.read(), 0, head[1] - self.covered)
+            self.tail += arr; self.tsorted = False
+            self.covered += len(arr); self.filepos += pos
+        super(OrdIndex, self).sync()
+
+    @_locked
+    def behind(self, dbsize):
+        head = self._readhead()
+        return not head or head[1] < dbsize
+
+    @_locked
+    def rebuild(self):
+
+        ''' Read every key from the data file, write one sorted run. '''
+
+        dbsize = self.core.getdbsize()
+        arr = []; cnt = 0
+        while cnt < dbsize:
+            pairs = self.core.getidxpairs(HEADSIZE + \
+                        cnt * self.core.IDXSIZE, min(SYNCCHUNK, dbsize - cnt))
+            if not pairs:
+                break
+            for offs, hhh in pairs:
+                arr.append((self._getkey(offs), offs))
+            cnt += len(pairs)
+        arr.sort()
+        self.clear()
+        self.keys = [kk for kk, oo in arr]
+        self.offs = [oo for kk, oo in arr]
+        self.covered = cnt; self.gen += 1
+        self._write()
+
+    def _getkey(self, offs):
+        klen = self.core.getbuffint(offs + 8)
+        return self.core.getbuffstr(offs + 12, klen)
+
+    def _write(self):
+
+        ''' Write the sorted run (tail must be merged in already). '''
+
+        arr = [bytearray(HEADSIZE)]
+        efmt = self._fmt()
+        for key, oo in zip(self.keys, self.offs):
+            arr.append(struct.pack(efmt, len(key), oo))
+            arr.append(key)
+        buf = b"".join(arr)
+        self.ofp.seek(0, io.SEEK_SET)
+        self.ofp.truncate(0)
+        self.ofp.write(buf)
+        self._puthead()
+        self.ofp.flush()
+        self.filepos = len(buf)
+
+    def _merge(self):
+
+        ''' Merge the tail into the sorted run, rewrite file. '''
+
+        self._tailsort()
+        arr = list(heapq.merge(zip(self.keys, self.offs), self.tail))
+        self.keys = [kk for kk, oo in arr]
+        self.offs = [oo for kk, oo in arr]
+        self.tail = []
+        self.gen += 1
+        self._write()
+
+    @_locked
+    def add(self, recnum, offs, hhh, key = None):
+
+        if key is None:
+            key = self._getkey(offs)
+        ent = struct.pack(self._fmt(), len(key), offs) + key
+        self.ofp.seek(self.filepos, io.SEEK_SET)
+        self.ofp.write(ent)
+        self.filepos += len(ent)
+        self.tail.append((key, offs)); self.tsorted = False
+        self.covered = recnum + 1
+        if len(self.tail) > max(ORDTAIL, len(self.keys) // 8):
+            self._merge()
+        else:
+            self.ofp.seek(8, io.SEEK_SET)
+            self.ofp.write(struct.pack("I", self.covered))
+            self.ofp.flush()
+
+    def _tailsort(self):
+        if not self.tsorted:
+            self.tail.sort()
+            self.tsorted = True
+
+    @_locked
+    def between(self, start = None, end = None, reverse = False):
+
+        ''' Return list of (key, [offsets newest first]) for keys in
+            start <= key < end, in key order. None is open ended. '''
+
+        self._tailsort()
+        tkeys = [kk for kk, oo in self.tail]
+        lo = 0 if start is None else bisect.bisect_left(self.keys, start)
+        hi = len(self.keys) if end is None else \
+                                bisect.bisect_left(self.keys, end)
+        tlo = 0 if start is None else bisect.bisect_left(tkeys, start)
+        thi = len(tkeys) if end is None else bisect.bisect_left(tkeys, end)
+
+        arr = []
+        for key, oo in heapq.merge(zip(self.keys[lo:hi], self.offs[lo:hi]),
+                                            self.tail[tlo:thi]):
+            if arr and arr[-1][0] == key:
+                arr[-1][1].insert(0, oo)
+            else:
+                arr.append((key, [oo]))
+        if reverse:
+            arr.reverse()
+        return arr
+
+    def close(self):
+        if self.ofp and not self.ofp.closed:
+            self.ofp.close()
+
+# ------------------------------------------------------------------------
+
+class BloomFilter(TwinIndex):
+
+    '''
+        Bloom filter of key hashes. A miss means the key is definitely
+        not in the database; a hit has to be checked the usual way.
+
+        32 byte header: BLMSIG, number of bits, number of hashes,
+        covered, capacity; followed by the bit array. Sized for
+        'capacity' keys at 'rate' false positives; rebuilt at double
+        the size when more keys than that were added.
+    '''
+
+    def __init__(self, core, fname, rate = 0.01, size = 100000):
+        super(BloomFilter, self).__init__(core)
+        self.fname = fname
+        self.rate = rate; self.size = size
+        self.nbits = 0; self.nhash = 0; self.cap = 0
+        self.bits = bytearray()
+        self.bfp = core.softcreate(fname, buffering = 0)
+        if not self._load():
+            self.rebuild()
+
+    def _readhead(self):
+        self.bfp.seek(0, io.SEEK_SET)
+        head = self.bfp.read(20)
+        if len(head) < 20 or head[:4] != BLMSIG:
+            return None
+        return struct.unpack("IIII", head[4:])
+
+    def _puthead(self):
+        self.bfp.seek(0, io.SEEK_SET)
+        self.bfp.write(BLMSIG + struct.pack("IIII",
+                        self.nbits, self.nhash, self.covered, self.cap))
+
+    def _load(self):
+        head = self._readhead()
+        if not head or not head[0]:
+            return False
+        self.nbits, self.nhash, self.covered, self.cap = head
+        self.bfp.seek(HEADSIZE, io.SEEK_SET)
+        self.bits = bytearray(self.bfp.read(self.nbits // 8))
+        return len(self.bits) == self.nbits // 8
+
+    def _size(self, cap):
+
+        ''' Optimal bits / hashes for 'cap' keys at our rate '''
+
+        self.cap = cap
+        nbits = int(math.ceil(-cap * math.log(self.rate) / (math.log(2) ** 2)))
+        self.nbits = max(64, (nbits + 7) & ~7)
+        self.nhash = max(1, int(round(self.nbits / cap * math.log(2))))
+
+    def _positions(self, hhh):
+        h2 = (((hhh >> 16) ^ hhh) * 0x45d9f3b) & 0xffffffff | 1
+        return [(hhh + ii * h2) % self.nbits for ii in range(self.nhash)]
+
+    @_locked
+    def sync(self):
+        head = self._readhead()
+        if not head or head[0] != self.nbits or head[2] < self.covered:
+            if not self._load():
+                self.rebuild()
+                return
+        elif head[2] > self.covered:
+            # Others added bits
+            self._load()
+        if self.core.getdbsize() > self.cap:
+            self.rebuild()
+            return
+        super(BloomFilter, self).sync()
+
+    @_locked
+    def behind(self, dbsize):
+        head = self._readhead()
+        return not head or head[2] < dbsize or dbsize > head[3]
+
+    @_locked
+    def rebuild(self):
+        dbsize = self.core.getdbsize()
+        self._size(max(self.size, dbsize * 2))
+        self.bits = bytearray(self.nbits // 8)
+        self.covered = 0
+        while self.covered < dbsize:
+            pairs = self.core.getidxpairs(HEADSIZE + self.covered * \
+                    self.core.IDXSIZE, min(SYNCCHUNK, dbsize - self.covered))
+            if not pairs:
+                break
+            for offs, hhh in pairs:
+                for pos in self._positions(hhh):
+                    self.bits[pos >> 3] |= 1 << (pos & 7)
+            self.covered += len(pairs)
+        self.bfp.seek(0, io.SEEK_SET)
+        self.bfp.truncate(0)
+        self.bfp.write(bytearray(HEADSIZE))
+        self._puthead()
+        self.bfp.seek(HEADSIZE, io.SEEK_SET)
+        self.bfp.write(self.bits)
+        self.bfp.flush()
+
+    @_locked
+    def add(self, recnum, offs, hhh, key = None):
+        if recnum >= self.cap:
+            self.rebuild()
+            return
+        for pos in self._positions(hhh):
+            bb = pos >> 3
+            if not self.bits[bb] & (1 << (pos & 7)):
+                self.bits[bb] |= 1 << (pos & 7)
+                self.bfp.seek(HEADSIZE + bb, io.SEEK_SET)
+                self.bfp.write(self.bits[bb:bb + 1])
+        self.covered = recnum + 1
+        self.bfp.seek(12, io.SEEK_SET)
+        self.bfp.write(struct.pack("I", self.covered))
+        self.bfp.flush()
+
+    @_locked
+    def maybe(self, hhh):
+
+        ''' False if 'hhh' was never added. '''
+
+        for pos in self._positions(hhh):
+            if not self.bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def close(self):
+        if self.bfp and not self.bfp.closed:
+            self.bfp.close()
+
+# ------------------------------------------------------------------------
+
+class DelMap(TwinIndex):
+
+    '''
+        Deleted record bitmap, one bit per record number.
+
+        32 byte header: DELSIG, covered, number of deletes; followed by
+        the bits. A set bit means deleted; a clear bit means the data
+        file has the last word (deletes by handles without the bitmap
+        are only seen there). Others' deletes are picked up when the
+        delete count in the header changes.
+    '''
+
+    def __init__(self, core, fname):
+        super(DelMap, self).__init__(core)
+        self.fname = fname
+        self.ndel = 0
+        self.bits = bytearray()
+        self.dfp = core.softcreate(fname, buffering = 0)
+        if not self._load():
+            self.rebuild()
+
+    def _readhead(self):
+        self.dfp.seek(0, io.SEEK_SET)
+        head = self.dfp.read(12)
+        if len(head) < 12 or head[:4] != DELSIG:
+            return None
+        return struct.unpack("II", head[4:])
+
+    def _puthead(self):
+        self.dfp.seek(0, io.SEEK_SET)
+        self.dfp.write(DELSIG + struct.pack("II", self.covered, self.ndel))
+
+    def _load(self):
+        head = self._readhead()
+        if not head:
+            return False
+        self.covered, self.ndel = head
+        self.dfp.seek(HEADSIZE, io.SEEK_SET)
+        self.bits = bytearray(self.dfp.read((self.covered + 7) // 8))
+        return len(self.bits) == (self.covered + 7) // 8
+
+    @_locked
+    def sync(self):
+        head = self._readhead()
+        if not head or head[0] < self.covered:
+            if not self._load():
+                self.rebuild()
+                return
+        elif head[0] != self.covered or head[1] != self.ndel:
+            self._load()
+        super(DelMap, self).sync()
+
+    @_locked
+    def behind(self, dbsize):
+        head = self._readhead()
+        return not head or head[0] < dbsize
+
+    @_locked
+    def rebuild(self):
+
+        ''' Look at every record signature in the data file. '''
+
+        dbsize = self.core.getdbsize()
+        self.bits = bytearray((dbsize + 7) // 8)
+        self.covered = 0; self.ndel = 0
+        while self.covered < dbsize:
+            pairs = self.core.getidxpairs(HEADSIZE + self.covered * \
+                    self.core.IDXSIZE, min(SYNCCHUNK, dbsize - self.covered))
+            if not pairs:
+                break
+            for offs, hhh in pairs:
+                if self.core.getbuffstr(offs, self.core.INTSIZE) == RECDEL:
+                    self.bits[self.covered >> 3] |= 1 << (self.covered & 7)
+                    self.ndel += 1
+                self.covered += 1
+        self.dfp.seek(0, io.SEEK_SET)
+        self.dfp.truncate(0)
+        self.dfp.write(bytearray(HEADSIZE))
+        self._puthead()
+        self.dfp.seek(HEADSIZE, io.SEEK_SET)
+        self.dfp.write(self.bits)
+        self.dfp.flush()
+
+    @_locked
+    def add(self, recnum, offs, hhh, key = None):
+        self.covered = recnum + 1
+        if len(self.bits) < (self.covered + 7) // 8:
+            self.bits.append(0)
+            self.dfp.seek(HEADSIZE + len(self.bits) - 1, io.SEEK_SET)
+            self.dfp.write(b"\0")
+        self._puthead()
+        self.dfp.flush()
+
+    @_locked
+    def delete(self, offs, hhh, recnum = None):
+        if recnum is None:
+            recnum = self.core._offs2recnum(offs)
+        if recnum < 0 or recnum >= self.covered:
+            return
+        bb = recnum >> 3
+        if self.bits[bb] & (1 << (recnum & 7)):
+            return
+        self.bits[bb] |= 1 << (recnum & 7)
+        self.ndel += 1
+        self.dfp.seek(HEADSIZE + bb, io.SEEK_SET)
+        self.dfp.write(self.bits[bb:bb + 1])
+        self._puthead()
+        self.dfp.flush()
+
+    @_locked
+    def isdel(self, recnum):
+        if recnum >= self.covered:
+            return False
+        return self.bits[recnum >> 3] & (1 << (recnum & 7)) != 0
+
+    def close(self):
+        if self.dfp and not self.dfp.closed:
+            self.dfp.close()
+
+# ------------------------------------------------------------------------
+
+class TriIndex(TwinIndex):
+
+    '''
+        Trigram index over the keys, for substring search. Every three
+        byte sequence of a key maps to the record numbers that have it.
+
+        32 byte header: TRISIG, records in the snapshot, covered,
+        generation, snapshot length in bytes. The snapshot holds the
+        postings: trigram, count, record numbers (ascending). After it
+        comes the log of keys saved since: record number, key length,
+        key. When the log grows past TRITAIL (or 1/8 of the snapshot)
+        the snapshot is rewritten with a new generation.
+    '''
+
+    def __init__(self, core, fname):
+        super(TriIndex, self).__init__(core)
+        self.fname = fname
+        self.post = {}
+        self.nsnap = 0; self.nlog = 0; self.snaplen = 0
+        self.gen = 0; self.filepos = HEADSIZE
+        self.tfp = core.softcreate(fname, buffering = 0)
+        if not self._load():
+            self.rebuild()
+
+    def clear(self):
+        self.post = {}
+        self.nsnap = 0; self.nlog = 0
+
+    def _readhead(self):
+        self.tfp.seek(0, io.SEEK_SET)
+        head = self.tfp.read(20)
+        if len(head) < 20 or head[:4] != TRISIG:
+            return None
+        return struct.unpack("IIII", head[4:])
+
+    def _puthead(self):
+        self.tfp.seek(0, io.SEEK_SET)
+        self.tfp.write(TRISIG + struct.pack("IIII", self.nsnap,
+                    self.covered, self.gen, self.snaplen))
+
+    def _grams(self, key):
+        return set(int.from_bytes(key[aa:aa + 3], "big")
+                                    for aa in range(len(key) - 2))
+
+    def _addkey(self, recnum, key):
+        for tri in self._grams(key):
+            arr = self.post.get(tri)
+            if arr is None:
+                arr = self.post[tri] = array.array("I")
+            arr.append(recnum)
+
+    def _parselog(self, buf, cnt):
+
+        ''' Add up to 'cnt' log entries from buf; return entries used
+            and bytes used. '''
+
+        pos = 0; done = 0
+        while done < cnt and pos + 8 <= len(buf):
+            recnum, klen = struct.unpack_from("II", buf, pos)
+            if pos + 8 + klen > len(buf):
+                break
+            self._addkey(recnum, bytes(buf[pos + 8:pos + 8 + klen]))
+            pos += 8 + klen; done += 1
+        return done, pos
+
+    def _load(self):
+
+        ''' Read the whole file. Return False if it is unusable. '''
+
+        head = self._readhead()
+        if not head:
+            return False
+        nsnap, covered, gen, snaplen = head
+        self.tfp.seek(HEADSIZE, io.SEEK_SET)
+        buf = self.tfp.read()
+        if len(buf) < snaplen:
+            return False
+        self.clear()
+        pos = 0
+        while pos < snaplen:
+            tri, cnt = struct.unpack_from("II", buf, pos)
+            arr = array.array("I")
+            arr.frombytes(buf[pos + 8:pos + 8 + cnt * 4])
+            self.post[tri] = arr
+            pos += 8 + cnt * 4
+        done, used = self._parselog(memoryview(buf)[snaplen:],
+                                                covered - nsnap)
+        if done < covered - nsnap:
+            return False
+        self.nsnap = nsnap; self.nlog = done
+        self.covered = covered; self.gen = gen; self.snaplen = snaplen
+        self.filepos = HEADSIZE + snaplen + used
+        return True
+
+    @_locked
+    def sync(self):
+
+        ''' Pick up keys others logged to the file, then the index. '''
+
+        head = self._readhead()
+        if not head or head[2] != self.gen or head[1] < self.covered:
+            if not self._load():
+                self.rebuild()
+                return
+        elif head[1] > self.covered:
+            self.tfp.seek(self.filepos, io.SEEK_SET)
+            done, used = self._parselog(self.tfp.read(),
+                                            head[1] - self.covered)
+            self.covered += done; self.nlog += done
+            self.filepos += used
+        super(TriIndex, self).sync()
+
+    @_locked
+    def behind(self, dbsize):
+        head = self._readhead()
+        return not head or head[1] < dbsize
+
+    @_locked
+    def rebuild(self):
+
+        ''' Read every key from the data file, write a snapshot. '''
+
+        dbsize = self.core.getdbsize()
+        self.clear()
+        cnt = 0
+        while cnt < dbsize:
+            pairs = self.core.getidxpairs(HEADSIZE + \
+                        cnt * self.core.IDXSIZE, min(SYNCCHUNK, dbsize - cnt))
+            if not pairs:
+                break
+            for offs, hhh in pairs:
+                klen = self.core.getbuffint(offs + 8)
+                self._addkey(cnt, self.core.getbuffstr(offs + 12, klen))
+                cnt += 1
+        self.covered = cnt
+        self._write()
+
+    def _write(self):
+
+        ''' Write all postings as the snapshot, empty log. '''
+
+        arr = [bytearray(HEADSIZE)]
+        for tri, recs in self.post.items():
+            arr.append(struct.pack("II", tri, len(recs)))
+            arr.append(recs.tobytes())
+        buf = b"".join(arr)
+        self.nsnap = self.covered; self.nlog = 0
+        self.snaplen = len(buf) - HEADSIZE
+        self.gen += 1
+        self.tfp.seek(0, io.SEEK_SET)
+        self.tfp.truncate(0)
+        self.tfp.write(buf)
+        self._puthead()
+        self.tfp.flush()
+        self.filepos = len(buf)
+
+    @_locked
+    def add(self, recnum, offs, hhh, key = None):
+
+        if key is None:
+            klen = self.core.getbuffint(offs + 8)
+            key = self.core.getbuffstr(offs + 12, klen)
+        self._addkey(recnum, key)
+        ent = struct.pack("II", recnum, len(key)) + key
+        self.tfp.seek(self.filepos, io.SEEK_SET)
+        self.tfp.write(ent)
+        self.filepos += len(ent)
+        self.covered = recnum + 1; self.nlog += 1
+        if self.nlog > max(TRITAIL, self.nsnap // 8):
+            self._write()
+        else:
+            self.tfp.seek(8, io.SEEK_SET)
+            self.tfp.write(struct.pack("I", self.covered))
+            self.tfp.flush()
+
+    @_locked
+    def lookup(self, strx):
+
+        ''' Return record numbers (newest first) whose key may hold
+            strx; None if strx is too short to narrow it down. '''
+
+        grams = self._grams(strx)
+        if not grams:
+            return None
+        arrs = []
+        for tri in grams:
+            recs = self.post.get(tri)
+            if not recs:
+                return []
+            arrs.append(recs)
+        arrs.sort(key = len)
+        cands = set(arrs[0])
+        for recs in arrs[1:]:
+            cands.intersection_update(recs)
+            if not cands:
+                break
+        return sorted(cands, reverse = True)
+
+    def close(self):
+        if self.tfp and not self.tfp.closed:
+            self.tfp.close()
+
+# ------------------------------------------------------------------------
+
+class LatestMap(TwinIndex):
+
+    '''
+        In memory map of key hash -> {key: record number of the newest
+        live record}. Keys with the same hash each have their own entry,
+        the key bytes decide. Appends overwrite, so the map is kept as
+        records come in. When the newest record of a key is deleted, the
+        key is put aside and the next live one is looked up on first use.
+
+        Deletes by other handles are seen through the deleted bitmap (if
+        enabled), or when a record read turns out to be deleted.
+    '''
+
+    def __init__(self, core):
+        super(LatestMap, self).__init__(core)
+        self.lmap = {}
+        self.stale = set()          # (hash, key) put aside
+        self.seendel = 0
+
+    def clear(self):
+        self.lmap = {}
+        self.stale = set()
+
+    def _head(self, offs):
+
+        ''' Signature and key of the record at offs, one read mostly. '''
+
+        buf = self.core.getbuffstr(offs, RECHINT)
+        klen = struct.unpack_from("I", buf, 8)[0] if len(buf) >= 12 else 0
+        if len(buf) < 12 + klen:
+            buf = self.core.getbuffstr(offs, 12 + klen)
+        return buf[:4], buf[12:12 + klen]
+
+    def _islive(self, recnum, sig):
+        if self.core.delmap and self.core.delmap.isdel(recnum):
+            return False
+        return sig == RECSIG
+
+    def _put(self, hhh, key, recnum):
+        self.lmap.setdefault(hhh, {})[key] = recnum
+
+    def _drop(self, hhh, key):
+        bucket = self.lmap.get(hhh)
+        if bucket is not None and key in bucket:
+            del bucket[key]
+            if not bucket:
+                del self.lmap[hhh]
+
+    @_locked
+    def rebuild(self):
+
+        ''' Walk the index backwards, the first live record seen for a
+            key is its newest. The record head (signature and key) of
+            every entry is read. '''
+
+        self.clear()
+        dbsize = self.core.getdbsize()
+        if self.core.delmap:
+            self.core.delmap.sync()
+            self.seendel = self.core.delmap.ndel
+        pos = dbsize
+        while pos > 0:
+            cnt = min(SYNCCHUNK, pos); pos -= cnt
+            pairs = self.core.getidxpairs(HEADSIZE + \
+                        pos * self.core.IDXSIZE, cnt)
+            for nn in range(len(pairs) - 1, -1, -1):
+                offs, hhh = pairs[nn]
+                sig, key = self._head(offs)
+                if key in self.lmap.get(hhh, ()):
+                    continue
+                if self._islive(pos + nn, sig):
+                    self._put(hhh, key, pos + nn)
+        self.covered = dbsize
+
+    @_locked
+    def sync(self):
+        super(LatestMap, self).sync()
+        # Others deleted records; look at the ones we point to
+        if self.core.delmap:
+            self.core.delmap.sync()
+        if self.core.delmap and self.core.delmap.ndel != self.seendel:
+            self.seendel = self.core.delmap.ndel
+            for hhh, bucket in list(self.lmap.items()):
+                for key, recnum in list(bucket.items()):
+                    if self.core.delmap.isdel(recnum):
+                        self._drop(hhh, key)
+                        self.stale.add((hhh, key))
+
+    @_locked
+    def add(self, recnum, offs, hhh, key = None):
+        key = bytes(self._head(offs)[1] if key is None else key)
+        self._put(hhh, key, recnum)
+        self.stale.discard((hhh, key))
+        self.covered = recnum + 1
+
+    @_locked
+    def delete(self, offs, hhh, recnum = None):
+        # The bitmap took this one just before; seen, unless others
+        # deleted as well
+        delmap = self.core.delmap
+        if delmap and delmap.ndel == self.seendel + 1:
+            self.seendel = delmap.ndel
+        for key, old in list(self.lmap.get(hhh, {}).items()):
+            if recnum is None:
+                gone = self.core.getidxoffs(HEADSIZE + \
+                            old * self.core.IDXSIZE) == offs
+            else:
+                gone = recnum == old
+            if gone:
+                self._drop(hhh, key)
+                self.stale.add((hhh, key))
+
+    def _resolve(self, hhh, key):
+
+        ''' Find the newest live record for a key put aside by delete. '''
+
+        self.stale.discard((hhh, key))
+        for offs in self.core._hashrecs(hhh):
+            if self._head(offs)[1] != key:
+                continue
+            recnum = self.core._offs2recnum(offs)
+            if recnum >= 0:
+                self._put(hhh, key, recnum)
+                return recnum
+        return -1
+
+    @_locked
+    def settle(self):
+
+        ''' Resolve all the keys put aside by deletes. '''
+
+        for hhh, key in list(self.stale):
+            self._resolve(hhh, key)
+
+    @_locked
+    def lookup(self, hhh, key):
+
+        ''' Record number of the newest live record, -1 if none. '''
+
+        if (hhh, key) in self.stale:
+            return self._resolve(hhh, key)
+        return self.lmap.get(hhh, {}).get(key, -1)
+
+    @_locked
+    def count(self):
+        self.settle()
+        return sum(len(bucket) for bucket in self.lmap.values())
+
+    @_locked
+    def recnums(self):
+
+        ''' All the newest record numbers, newest first. '''
+
+        self.settle()
+        return sorted((recnum for bucket in self.lmap.values()
+                            for recnum in bucket.values()), reverse = True)
+
+# EOF
@@ -52,6 +52,22 @@ def createidxname(file):
     datafile = os.path.splitext(os.path.basename(file))[0]
     return test_dir + os.sep + datafile + ".pidx"
 
+# The files of a database, next to the data file
+
+dbsuffixes = (".pydb", ".pidx", ".phsh", ".pord", ".pblm", ".pdel", ".ptri")
+
+def removedb(fname):
+
+    ''' Remove a database and its side files, one by one; the ones
+        not there are skipped. '''
+
+    base = os.path.splitext(fname)[0]
+    for ext in dbsuffixes:
+        try:
+            os.remove(base + ext)
+        except OSError:
+            pass
+
 gl_fname = ""
 gl_iname = ""
 
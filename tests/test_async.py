@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+import pytest, os, sys, time, asyncio
+from mytest import *
+import twincore, twinasync, dbutils
+
+# Test for the asyncio front end
+
+fname = createname(__file__)
+iname = createidxname(__file__)
+cname = fname[:-5] + "_chain.pydb"
+
+def _clean():
+    for ff in (fname, iname, cname, cname[:-5] + ".pidx"):
+        try:
+            os.remove(ff)
+        except:
+            pass
+
+def setup_module(module):
+    """ setup any state specific to the execution of the given module."""
+    _clean()
+
+def teardown_module(module):
+    """ teardown any state that was previously setup with a setup_module
+    method.
+    """
+    _clean()
+
+def test_ops():
+
+    async def main():
+        async with await twinasync.AsyncTwinCore.open(fname) as db:
+            await asyncio.gather(*[db.save_data("key%d" % aa, "data%d" % aa)
+                                                    for aa in range(50)])
+            assert await db.getdbsize() == 50
+            assert await db.retrieve("key7") == [[b"key7", b"data7"]]
+            ret = await db.find_key("key9")
+            assert len(ret) == 1
+            assert len(await db.save_many([("key50", "data50")])) == 1
+            assert await db.del_rec_bykey("key3") == 1
+            recs = [rec async for rec in db.records(batch = 7)]
+            assert len(recs) == 50
+            assert [b"key3", b"data3"] not in recs
+            keys = [kk async for kk in db.keys(limx = 2, reverse = True)]
+            assert keys == [b"key50", b"key49"]
+            assert await db.vacuum() == (1, 1)
+            assert await db.integrity_check() == (50, 50)
+        assert db.core is None
+    asyncio.run(main())
+
+def test_readers():
+
+    # Reads overlap, a write waits for them and runs alone
+    async def main():
+        async with await twinasync.AsyncTwinCore.open(fname) as db:
+            running = []; most = []
+            def slow(tag):
+                running.append(tag)
+                most.append(list(running))
+                time.sleep(0.1)
+                running.remove(tag)
+                return tag
+            ret = await asyncio.gather(db._read(slow, "r1"),
+                            db._read(slow, "r2"), db.run(slow, "w"),
+                                                db._read(slow, "r3"))
+            assert ret == ["r1", "r2", "w", "r3"]
+            assert max(len(aa) for aa in most) == 2
+            assert ["w"] in most
+    asyncio.run(main())
+
+def test_close():
+
+    # The core is closed, a shared one with the last user
+    async def main():
+        db = await twinasync.AsyncTwinCore.open(fname, share = True)
+        core = db.core
+        other = twincore.TwinCore(fname, share = True)
+        assert other is core
+        await db.close()
+        assert not core.fp.closed
+        other.close()
+        assert core.fp.closed
+
+        db = await twinasync.AsyncTwinCore.open(fname)
+        core = db.core
+        await db.close()
+        await db.close()
+        assert core.fp.closed
+        assert db.core is None
+    asyncio.run(main())
+
+def test_lock():
+
+    # Held by another handle, the loop keeps running while waiting
+    async def main():
+        db = await twinasync.AsyncTwinCore.open(fname)
+        other = dbutils.FileLock(db.core.lckname)
+        assert other.trylock()
+        ticks = []
+        async def ticker():
+            while True:
+                ticks.append(1)
+                await asyncio.sleep(0.01)
+        tick = asyncio.create_task(ticker())
+        asyncio.get_running_loop().call_later(0.2, other.unlock)
+        assert await db.get_rec(0) == [b"key0", b"data0"]
+        tick.cancel()
+        assert len(ticks) > 5
+        await db.close()
+    asyncio.run(main())
+
+def test_chain():
+
+    async def main():
+        async with await twinasync.AsyncTwinChain.open(cname) as db:
+            await db.append("payload one")
+            await db.append("payload two")
+            size = await db.getdbsize()
+            assert (await db.get_payload(size - 1))[1] == "payload two"
+            assert await db.linkintegrity(size - 1)
+    asyncio.run(main())
+
+# EOF
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+import pytest, os, sys
+from mytest import *
+import twincore, pyvpacker
+
+# Test for the bloom filter sidecar
+
+core = None
+fname = createname(__file__)
+iname = createidxname(__file__)
+bname = os.path.splitext(fname)[0] + ".pblm"
+
+def setup_module(module):
+    """ setup any state specific to the execution of the given module."""
+    global core
+    removedb(fname)
+
+    # Small on purpose, so it has to grow
+    core = twincore.TwinCore(fname, bloom = True, bloom_size = 100)
+    assert core != 0
+
+    for aa in range(300):
+        ret = core.save_data("key%d" % aa, "data%d" % aa)
+        assert ret != 0
+
+def teardown_module(module):
+    """ teardown any state that was previously setup with a setup_module
+    method.
+    """
+    removedb(fname)
+
+def test_hits():
+
+    # No false negatives
+    for aa in range(300):
+        assert core.bloom.maybe(core.hash32(b"key%d" % aa))
+    ret = core.retrieve("key123")
+    assert ret == [[b'key123', b'data123']]
+    assert core.bloom.cap >= 300
+
+def test_misses():
+
+    miss = 0
+    for aa in range(1000):
+        if not core.bloom.maybe(core.hash32(b"nokey%d" % aa)):
+            miss += 1
+    # Sized for one percent
+    assert miss > 950
+    assert core.retrieve("nokey") == []
+    assert core.del_rec_bykey("nokey") == 0
+
+def test_other():
+
+    core2 = twincore.TwinCore(fname, bloom = True, bloom_size = 100)
+    core2.save_data("other", "handle")
+    core2 = None
+    ret = core.retrieve("other")
+    assert ret == [[b'other', b'handle']]
+
+# EOF
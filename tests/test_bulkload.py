@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+import pytest, os, sys, io, json
+from mytest import *
+import twincore
+
+# Test for the bulk loader
+
+fname = createname(__file__)
+iname = createidxname(__file__)
+tname = fname[:-5] + ".tsv"
+
+def setup_module(module):
+    """ setup any state specific to the execution of the given module."""
+    removedb(fname)
+
+def teardown_module(module):
+    """ teardown any state that was previously setup with a setup_module
+    method.
+    """
+    removedb(fname)
+    try:
+        os.remove(tname)
+    except:
+        pass
+
+def _fresh():
+    removedb(fname)
+
+def _same(core, cnt):
+
+    # The same as one by one saves, for the first cnt records
+    fname2 = fname[:-5] + "_2.pydb"
+    iname2 = iname[:-5] + "_2.pidx"
+    core2 = twincore.TwinCore(fname2, hashname = core.hashname,
+                                        idxver = core.idxver)
+    for aa in range(cnt):
+        core2.save_data("key%d" % aa, "data\t%d" % aa)
+    core2 = None
+    ret = open(fname, "rb").read().startswith(open(fname2, "rb").read()) \
+        and open(iname, "rb").read().startswith(open(iname2, "rb").read())
+    os.remove(fname2); os.remove(iname2)
+    return ret
+
+def test_tsv():
+
+    _fresh()
+    with open(tname, "wb") as fp:
+        for aa in range(100):
+            fp.write(b"key%d\tdata\t%d\n" % (aa, aa))
+        fp.write(b"\n")
+    core = twincore.TwinCore(fname, hashmap = True)
+    assert core.bulk_load(tname, workers = 1) == 100
+    assert core.getdbsize() == 100
+    assert core.retrieve("key42") == [[b"key42", b"data\t42"]]
+    assert core.integrity_check() == (100, 100)
+    assert _same(core, 100)
+
+def test_ndjson():
+
+    _fresh()
+    buf = io.BytesIO()
+    for aa in range(10):
+        buf.write(json.dumps({"key" : "key%d" % aa,
+                                "data" : "data\t%d" % aa}).encode() + b"\n")
+    buf.write(b'["keyx", {"aa" : 1}]\n')
+    buf.seek(0)
+    core = twincore.TwinCore(fname, hashname = "blake2b8")
+    assert core.bulk_load(buf, fmt = "ndjson", workers = 1) == 11
+    assert core.get_rec(10) == [b"keyx", b'{"aa": 1}']
+    assert core.retrieve("key3") == [[b"key3", b"data\t3"]]
+    assert _same(core, 10)
+
+def test_workers():
+
+    _fresh()
+    old = twincore.BULKCHUNK
+    twincore.BULKCHUNK = 256
+    try:
+        with open(tname, "wb") as fp:
+            for aa in range(500):
+                fp.write(b"key%d\tdata\t%d\n" % (aa, aa))
+        core = twincore.TwinCore(fname, trigram = True)
+        assert core.bulk_load(tname, workers = 3) == 500
+    finally:
+        twincore.BULKCHUNK = old
+    assert core.integrity_check() == (500, 500)
+    assert core.findrec("ey49") [0] == [b"key499", b"data\t499"]
+    assert _same(core, 500)
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_fail(workers):
+
+    # A bad line in the last chunk; the ones before stay, and are told
+    _fresh()
+    old = twincore.BULKCHUNK
+    twincore.BULKCHUNK = 256
+    buf = io.BytesIO()
+    for aa in range(100):
+        buf.write(b'["key%d", "data%d"]\n' % (aa, aa))
+    buf.write(b'["keyx", \n')
+    buf.seek(0)
+    core = twincore.TwinCore(fname, hashmap = True)
+    try:
+        with pytest.raises(twincore.BulkLoadError) as err:
+            core.bulk_load(buf, fmt = "ndjson", workers = workers)
+    finally:
+        twincore.BULKCHUNK = old
+    loaded = err.value.loaded
+    assert 0 < loaded < 100
+    assert core.getdbsize() == loaded
+    assert core.retrieve("key%d" % (loaded - 1)) == \
+                    [[b"key%d" % (loaded - 1), b"data%d" % (loaded - 1)]]
+    assert core.integrity_check() == (loaded, loaded)
+    core.close()
+
+def test_bad():
+
+    with pytest.raises(RuntimeError):
+        twincore.TwinCore(fname).bulk_load(tname, fmt = "csv")
+
+# EOF
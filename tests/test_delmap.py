@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+import pytest, os, sys
+from mytest import *
+import twincore, pyvpacker
+
+# Test for the deleted record bitmap
+
+core = None
+fname = createname(__file__)
+iname = createidxname(__file__)
+dname = os.path.splitext(fname)[0] + ".pdel"
+
+def setup_module(module):
+    """ setup any state specific to the execution of the given module."""
+    global core
+    removedb(fname)
+
+    core = twincore.TwinCore(fname, delmap = True)
+    assert core != 0
+
+    for aa in range(20):
+        ret = core.save_data("key%d" % aa, "data%d" % aa)
+        assert ret != 0
+
+def teardown_module(module):
+    """ teardown any state that was previously setup with a setup_module
+    method.
+    """
+    removedb(fname)
+
+def test_del():
+
+    assert core.del_rec(3)
+    assert core.del_rec_offs(core.idx2offs(5))
+    assert core.del_rec_bykey("key7") == 1
+    assert core.delmap.ndel == 3
+    for aa in range(20):
+        assert core.delmap.isdel(aa) == (aa in (3, 5, 7))
+
+def test_scan():
+
+    # Count data file reads while scanning
+    reads = []
+    org = core.getbuffstr
+    def counter(offs, xlen):
+        reads.append(offs)
+        return org(offs, xlen)
+    core.getbuffstr = counter
+    ret = core.findrecoffs("key", 100)
+    core.getbuffstr = org
+
+    assert len(ret) == 17
+    for aa in (3, 5, 7):
+        assert core.idx2offs(aa) not in reads
+    assert core.retrieve("key5") == []
+    assert core.findrecpos("key6") == [6]
+
+def test_reopen():
+
+    core2 = twincore.TwinCore(fname, delmap = True)
+    assert core2.delmap.ndel == 3
+    core2.del_rec(10)
+    core2 = None
+    ret = core.findrec("key1")
+    assert ret == [[b'key19', b'data19'], [b'key18', b'data18'],
+                    [b'key17', b'data17'], [b'key16', b'data16'],
+                    [b'key15', b'data15'], [b'key14', b'data14'],
+                    [b'key13', b'data13'], [b'key12', b'data12'],
+                    [b'key11', b'data11'], [b'key1', b'data1']]
+
+def test_vacuum():
+
+    ret = core.vacuum()
+    assert ret == (4, 4)
+    assert core.delmap.ndel == 0
+    assert core.getdbsize() == 16
+
+# EOF
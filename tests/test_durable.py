@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+import pytest, os, sys, time
+from mytest import *
+import twincore
+
+# Test for the durability levels
+
+fname = createname(__file__)
+iname = createidxname(__file__)
+
+synced = []
+
+def _fdsync(fd):
+    synced.append(fd)
+
+def setup_module(module):
+    """ setup any state specific to the execution of the given module."""
+    removedb(fname)
+    module.oldsync = twincore.fdsync
+    twincore.fdsync = _fdsync
+
+def teardown_module(module):
+    """ teardown any state that was previously setup with a setup_module
+    method.
+    """
+    twincore.fdsync = module.oldsync
+    removedb(fname)
+
+def _wait(cnt):
+    for aa in range(200):
+        if len(synced) >= cnt:
+            break
+        time.sleep(0.01)
+    return len(synced)
+
+def test_flush():
+
+    synced.clear()
+    core = twincore.TwinCore(fname)
+    core.save_data("key0", "data0")
+    core.save_many([("key1", "data1"), ("key2", "data2")])
+    core.del_rec(0)
+    assert synced == []
+
+def test_fsync():
+
+    synced.clear()
+    core = twincore.TwinCore(fname, durability = "fsync")
+    core.save_data("key3", "data3")
+    # Data first, then index
+    assert synced == [core.dfd, core.ifd]
+    core.save_many([("key4", "data4"), ("key5", "data5")])
+    assert len(synced) == 4
+    core.del_rec_bykey("key4")
+    assert len(synced) == 6
+    assert core.del_rec_bykey("nokey") == 0
+    assert len(synced) == 6
+
+def test_group():
+
+    synced.clear()
+    core = twincore.TwinCore(fname, durability = "group",
+                                    group_msec = 10000, group_recs = 3)
+    core.save_data("key6", "data6")
+    core.save_data("key7", "data7")
+    time.sleep(0.1)
+    assert synced == []
+    # Third record fills the group
+    core.save_data("key8", "data8")
+    assert _wait(2) == 2
+    thread = core.group.thread
+    core = None
+    thread.join(2)
+    assert not thread.is_alive()
+
+    synced.clear()
+    core = twincore.TwinCore(fname, durability = "group", group_msec = 20)
+    core.save_data("key9", "data9")
+    assert _wait(2) == 2
+    assert core.retrieve("key9") == [[b"key9", b"data9"]]
+
+def test_bad():
+
+    with pytest.raises(RuntimeError):
+        twincore.TwinCore(fname, durability = "sometimes")
+
+# EOF
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+import pytest, os, sys, time, threading, subprocess
+from mytest import *
+import twincore, dbutils
+
+# Test for the exclusive session mode
+
+fname = createname(__file__)
+iname = createidxname(__file__)
+
+def setup_module(module):
+    """ setup any state specific to the execution of the given module."""
+    teardown_module(module)
+
+def teardown_module(module):
+    """ teardown any state that was previously setup with a setup_module
+    method.
+    """
+    for ff in (fname, iname):
+        try:
+            os.remove(ff)
+        except:
+            pass
+
+def test_session(monkeypatch):
+
+    if not dbutils.fcntl:
+        pytest.skip("No flock")
+
+    calls = []
+    flock = dbutils.fcntl.flock
+    def counted(fp, mode):
+        calls.append(mode)
+        return flock(fp, mode)
+    monkeypatch.setattr(dbutils.fcntl, "flock", counted)
+
+    with twincore.TwinCore(fname, exclusive = True) as core:
+        calls.clear()
+        for aa in range(20):
+            core.save_data("key%d" % aa, "data%d" % aa)
+        assert core.retrieve("key5") == [[b"key5", b"data5"]]
+        assert core.find_key("key7") != []
+        assert core.getdbsize() == 20
+        # No lock syscalls inside the session
+        assert calls == []
+
+        # Others stay out (a handle has its own descriptor, as another
+        # process would)
+        other = twincore.FileLock(core.lckname)
+        assert not other.trylock(shared = True)
+
+        # Threads of the session still take turns
+        thread = threading.Thread(target = core.save_data,
+                                        args = ("key20", "data20"))
+        thread.start(); thread.join()
+        assert core.getdbsize() == 21
+
+    # Released at close
+    assert other.trylock()
+    other.unlock()
+
+def test_plain():
+
+    # Without a session, the lock goes after every call
+    core = twincore.TwinCore(fname)
+    core.save_data("key21", "data21")
+    other = twincore.FileLock(core.lckname)
+    assert other.trylock()
+    other.unlock()
+    assert core.getdbsize() == 22
+    core.close()
+
+# Another process, writing; its lock wait times out quickly
+INTRUDER = """
+import sys
+sys.path.append(%r)
+import twincore, dbutils
+dbutils.utils_locktout = 0.1
+core = twincore.TwinCore(%r)
+core.save_data("intruder", "data")
+core.close()
+"""
+
+def test_intruder():
+
+    pdir = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                        "..", "pydbase"))
+    with twincore.TwinCore(fname, exclusive = True) as core:
+        size = core.getdbsize()
+        proc = subprocess.Popen([sys.executable, "-c",
+                        INTRUDER % (pdir, os.path.abspath(fname))])
+        # Well past its timeout, it is still waiting
+        time.sleep(1.5)
+        assert proc.poll() is None
+        assert core.getdbsize() == size
+        assert core.retrieve("intruder") == []
+        core.save_data("key22", "data22")
+
+    # In after the session
+    assert proc.wait(30) == 0
+    core = twincore.TwinCore(fname)
+    assert core.getdbsize() == size + 2
+    assert core.retrieve("intruder") == [[b"intruder", b"data"]]
+    core.close()
+
+# EOF
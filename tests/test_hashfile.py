@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+import pytest, os, sys
+from mytest import *
+import twincore, pyvpacker
+
+# Test for the on disk hash index file
+
+core = None
+fname = createname(__file__)
+iname = createidxname(__file__)
+hname = os.path.splitext(fname)[0] + ".phsh"
+
+def setup_module(module):
+    """ setup any state specific to the execution of the given module."""
+    global core
+    removedb(fname)
+
+    core = twincore.TwinCore(fname, hashfile = True)
+    assert core != 0
+
+    # Enough to make the table grow
+    for aa in range(1500):
+        ret = core.save_data("key%d" % aa, "data%d" % aa)
+        assert ret != 0
+    ret = core.save_data("key10", "newdata")
+    assert ret != 0
+
+def teardown_module(module):
+    """ teardown any state that was previously setup with a setup_module
+    method.
+    """
+    removedb(fname)
+
+def test_retrieve():
+
+    ret = core.retrieve("key10", 2)
+    assert ret == [[b'key10', b'newdata'], [b'key10', b'data10']]
+    ret = core.retrieve("key1499")
+    assert ret == [[b'key1499', b'data1499']]
+    ret = core.retrieve("nokey")
+    assert ret == []
+
+def test_reopen():
+
+    # Fresh handle uses the table on disk, no warm up
+    core2 = twincore.TwinCore(fname, hashfile = True)
+    assert core2.hashfile.covered == core.getdbsize()
+    ret = core2.retrieve("key777")
+    assert ret == [[b'key777', b'data777']]
+    core2 = None
+
+def test_reindex():
+
+    core.del_rec_bykey("key10", 1)
+    core.reindex()
+    ret = core.retrieve("key10", 2)
+    assert ret == [[b'key10', b'data10']]
+    core.vacuum()
+    ret = core.retrieve("key1000")
+    assert ret == [[b'key1000', b'data1000']]
+
+# EOF
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+import pytest, os, sys, struct, zlib, hashlib
+from mytest import *
+import twincore, pyvpacker
+
+# Test for the selectable hash function
+
+fname = createname(__file__)
+iname = createidxname(__file__)
+
+def setup_module(module):
+    """ setup any state specific to the execution of the given module."""
+    removedb(fname)
+
+def teardown_module(module):
+    """ teardown any state that was previously setup with a setup_module
+    method.
+    """
+    removedb(fname)
+
+def _fresh():
+    removedb(fname)
+
+def test_legacy():
+
+    _fresh()
+    core = twincore.TwinCore(fname)
+    assert core.hashname == "sha256"
+    # Same value as the old hexdigest based one
+    hh = int(hashlib.new("sha256", b"1111").hexdigest()[:8], base=16)
+    assert core.hash32(b"1111") == hh
+    core.save_data("1111", "2222")
+    core = None
+
+    # Files with zero in the header (all old ones) stay readable
+    core = twincore.TwinCore(fname, hashname = "crc32")
+    assert core.hashname == "sha256"
+    assert core.retrieve("1111") == [[b'1111', b'2222']]
+    core = None
+
+def test_crc32():
+
+    _fresh()
+    core = twincore.TwinCore(fname, hashname = "crc32")
+    assert core.hash32(b"1111") == zlib.crc32(b"1111")
+    core.save_data("1111", "2222")
+    core.save_data("3333", "4444")
+    assert core.getbuffint(core.idx2offs(0) + 4) == zlib.crc32(b"1111")
+    core = None
+
+    # The file decides the hash
+    core = twincore.TwinCore(fname)
+    assert core.hashname == "crc32"
+    assert core.retrieve("3333") == [[b'3333', b'4444']]
+    assert core.integrity_check() == (2, 2)
+    core.del_rec(0)
+    core.vacuum()
+    assert core.hashname == "crc32"
+    assert core.retrieve("3333") == [[b'3333', b'4444']]
+    core = None
+
+def test_blake2b():
+
+    _fresh()
+    core = twincore.TwinCore(fname, hashname = "blake2b")
+    core.save_data("1111", "2222")
+    core = None
+    core = twincore.TwinCore(fname)
+    assert core.hashname == "blake2b"
+    assert core.retrieve("1111") == [[b'1111', b'2222']]
+    assert core.integrity_check() == (1, 1)
+    core = None
+
+def test_bad():
+
+    _fresh()
+    with pytest.raises(RuntimeError):
+        twincore.TwinCore(fname, hashname = "md4")
+    # Nothing left behind
+    for ff in (fname, iname, fname[:-5] + ".lock"):
+        assert not os.path.exists(ff)
+
+# EOF
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+import pytest, os, sys
+from mytest import *
+import twincore, pyvpacker
+
+# Test for the in-memory hash map lookups
+
+core = None
+fname = createname(__file__)
+iname = createidxname(__file__)
+
+def setup_module(module):
+    """ setup any state specific to the execution of the given module."""
+    global core
+    removedb(fname)
+
+    core = twincore.TwinCore(fname, hashmap = True)
+    assert core != 0
+
+    ret = core.save_data("1111", "2222")
+    assert ret != 0
+    ret = core.save_data("11111", "22222")
+    assert ret != 0
+    ret = core.save_data("1111", "3333")
+    assert ret != 0
+    ret = core.save_data("111", "222")
+    assert ret != 0
+
+def teardown_module(module):
+    """ teardown any state that was previously setup with a setup_module
+    method.
+    """
+    removedb(fname)
+
+def test_retrieve():
+
+    ret = core.retrieve("1111", 2)
+    assert ret == [[b'1111', b'3333'], [b'1111', b'2222']]
+
+    ret = core.retrieve("2222")
+    assert ret == []
+
+    ret = core.find_key("1111")
+    assert ret == [98, 32]
+    assert core.get_rec_byoffs(ret[0]) == [b'1111', b'3333']
+
+def test_del():
+
+    ret = core.del_rec_bykey("1111", 1)
+    assert ret == 1
+    ret = core.retrieve("1111", 2)
+    assert ret == [[b'1111', b'2222']]
+
+def test_other():
+
+    # A second handle appends, the map catches up
+    core2 = twincore.TwinCore(fname)
+    core2.save_data("4444", "5555")
+    ret = core.retrieve("4444")
+    assert ret == [[b'4444', b'5555']]
+    core2 = None
+
+def test_vacuum():
+
+    core.vacuum()
+    ret = core.retrieve("1111", 2)
+    assert ret == [[b'1111', b'2222']]
+    ret = core.retrieve("111")
+    assert ret == [[b'111', b'222']]
+
+# EOF
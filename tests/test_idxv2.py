@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+import pytest, os, sys, struct
+from mytest import *
+import twincore, pyvpacker
+
+# Test for the v2 (64 bit) index format
+
+fname = createname(__file__)
+iname = createidxname(__file__)
+base = os.path.splitext(fname)[0]
+
+def _fresh():
+    for ext in (".pydb", ".pidx", ".phsh", ".pord"):
+        try:
+            os.remove(base + ext)
+        except:
+            pass
+
+def setup_module(module):
+    """ setup any state specific to the execution of the given module."""
+    _fresh()
+
+def teardown_module(module):
+    """ teardown any state that was previously setup with a setup_module
+    method.
+    """
+    _fresh()
+
+def _idxver():
+    with open(iname, "rb") as fp:
+        fp.seek(twincore.IDXVEROFFS)
+        return struct.unpack("I", fp.read(4))[0]
+
+def test_create():
+
+    _fresh()
+    core = twincore.TwinCore(fname, idxver = twincore.IDX_V2)
+    assert core.IDXSIZE == 16
+    core.save_data("1111", "2222")
+    core.save_data("3333", "4444")
+    core.save_data("1111", "5555")
+    assert core.getdbsize() == 3
+    assert core.retrieve("1111", 2) == [[b'1111', b'5555'], [b'1111', b'2222']]
+    core = None
+
+    # The file decides
+    core = twincore.TwinCore(fname)
+    assert core.idxver == twincore.IDX_V2
+    assert _idxver() == 2
+    assert core.get_rec(1) == [b'3333', b'4444']
+    assert core.del_rec_bykey("1111", 1) == 1
+    assert core.listall() == [1, 0]
+    core = None
+
+def test_wide():
+
+    _fresh()
+    # The 64 bit hash needs (and gets) the v2 index
+    core = twincore.TwinCore(fname, hashname = "blake2b8", hashfile = True,
+                                                    ordered = True)
+    assert core.idxver == twincore.IDX_V2
+    hh = core.hashkey(b"1111")
+    assert core.hash32(b"1111") == hh & 0xffffffff
+    for aa in range(10):
+        core.save_data("key%d" % aa, "data%d" % aa)
+    assert core.getidxhash(twincore.HEADSIZE) == core.hashkey(b"key0")
+    assert core.retrieve("key5") == [[b'key5', b'data5']]
+    assert core.find_key("key5") == [core.idx2offs(5)]
+    assert list(core.prefix("key1")) == [[b'key1', b'data1']]
+    assert core.integrity_check() == (10, 10)
+
+    assert core.del_rec_offs(core.idx2offs(5))
+    assert core.retrieve("key5") == []
+    core.reindex()
+    assert core.getidxhash(twincore.HEADSIZE) == core.hashkey(b"key0")
+    assert core.retrieve("key6") == [[b'key6', b'data6']]
+    core.vacuum()
+    assert core.getdbsize() == 9
+    assert core.retrieve("key9") == [[b'key9', b'data9']]
+    core = None
+
+    with pytest.raises(RuntimeError):
+        core = twincore.TwinCore(fname)
+        core.reindex(twincore.IDX_V1)
+
+def test_badver():
+
+    # Nothing made, the lock not kept (not even for a session)
+    _fresh()
+    with pytest.raises(RuntimeError):
+        twincore.TwinCore(fname, idxver = 7, exclusive = True)
+    assert not os.path.exists(fname) and not os.path.exists(iname)
+    other = twincore.FileLock(base + ".lock")
+    assert other.trylock()
+    other.unlock()
+
+def test_convert():
+
+    _fresh()
+    core = twincore.TwinCore(fname, hashfile = True, ordered = True)
+    assert core.idxver == twincore.IDX_V1
+    for aa in range(10):
+        core.save_data("key%d" % aa, "data%d" % aa)
+    assert core.reindex(twincore.IDX_V2) == 10
+    assert core.IDXSIZE == 16
+    assert _idxver() == 2
+    assert core.retrieve("key5") == [[b'key5', b'data5']]
+    assert list(core.prefix("key1")) == [[b'key1', b'data1']]
+    core = None
+
+    core = twincore.TwinCore(fname, hashfile = True, ordered = True)
+    assert core.idxver == twincore.IDX_V2
+    assert core.retrieve("key7") == [[b'key7', b'data7']]
+    # And back
+    assert core.reindex(twincore.IDX_V1) == 10
+    assert core.retrieve("key7") == [[b'key7', b'data7']]
+    core = None
+
+def test_large():
+
+    _fresh()
+    core = twincore.TwinCore(fname, idxver = twincore.IDX_V2)
+    core.save_data("1111", "2222")
+    # Past 4 GiB, sparse
+    core.fp.truncate(0x100000000 + 64)
+    ret = core.save_data("3333", "4444")
+    assert ret == 0x100000000 + 64
+    assert core.idx2offs(1) == ret
+    assert core.retrieve("3333") == [[b'3333', b'4444']]
+    assert core.get_rec(1) == [b'3333', b'4444']
+    core = None
+
+# EOF
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+
+import pytest, os, sys
+from mytest import *
+import twincore, pyvpacker
+
+# Test for the latest version view
+
+core = None
+fname = createname(__file__)
+iname = createidxname(__file__)
+
+def setup_module(module):
+    """ setup any state specific to the execution of the given module."""
+    global core
+    removedb(fname)
+
+    core = twincore.TwinCore(fname, latest = True)
+    assert core != 0
+
+    # Three versions of five keys
+    for bb in range(3):
+        for aa in range(5):
+            ret = core.save_data("key%d" % aa, "data%d_%d" % (aa, bb))
+            assert ret != 0
+
+def teardown_module(module):
+    """ teardown any state that was previously setup with a setup_module
+    method.
+    """
+    removedb(fname)
+
+def test_latest():
+
+    assert core.count_live_keys() == 5
+    assert core.get_latest("key2") == [b'key2', b'data2_2']
+    assert core.get_latest("nokey") == []
+    assert core.listall() == [14, 13, 12, 11, 10]
+    ret = list(core.iter_latest())
+    assert ret[0] == [b'key4', b'data4_2']
+    assert len(ret) == 5
+
+def test_del():
+
+    # Newest goes, the one before takes its place
+    assert core.del_rec_bykey("key2", 1) == 1
+    assert core.get_latest("key2") == [b'key2', b'data2_1']
+    assert core.listall() == [14, 13, 11, 10, 7]
+
+    assert core.del_rec_bykey("key3") == 3
+    assert core.get_latest("key3") == []
+    assert core.count_live_keys() == 4
+
+def test_other():
+
+    # Another handle appends and deletes
+    core2 = twincore.TwinCore(fname)
+    core2.save_data("key5", "data5_0")
+    core2.del_rec(14)
+    core2 = None
+
+    assert core.get_latest("key5") == [b'key5', b'data5_0']
+    assert core.get_latest("key4") == [b'key4', b'data4_1']
+    assert core.count_live_keys() == 5
+
+    # Same answers without the view
+    core3 = twincore.TwinCore(fname)
+    assert core3.get_latest("key4") == [b'key4', b'data4_1']
+    assert core3.count_live_keys() == 5
+    assert list(core3.iter_latest()) == list(core.iter_latest())
+    core3 = None
+
+def test_vacuum():
+
+    core.vacuum()
+    assert core.count_live_keys() == 5
+    assert core.get_latest("key2") == [b'key2', b'data2_1']
+    assert core.get_latest("key3") == []
+
+def test_rescan(monkeypatch):
+
+    # Own deletes do not send the view through the whole map
+    dname = fname[:-5] + "_del.pydb"
+    for ff in (dname, dname[:-5] + ".pidx", dname[:-5] + ".pdel"):
+        try:
+            os.remove(ff)
+        except:
+            pass
+    core2 = twincore.TwinCore(dname, latest = True, delmap = True)
+    for aa in range(50):
+        core2.save_data("key%d" % aa, "data%d" % aa)
+    calls = []
+    isdel = core2.delmap.isdel
+    def counted(recnum):
+        calls.append(recnum)
+        return isdel(recnum)
+    monkeypatch.setattr(core2.delmap, "isdel", counted)
+    for aa in range(10):
+        core2.del_rec(aa)
+        assert core2.get_latest("key%d" % aa) == []
+        assert core2.get_latest("key20") == [b"key20", b"data20"]
+    assert core2.count_live_keys() == 40
+    assert len(calls) < 40
+
+    # Others' deletes still do
+    core3 = twincore.TwinCore(dname, delmap = True)
+    core3.del_rec(30)
+    core3.close()
+    calls.clear()
+    assert core2.count_live_keys() == 39
+    assert len(calls) >= 40
+    core2.close()
+    for ff in (dname, dname[:-5] + ".pidx", dname[:-5] + ".pdel"):
+        os.remove(ff)
+
+# Keys with the same hash are told apart
+
+@pytest.mark.parametrize("latest", [True, False])
+def test_collide(latest):
+
+    cname = fname[:-5] + "_crc.pydb"
+    for ff in (cname, cname[:-5] + ".pidx"):
+        try:
+            os.remove(ff)
+        except:
+            pass
+    core2 = twincore.TwinCore(cname, latest = latest, hashname = "crc32")
+    assert core2.hash32(b"k97872") == core2.hash32(b"k15860000")
+    core2.save_data("k97872", "A")
+    core2.save_data("k15860000", "B")
+    core2.save_data("k97872", "A2")
+    assert core2.count_live_keys() == 2
+    assert core2.get_latest(b"k97872") == [b"k97872", b"A2"]
+    assert core2.get_latest(b"k15860000") == [b"k15860000", b"B"]
+    assert list(core2.iter_latest()) == [[b"k97872", b"A2"],
+                                                [b"k15860000", b"B"]]
+
+    # The newest goes, the older one of the same key comes back
+    core2.del_rec(2)
+    assert core2.get_latest(b"k97872") == [b"k97872", b"A"]
+    assert core2.get_latest(b"k15860000") == [b"k15860000", b"B"]
+    assert core2.count_live_keys() == 2
+    core2.del_rec(1)
+    assert core2.get_latest(b"k15860000") == []
+    assert core2.count_live_keys() == 1
+    core2.close()
+
+    # Built from the files
+    core2 = twincore.TwinCore(cname, latest = latest)
+    core2.save_data("k15860000", "B2")
+    assert core2.count_live_keys() == 2
+    assert core2.get_latest(b"k97872") == [b"k97872", b"A"]
+    core2.close()
+    for ff in (cname, cname[:-5] + ".pidx"):
+        os.remove(ff)
+
+# EOF
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+import pytest, os, sys, time, threading, subprocess
+from mytest import *
+import dbutils
+
+# Test for the lock wait latency
+
+lname = createname(__file__)[:-5] + ".lock"
+
+def setup_module(module):
+    """ setup any state specific to the execution of the given module."""
+    pass
+
+def teardown_module(module):
+    """ teardown any state that was previously setup with a setup_module """
+    try:
+        os.remove(lname)
+    except:
+        pass
+
+def test_latency():
+
+    holder = dbutils.FileLock(lname)
+    waiter = dbutils.FileLock(lname)
+    holder.waitlock()
+    assert not waiter.trylock()
+    threading.Timer(0.05, holder.unlock).start()
+    ttt = time.monotonic()
+    waiter.waitlock()
+    # Well under the old one second step
+    assert time.monotonic() - ttt < 0.3
+    assert not holder.trylock()
+    waiter.unlock()
+    assert holder.trylock()
+    holder.unlock()
+
+def test_timeout():
+
+    holder = dbutils.FileLock(lname)
+    waiter = dbutils.FileLock(lname)
+    holder.waitlock()
+    assert not waiter.stale()
+
+    # Live holder; waited for past the timeout
+    done = []
+    def wait():
+        waiter.waitlock(0.1)
+        done.append(time.monotonic())
+    thread = threading.Thread(target = wait)
+    thread.start()
+    time.sleep(0.5)
+    assert done == []
+    ttt = time.monotonic()
+    holder.unlock()
+    thread.join()
+    assert done[0] >= ttt
+    waiter.unlock()
+
+    # Stale; the pid in the lock file is gone, broken in after the timeout
+    holder.waitlock()
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    with open(lname, "r+b") as fp:
+        fp.truncate()
+        fp.write(str(proc.pid).encode())
+    assert waiter.stale()
+    ttt = time.monotonic()
+    waiter.waitlock(0.2)
+    assert 0.2 <= time.monotonic() - ttt < 1
+    holder.unlock()
+
+# EOF
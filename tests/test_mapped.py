@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+import pytest, os, sys
+from mytest import *
+import twincore, pyvpacker
+
+# Test for the memory mapped read path
+
+core = None
+fname = createname(__file__)
+iname = createidxname(__file__)
+
+def setup_module(module):
+    """ setup any state specific to the execution of the given module."""
+    global core
+    removedb(fname)
+
+    core = twincore.TwinCore(fname, mapped = True)
+    assert core != 0
+
+    for aa in range(20):
+        ret = core.save_data("key%d" % aa, "data%d" % aa)
+        assert ret != 0
+
+def teardown_module(module):
+    """ teardown any state that was previously setup with a setup_module
+    method.
+    """
+    removedb(fname)
+
+def test_read():
+
+    assert core.getdbsize() == 20
+    assert core.get_rec(3) == [b'key3', b'data3']
+    assert core.retrieve("key7") == [[b'key7', b'data7']]
+    assert core.findrecpos("key11") == [11]
+    assert core.integrity_check() == (20, 20)
+    assert core.dmap is not None and core.imap is not None
+
+def test_grow():
+
+    # Maps follow the files as they grow
+    size = len(core.dmap)
+    for aa in range(20, 40):
+        core.save_data("key%d" % aa, "data%d" % aa)
+    assert core.retrieve("key39") == [[b'key39', b'data39']]
+    assert len(core.dmap) > size
+
+    core2 = twincore.TwinCore(fname)
+    core2.save_data("other", "data")
+    core2.del_rec(5)
+    core2 = None
+    assert core.retrieve("other") == [[b'other', b'data']]
+    assert core.retrieve("key5") == []
+
+def test_del():
+
+    assert core.del_rec_bykey("key6") == 1
+    assert core.retrieve("key6") == []
+    assert core.get_rec_byoffs(core.idx2offs(7)) == [b'key7', b'data7']
+
+def test_vacuum():
+
+    assert core.vacuum() == (2, 2)
+    assert core.getdbsize() == 39
+    assert core.retrieve("key7") == [[b'key7', b'data7']]
+    assert core.reindex() == 39
+    assert core.retrieve("other") == [[b'other', b'data']]
+
+# EOF
@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 
-import pytest, os, sys, threading
+import pytest, os, sys, time, threading, concurrent.futures
 from mytest import *
 import twincore, pyvpacker
 
@@ -60,18 +60,11 @@ def test_adders(capsys):
     for aa in range(200):
         tt = threading.Thread(target=threadproc)
         ttt.append(tt)
-        tt.run()
+        tt.start()
 
     # Wait for all to finish
-    while 1:
-        aa = False
-        for tt in ttt:
-            if tt.is_alive():
-                aa = True
-        if not aa:
-            # If none alive
-            break
-        sleep(.1)
+    for tt in ttt:
+        tt.join()
 
 # If the DB is the right size, and not damaged
 
@@ -86,5 +79,84 @@ def test_integrity(capsys):
     #print (ddd)
     #assert 0
 
+# Readers and writers from a pool, on one handle with helpers
+
+def test_pool(capsys):
+
+    fname2 = fname.replace(".pydb", "_pool.pydb")
+    rmpool(fname2)
+    core2 = twincore.TwinCore(fname2, hashfile = True, ordered = True)
+    for aa in range(100):
+        core2.save_data("key%d" % aa, "data%d" % aa)
+
+    def writer(nn):
+        for aa in range(20):
+            assert core2.save_data("new%d_%d" % (nn, aa), "data%d" % aa)
+
+    def reader(nn):
+        for aa in range(20):
+            key = "key%d" % ((nn * 20 + aa) % 100)
+            ret = core2.retrieve(key)
+            assert ret and ret[0][0] == key.encode()
+        return core2.getdbsize()
+
+    with concurrent.futures.ThreadPoolExecutor(8) as pool:
+        futs = [pool.submit(writer if aa % 2 else reader, aa)
+                                        for aa in range(32)]
+        for ff in futs:
+            ff.result()
+
+    assert core2.getdbsize() == 100 + 16 * 20
+    assert list(core2.integrity_check()) == [420, 420]
+    assert len(list(core2.range("new", "new~"))) == 16 * 20
+    core2 = None
+    rmpool(fname2)
+
+# A call that raises lets go of the lock
+
+def test_raise(monkeypatch):
+
+    def bad(hhh):
+        raise OSError("Fake")
+    monkeypatch.setattr(core, "_hashrecs", bad)
+    with pytest.raises(OSError):
+        core.retrieve("key")
+    monkeypatch.undo()
+    assert core.findrec(b"nokey") == []
+
+    ttt = time.monotonic()
+    thread = threading.Thread(target = core.save_data, args = ("k", "d"))
+    thread.start(); thread.join()
+    assert time.monotonic() - ttt < 1
+    assert core.retrieve("k") == [[b"k", b"d"]]
+
+# Threads are not stale holders; no breaking in after the time out
+
+def test_nobreak(monkeypatch):
+
+    import dbutils
+    monkeypatch.setattr(dbutils, "utils_locktout", 0.1)
+    held = threading.Event(); done = []
+    def writer():
+        core.lock.waitlock()
+        held.set()
+        time.sleep(0.4)
+        done.append(time.monotonic())
+        core.lock.unlock()
+    thread = threading.Thread(target = writer)
+    thread.start()
+    held.wait()
+    core.lock.waitlock(shared = True)
+    ttt = time.monotonic()
+    core.lock.unlock()
+    thread.join()
+    assert done and ttt >= done[0]
+
+def rmpool(fname2):
+    for ext in (".pydb", ".pidx", ".phsh", ".pord"):
+        try:
+            os.remove(os.path.splitext(fname2)[0] + ext)
+        except:
+            pass
 
 # EOF
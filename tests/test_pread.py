@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+import pytest, os, sys, threading, random
+from mytest import *
+import twincore, pyvpacker
+
+# Test for positional I/O; threads reading through one handle while
+# another one appends
+
+core = None
+fname = createname(__file__)
+iname = createidxname(__file__)
+
+def setup_module(module):
+    """ setup any state specific to the execution of the given module."""
+    global core
+    removedb(fname)
+
+    core = twincore.TwinCore(fname)
+    assert core != 0
+
+    for aa in range(200):
+        ret = core.save_data("key%d" % aa, "data%d" % aa * (aa % 7 + 1))
+        assert ret != 0
+
+def teardown_module(module):
+    """ teardown any state that was previously setup with a setup_module
+    method.
+    """
+    removedb(fname)
+
+def test_threads():
+
+    errs = []
+
+    def reader():
+        for cnt in range(300):
+            aa = random.randint(0, 199)
+            exp = [b"key%d" % aa, b"data%d" % aa * (aa % 7 + 1)]
+            if core.get_rec(aa) != exp:
+                errs.append(aa)
+            if core.getbuffstr(core.idx2offs(aa), 4) != twincore.RECSIG:
+                errs.append(aa)
+
+    def writer():
+        for aa in range(200, 300):
+            core.save_data("key%d" % aa, "data%d" % aa)
+
+    tts = [threading.Thread(target = reader) for aa in range(8)]
+    tts.append(threading.Thread(target = writer))
+    for tt in tts:
+        tt.start()
+    for tt in tts:
+        tt.join()
+
+    assert errs == []
+    assert core.getdbsize() == 300
+    assert core.get_rec(299) == [b'key299', b'data299']
+    assert core.integrity_check() == (300, 300)
+
+# EOF
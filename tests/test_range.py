@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+import pytest, os, sys
+from mytest import *
+import twincore, twinindex, pyvpacker
+
+# Test for the ordered index; range and prefix reads
+
+core = None
+fname = createname(__file__)
+iname = createidxname(__file__)
+oname = os.path.splitext(fname)[0] + ".pord"
+
+def setup_module(module):
+    """ setup any state specific to the execution of the given module."""
+    global core
+    removedb(fname)
+
+    core = twincore.TwinCore(fname, ordered = True)
+    assert core != 0
+
+    for aa in (5, 1, 3, 12, 9, 2):
+        ret = core.save_data("2026-10-%02d" % aa, "day %d" % aa)
+        assert ret != 0
+    ret = core.save_data("2026-11-01", "next month")
+    assert ret != 0
+    ret = core.save_data("2026-10-03", "day 3 again")
+    assert ret != 0
+
+def teardown_module(module):
+    """ teardown any state that was previously setup with a setup_module
+    method.
+    """
+    removedb(fname)
+
+def test_range():
+
+    ret = list(core.range("2026-10-02", "2026-10-10"))
+    assert ret == [[b'2026-10-02', b'day 2'], [b'2026-10-03', b'day 3 again'],
+                    [b'2026-10-05', b'day 5'], [b'2026-10-09', b'day 9']]
+
+    ret = list(core.range("2026-10-02", "2026-10-10", 2, True))
+    assert ret == [[b'2026-10-09', b'day 9'], [b'2026-10-05', b'day 5']]
+
+    ret = list(core.range("2026-10-12"))
+    assert ret == [[b'2026-10-12', b'day 12'], [b'2026-11-01', b'next month']]
+
+def test_prefix():
+
+    ret = [aa[0] for aa in core.prefix("2026-10-")]
+    assert ret == [b'2026-10-01', b'2026-10-02', b'2026-10-03',
+                    b'2026-10-05', b'2026-10-09', b'2026-10-12']
+
+def test_del():
+
+    core.del_rec_bykey("2026-10-03", 1)
+    ret = list(core.range("2026-10-03", "2026-10-04"))
+    assert ret == [[b'2026-10-03', b'day 3']]
+
+def test_reopen():
+
+    # Lots of records; makes the tail merge into the sorted run
+    core2 = twincore.TwinCore(fname, ordered = True)
+    for aa in range(twinindex.ORDTAIL + 10):
+        core2.save_data("2025-%06d" % aa, "old")
+    ret = list(core2.prefix("2025-", 3, True))
+    assert [aa[0] for aa in ret] == [b'2025-004105', b'2025-004104', b'2025-004103']
+    core2 = None
+
+    ret = list(core.prefix("2026-11"))
+    assert ret == [[b'2026-11-01', b'next month']]
+    ret = list(core.prefix("2025-000010", 1))
+    assert ret == [[b'2025-000010', b'old']]
+
+    core.vacuum()
+    ret = list(core.prefix("2026-10-0"))
+    assert len(ret) == 5
+
+# EOF
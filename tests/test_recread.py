@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+import pytest, os, sys
+from mytest import *
+import twincore, pyvpacker
+
+# Test for the record reader; short, long key, long payload
+
+core = None
+fname = createname(__file__)
+iname = createidxname(__file__)
+
+longkey = b"k" * 1000
+longdata = b"d" * 5000
+
+def setup_module(module):
+    """ setup any state specific to the execution of the given module."""
+    global core
+    removedb(fname)
+
+    core = twincore.TwinCore(fname)
+    assert core != 0
+
+    core.save_data("1111", "2222")
+    core.save_data("3333", longdata)
+    core.save_data(longkey, "4444")
+    core.save_data(longkey, longdata)
+    core.save_data("5555", "6666")
+
+def teardown_module(module):
+    """ teardown any state that was previously setup with a setup_module
+    method.
+    """
+    removedb(fname)
+
+def _reads(func, *args):
+    reads = []
+    org = core.getbuffstr
+    def counter(offs, xlen):
+        reads.append(offs)
+        return org(offs, xlen)
+    core.getbuffstr = counter
+    try:
+        ret = func(*args)
+    finally:
+        core.getbuffstr = org
+    return ret, len(reads)
+
+def test_short():
+
+    assert _reads(core.get_rec, 0) == ([b'1111', b'2222'], 1)
+    assert _reads(core.get_rec, 4) == ([b'5555', b'6666'], 1)
+    assert _reads(core.get_rec_byoffs, core.idx2offs(0)) == \
+                                            ([b'1111', b'2222'], 1)
+
+def test_long():
+
+    assert _reads(core.get_rec, 1) == ([b'3333', longdata], 2)
+    assert _reads(core.get_rec, 2) == ([longkey, b'4444'], 2)
+    assert _reads(core.get_rec, 3) == ([longkey, longdata], 3)
+    assert core.get_key_offs(core.idx2offs(3)) == longkey
+    assert core.retrieve(longkey, 2) == [[longkey, longdata],
+                                                [longkey, b'4444']]
+
+def test_integrity():
+
+    core.integrity = True
+    assert core.get_rec(3) == [longkey, longdata]
+    core.integrity = False
+
+def test_bad():
+
+    # Not at record boundary
+    assert core.get_rec_byoffs(core.idx2offs(1) + 1) == []
+    with pytest.raises(RuntimeError):
+        core.get_rec_byoffs(core.getsize(core.fp) + 10)
+
+# EOF
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+import pytest, os, sys
+from mytest import *
+import twincore, twinchain
+
+# Test for handles shared by real path
+
+fname = createname(__file__)
+iname = createidxname(__file__)
+cname = fname[:-5] + "_chain.pydb"
+ciname = cname[:-5] + ".pidx"
+
+def setup_module(module):
+    """ setup any state specific to the execution of the given module."""
+    teardown_module(module)
+
+def teardown_module(module):
+    """ teardown any state that was previously setup with a setup_module
+    method.
+    """
+    for ff in (fname, iname, cname, ciname):
+        try:
+            os.remove(ff)
+        except:
+            pass
+
+def test_shared():
+
+    core = twincore.TwinCore(fname, share = True)
+    core.save_data("key1", "data1")
+
+    # Same file by another path, same options
+    other = twincore.TwinCore(os.path.join(os.path.dirname(fname), ".",
+                                os.path.basename(fname)), share = True)
+    assert other is core
+    assert other.refs == 2
+    assert other.retrieve("key1") == [[b"key1", b"data1"]]
+
+    # Options for making the file do not matter once it is there
+    made = twincore.TwinCore(fname, share = True, hashname = "crc32",
+                                        idxver = twincore.IDX_V2)
+    assert made is core
+    made.close()
+
+    # Other options, or not asking, get their own
+    diff = twincore.TwinCore(fname, share = True, hashmap = True)
+    assert diff is not core
+    plain = twincore.TwinCore(fname)
+    assert plain is not core and plain.dfd != core.dfd
+    diff.close(); plain.close()
+
+    # Open until the last one closes
+    other.close()
+    assert not core.fp.closed
+    core.save_data("key2", "data2")
+    core.close()
+    assert core.fp.closed
+
+    # Then a fresh one
+    again = twincore.TwinCore(fname, share = True)
+    assert again is not core
+    assert again.getdbsize() == 2
+    again.close()
+
+def test_dropped():
+
+    # Last reference gone closes it, like an unshared handle
+    core = twincore.TwinCore(fname, share = True)
+    core = None
+    core = twincore.TwinCore(fname, share = True)
+    assert core.refs == 1
+    core.close()
+
+def test_chain():
+
+    with twinchain.TwinChain(cname, share = True) as chain:
+        chain.append("payload1")
+        with twinchain.TwinChain(cname, share = True) as chain2:
+            assert chain2 is chain
+            assert chain2.ulock is chain.ulock
+            chain2.append("payload2")
+        assert chain.getdbsize() == 2
+        assert chain.linkintegrity(1)
+
+# EOF
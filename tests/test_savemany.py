@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+
+import pytest, os, sys
+from mytest import *
+import twincore
+
+# Test for batched writes
+
+core = None
+fname = createname(__file__)
+iname = createidxname(__file__)
+
+def setup_module(module):
+    """ setup any state specific to the execution of the given module."""
+    global core
+    removedb(fname)
+
+    core = twincore.TwinCore(fname, hashmap = True)
+    assert core != 0
+
+def teardown_module(module):
+    """ teardown any state that was previously setup with a setup_module
+    method.
+    """
+    removedb(fname)
+
+def test_many():
+
+    core.save_data("key0", "data0")
+    ret = core.save_many(("key%d" % aa, "data%d" % aa) for aa in range(1, 10))
+    assert len(ret) == 9
+    assert core.getdbsize() == 10
+    for aa in range(10):
+        assert core.get_rec(aa) == [b"key%d" % aa, b"data%d" % aa]
+    assert core.get_rec_byoffs(ret[3]) == [b"key4", b"data4"]
+    assert core.retrieve("key7") == [[b"key7", b"data7"]]
+    assert core.integrity_check() == (10, 10)
+
+def test_same():
+
+    # The same as one by one saves
+    fname2 = fname[:-5] + "_2.pydb"
+    iname2 = iname[:-5] + "_2.pidx"
+    core2 = twincore.TwinCore(fname2)
+    for aa in range(10):
+        core2.save_data("key%d" % aa, "data%d" % aa)
+    core2 = None
+    assert open(fname, "rb").read() == open(fname2, "rb").read()
+    os.remove(fname2); os.remove(iname2)
+
+def test_chunks():
+
+    # Spans more than one write
+    old = twincore.SAVEBUF
+    twincore.SAVEBUF = 64
+    try:
+        ret = core.save_many([("kk%d" % aa, "dd" * aa) for aa in range(20)])
+    finally:
+        twincore.SAVEBUF = old
+    assert len(ret) == 20
+    assert core.getdbsize() == 30
+    assert core.get_rec_byoffs(ret[19]) == [b"kk19", b"dd" * 19]
+    assert core.retrieve("kk12") == [[b"kk12", b"dd" * 12]]
+
+# EOF
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+import pytest, os, sys, random
+from mytest import *
+import twincore, twinbase
+
+# Test for the read ahead of sequential scans
+
+core = None
+fname = createname(__file__)
+iname = createidxname(__file__)
+
+recs = []
+
+def setup_module(module):
+    """ setup any state specific to the execution of the given module."""
+    global core
+    removedb(fname)
+
+    core = twincore.TwinCore(fname)
+    assert core != 0
+
+    # Sizes around, and over the small block
+    random.seed(42)
+    for aa in range(200):
+        kkk = b"key%d" % aa + b"k" * random.randint(0, 80)
+        ddd = b"d" * random.randint(0, 300)
+        recs.append([kkk, ddd])
+        core.save_data(kkk, ddd)
+
+def teardown_module(module):
+    """ teardown any state that was previously setup with a setup_module
+    method.
+    """
+    removedb(fname)
+
+def _reads(func, *args):
+    reads = []
+    org = core.getbuffstr
+    def counter(offs, xlen):
+        reads.append(offs)
+        return org(offs, xlen)
+    core.getbuffstr = counter
+    try:
+        ret = func(*args)
+    finally:
+        core.getbuffstr = org
+    return ret, len(reads)
+
+def _small(func, *args):
+    return _block(128, func, *args)
+
+def _block(size, func, *args):
+    old = twinbase.SCANBLOCK, twincore.SCANBLOCK
+    twinbase.SCANBLOCK = twincore.SCANBLOCK = size
+    try:
+        return func(*args)
+    finally:
+        twinbase.SCANBLOCK, twincore.SCANBLOCK = old
+
+def test_reader():
+
+    scan = twinbase.ScanReader(core, 64)
+    data = open(fname, "rb").read()
+    for offs, xlen in ((0, 10), (60, 10), (100, 200), (len(data) - 5, 10),
+                            (30, 40), (10, 4), (2000, 63)):
+        assert scan.getbuffstr(offs, xlen) == data[offs:offs + xlen]
+    assert scan.getbuffint(32) == core.getbuffint(32)
+
+def test_integrity():
+
+    ret, cnt = _reads(core.integrity_check)
+    assert ret == (200, 200)
+    assert cnt < 5
+    assert _small(core.integrity_check) == (200, 200)
+
+def test_dump(capsys):
+
+    core.dump_data()
+    org = capsys.readouterr().out
+    _small(core.dump_data)
+    assert capsys.readouterr().out == org
+    _small(core.revdump_data, twincore.INT_MAX)
+    rev = capsys.readouterr().out.split("\n")[:-1]
+    # Same records backwards, the counters differ
+    assert [aa[6:] for aa in rev] == \
+                [aa[6:] for aa in reversed(org.split("\n")[:-1])]
+
+    # Backwards takes about as many reads as forwards
+    ret, fwd = _reads(_block, 4096, core.dump_data)
+    ret, bwd = _reads(_block, 4096, core.revdump_data, twincore.INT_MAX)
+    capsys.readouterr()
+    assert bwd <= 2 * fwd
+
+def test_reindex():
+
+    org = open(iname, "rb").read()
+    ret, cnt = _reads(core.reindex)
+    assert ret == 200
+    assert cnt < 5
+    assert open(iname, "rb").read() == org
+    assert _small(core.reindex) == 200
+    assert open(iname, "rb").read() == org
+
+def test_vacuum():
+
+    for aa in range(0, 200, 3):
+        core.del_rec(aa)
+    assert _small(core.vacuum) == (67, 67)
+    live = [recs[aa] for aa in range(200) if aa % 3]
+    assert core.getdbsize() == len(live)
+    for aa in range(len(live)):
+        assert core.get_rec(aa) == live[aa]
+    assert core.integrity_check() == (len(live), len(live))
+
+# EOF
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+import pytest, os, sys, time, threading
+from mytest import *
+import twincore
+
+# Test for the shared reader lock
+
+fname = createname(__file__)
+iname = createidxname(__file__)
+hname = fname[:-5] + ".phsh"
+
+def setup_module(module):
+    """ setup any state specific to the execution of the given module."""
+    teardown_module(module)
+
+def teardown_module(module):
+    """ teardown any state that was previously setup with a setup_module
+    method.
+    """
+    for ff in (fname, iname, hname):
+        try:
+            os.remove(ff)
+        except:
+            pass
+
+def _timed(func, *args):
+    ret = []
+    def run():
+        ret.append(func(*args))
+        ret.append(time.monotonic())
+    thread = threading.Thread(target = run)
+    thread.start()
+    return thread, ret
+
+def test_shared():
+
+    # Each handle has its own lock descriptor, as another process would
+    core = twincore.TwinCore(fname)
+    core.save_data("key1", "data1")
+    reader = twincore.TwinCore(fname)
+    reader.lock.waitlock(shared = True)
+
+    # Readers go ahead
+    assert core.retrieve("key1") == [[b"key1", b"data1"]]
+    assert core.find_key("key1") != []
+    assert core.integrity_check() == (1, 1)
+
+    # Writers wait for the reader
+    assert not core.lock.trylock()
+    thread, ret = _timed(core.save_data, "key2", "data2")
+    time.sleep(0.1)
+    assert not ret
+    ttt = time.monotonic()
+    reader.lock.unlock()
+    thread.join()
+    assert ret[1] >= ttt
+    assert core.retrieve("key2") == [[b"key2", b"data2"]]
+
+    # Deletes too
+    reader.lock.waitlock(shared = True)
+    thread, ret = _timed(core.del_rec_bykey, "key2")
+    time.sleep(0.1)
+    assert not ret
+    reader.lock.unlock()
+    thread.join()
+    assert ret[0] == 1
+
+def test_behind():
+
+    # A helper file behind the index is caught up exclusive
+    core = twincore.TwinCore(fname, hashfile = True)
+    other = twincore.TwinCore(fname)
+    other.save_data("key3", "data3")
+    reader = twincore.TwinCore(fname)
+    reader.lock.waitlock(shared = True)
+    thread, ret = _timed(core.retrieve, "key3")
+    time.sleep(0.1)
+    assert not ret
+    reader.lock.unlock()
+    thread.join()
+    assert ret[0] == [[b"key3", b"data3"]]
+
+    # Up to date now, shared again
+    reader.lock.waitlock(shared = True)
+    assert core.retrieve("key1") == [[b"key1", b"data1"]]
+    reader.lock.unlock()
+
+# EOF
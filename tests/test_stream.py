@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+import pytest, os, sys, io, socket, threading
+from mytest import *
+import twincore, twinbase
+
+# Test for streamed save / read of large values
+
+fname = createname(__file__)
+iname = createidxname(__file__)
+oname = fname[:-5] + ".out"
+
+big = os.urandom(3 * 1024 * 1024 + 17)
+
+def setup_module(module):
+    """ setup any state specific to the execution of the given module."""
+    teardown_module(module)
+
+def teardown_module(module):
+    """ teardown any state that was previously setup with a setup_module
+    method.
+    """
+    for ff in (fname, iname, oname):
+        try:
+            os.remove(ff)
+        except:
+            pass
+
+class Reader():
+
+    # Only read(), short pieces
+    def __init__(self, data):
+        self.fp = io.BytesIO(data)
+
+    def read(self, cnt):
+        return self.fp.read(min(cnt, 1000))
+
+@pytest.mark.parametrize("hashname", ["sha256", "crc32", "blake2b",
+                                                        "blake2b8"])
+def test_save(hashname, monkeypatch):
+
+    teardown_module(None)
+    monkeypatch.setattr(twincore, "STREAMBUF", 0x10000)
+    core = twincore.TwinCore(fname, hashname = hashname)
+    core.save_data("small", "data")
+    offs = core.save_stream("big", io.BytesIO(big), len(big))
+    assert core.get_rec_byoffs(offs) == [b"big", big]
+    core.save_stream("piece", Reader(b"abc" * 1000), 3000)
+    core.save_stream("empty", io.BytesIO(b""), 0)
+    assert core.retrieve("piece") == [[b"piece", b"abc" * 1000]]
+    assert core.retrieve("empty") == [[b"empty", b""]]
+
+    # The data hash is right
+    core.integrity = 1
+    assert core.get_rec(1) == [b"big", big]
+    assert core.integrity_check() == (4, 4)
+    core.close()
+
+def test_short():
+
+    core = twincore.TwinCore(fname)
+    size = core.getsize(core.fp)
+    with pytest.raises(RuntimeError):
+        core.save_stream("short", io.BytesIO(b"12345"), 10)
+    assert core.getsize(core.fp) == size
+    assert core.getdbsize() == 4
+    assert core.retrieve("short") == []
+    core.close()
+
+def test_open():
+
+    core = twincore.TwinCore(fname)
+    assert core.open_value("nokey") is None
+    with core.open_value("big") as fp:
+        assert len(fp) == len(big)
+        assert fp.read(10) == big[:10]
+        fp.seek(-10, io.SEEK_END)
+        assert fp.read() == big[-10:]
+        fp.seek(100)
+        assert io.BufferedReader(fp).read() == big[100:]
+
+    # To a file, in the kernel if it can
+    with core.open_value("big") as fp, open(oname, "wb") as out:
+        out.write(b"x")
+        assert fp.copyto(out) == len(big)
+    with open(oname, "rb") as out:
+        assert out.read() == b"x" + big
+
+    # To a socket
+    fp = core.open_value("big")
+    s1, s2 = socket.socketpair()
+    got = []
+    def recv():
+        while sum(map(len, got)) < len(big):
+            got.append(s2.recv(0x10000))
+    thread = threading.Thread(target = recv)
+    thread.start()
+    assert fp.copyto(s1) == len(big)
+    thread.join()
+    assert b"".join(got) == big
+    s1.close(); s2.close()
+
+    # Same hash, other key
+    core2 = twincore.TwinCore(fname[:-5] + "_crc.pydb", hashname = "crc32")
+    core2.save_stream("k97872", io.BytesIO(b"A"), 1)
+    core2.save_stream("k15860000", io.BytesIO(b"BB"), 2)
+    with core2.open_value("k97872") as fp2:
+        assert fp2.read() == b"A"
+    with core2.open_value("k15860000") as fp2:
+        assert fp2.read() == b"BB"
+    assert core2.open_value("k1") is None
+    core2.close()
+    for ff in (".pydb", ".pidx"):
+        os.remove(fname[:-5] + "_crc" + ff)
+
+    # Outlives vacuum and close
+    core.del_rec(0)
+    core.vacuum()
+    core.close()
+    fp.seek(0)
+    assert fp.read() == big
+    fp.close()
+
+# EOF
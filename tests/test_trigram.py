@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+import pytest, os, sys
+from mytest import *
+import twincore, pyvpacker
+
+# Test for the trigram index on keys
+
+core = None
+fname = createname(__file__)
+iname = createidxname(__file__)
+tname = os.path.splitext(fname)[0] + ".ptri"
+
+def setup_module(module):
+    """ setup any state specific to the execution of the given module."""
+    global core
+    removedb(fname)
+
+    core = twincore.TwinCore(fname, trigram = True)
+    assert core != 0
+
+    for aa in range(20):
+        ret = core.save_data("key%d" % aa, "data%d" % aa)
+        assert ret != 0
+    core.save_data("other", "data")
+
+def teardown_module(module):
+    """ teardown any state that was previously setup with a setup_module
+    method.
+    """
+    removedb(fname)
+
+def test_lookup():
+
+    assert core.trigram.lookup(b"ey1") == \
+                            [19, 18, 17, 16, 15, 14, 13, 12, 11, 10, 1]
+    assert core.trigram.lookup(b"zzz") == []
+    # Too short to narrow down
+    assert core.trigram.lookup(b"ke") is None
+
+def test_find():
+
+    ret = core.findrec("y1", 3)
+    assert ret == [[b'key19', b'data19'], [b'key18', b'data18'],
+                                            [b'key17', b'data17']]
+    assert core.findrec("ey5") == [[b'key5', b'data5']]
+    assert core.findrec("ey15") == [[b'key15', b'data15']]
+    ret = core.findrecoffs(b"ther")
+    assert ret == [core.idx2offs(20)]
+    assert core.findrec("ot") == [[b'other', b'data']]
+
+def test_other():
+
+    # Another handle appends and deletes; we catch up from the file
+    core2 = twincore.TwinCore(fname, trigram = True)
+    core2.save_data("newkey", "newdata")
+    core2.del_rec_bykey("key15")
+    core2 = None
+
+    assert core.findrec("ewk") == [[b'newkey', b'newdata']]
+    assert core.findrec("ey15") == []
+
+    # Fresh handle loads the same
+    core3 = twincore.TwinCore(fname, trigram = True)
+    assert core3.trigram.post == core.trigram.post
+    core3 = None
+
+def test_vacuum():
+
+    core.vacuum()
+    assert core.findrec("ey5") == [[b'key5', b'data5']]
+    assert core.findrec("ewk") == [[b'newkey', b'newdata']]
+    assert core.trigram.lookup(b"y15") == []
+
+# EOF
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+
+import pytest, os, sys
+from mytest import *
+import twincore, pyvpacker
+
+# Test for the numpy index scan; skipped if there is no numpy
+
+np = pytest.importorskip("numpy")
+
+core = None
+fname = createname(__file__)
+iname = createidxname(__file__)
+
+def setup_module(module):
+    """ setup any state specific to the execution of the given module."""
+    global core
+    core = create_db(fname)
+    assert core != 0
+    core = twincore.TwinCore(fname, vector = True)
+    assert core.vector
+
+    ret = core.save_data("1111", "2222")
+    assert ret != 0
+    ret = core.save_data("11111", "22222")
+    assert ret != 0
+    ret = core.save_data("11111", "333333")
+    assert ret != 0
+    ret = core.save_data("3333", "4444")
+    assert ret != 0
+    ret = core.save_data("111", "222")
+    assert ret != 0
+    ret = core.save_data("1111", "3333")
+    assert ret != 0
+
+def teardown_module(module):
+    """ teardown any state that was previously setup with a setup_module
+    method.
+    """
+    uncreate_db()
+
+def test_retrieve():
+
+    ret = core.retrieve("1111", 3)
+    assert ret == [[b'1111', b'3333'], [b'1111', b'2222']]
+    ret = core.retrieve("nokey")
+    assert ret == []
+    ret = core.find_key("11111")
+    assert len(ret) == 2
+    assert core.get_rec_byoffs(ret[0]) == [b'11111', b'333333']
+
+def test_list():
+
+    ret = core.del_rec_bykey("3333")
+    assert ret == 1
+    ret = core.del_rec_bykey("11111", 1)
+    assert ret == 1
+
+    ret = core.listall()
+    assert ret == [5, 4, 1]
+
+# EOF
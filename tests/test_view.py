@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+import pytest, os, sys
+from mytest import *
+import twincore
+
+# Test for zero copy record views
+
+fname = createname(__file__)
+iname = createidxname(__file__)
+
+big = os.urandom(3 * 1024 * 1024)
+
+def setup_module(module):
+    """ setup any state specific to the execution of the given module."""
+    teardown_module(module)
+
+def teardown_module(module):
+    """ teardown any state that was previously setup with a setup_module
+    method.
+    """
+    for ff in (fname, iname):
+        try:
+            os.remove(ff)
+        except:
+            pass
+
+@pytest.mark.parametrize("mapped", [False, True])
+def test_view(mapped):
+
+    teardown_module(None)
+    core = twincore.TwinCore(fname, mapped = mapped)
+    core.save_data("small", "data")
+    core.save_data("big", big)
+
+    key, data = core.get_rec(1, view = True)
+    assert isinstance(data, memoryview) and data.readonly
+    assert key == b"big" and data == big
+    assert core.get_rec(1) == [b"big", big]
+
+    ret = core.retrieve("small", view = True)
+    assert [bytes(aa) for aa in ret[0]] == [b"small", b"data"]
+    assert core.get_rec_byoffs(core.getidxoffs(twincore.HEADSIZE),
+                                    view = True) == [b"small", b"data"]
+
+    # The file grows, the map is replaced; the view stays
+    core.save_data("big2", big[::-1])
+    assert data == big
+    assert core.retrieve("big2", view = True)[0][1] == big[::-1]
+
+    # Deleted records come back empty, like copies
+    core.del_rec(0)
+    assert core.get_rec(0, view = True) == []
+
+    # Vacuum swaps the files, then close; the view keeps the old one
+    core.vacuum()
+    assert core.retrieve("big", view = True)[0][1] == big
+    core.close()
+    assert data == big
+    data.release()
+
+def test_damaged():
+
+    # A record running off the end of the file comes back as a copy
+    core = twincore.TwinCore(fname)
+    offs = core.getidxoffs(twincore.HEADSIZE)
+    core.putbuffint(offs + 8, 0x7fffff)
+    assert core.get_rec(0, view = True) == []
+    core.close()
+
+# EOF